@@ -1,10 +1,16 @@
-import google.generativeai as genai
 from PIL import Image
 import io
 import base64
 import os
 from dotenv import load_dotenv
 
+from backend_registry import lazy_module
+from predict import predict_multiple_words
+from resilience import backend_timeout, guarded_call
+from rate_limiter import get_rate_limiter
+
+genai = lazy_module("google.generativeai")
+
 # Load environment variables
 load_dotenv()
 
@@ -27,6 +33,10 @@ def predict_with_ai(image):
     """
     Use Model to recognize text/words from an uploaded image
     
+    Requests are paced to the model's quota (see rate_limiter). Falls back to
+    local Tesseract when the call fails, exceeds GEMINI_TIMEOUT, the quota is
+    exhausted or the circuit breaker is open.
+    
     Args:
         image: PIL Image object
     
@@ -54,15 +64,19 @@ def predict_with_ai(image):
         If you cannot see any clear text, return "No text detected".
         """
         
-        # Generate response
-        response = model.generate_content([prompt, image])
+        def generate(image):
+            response = model.generate_content([prompt, image],
+                                              request_options={"timeout": backend_timeout("gemini")})
+            
+            # Extract and clean the response
+            if response.text:
+                recognized_text = response.text.strip()
+                return recognized_text
+            else:
+                return "No text detected"
         
-        # Extract and clean the response
-        if response.text:
-            recognized_text = response.text.strip()
-            return recognized_text
-        else:
-            return "No text detected"
+        # Generate response
+        return guarded_call("gemini", generate, image, fallback=predict_multiple_words, rate_key=model_name)
             
     except Exception as e:
         return f"Error: {str(e)}"
@@ -86,7 +100,9 @@ def test_ai_api():
         model = genai.GenerativeModel(model_name)
         
         # Test with a simple text prompt
-        response = model.generate_content("Hello, this is a test.")
+        get_rate_limiter().acquire(model_name)
+        response = model.generate_content("Hello, this is a test.",
+                                          request_options={"timeout": backend_timeout("gemini")})
         return True if response.text else False
         
     except Exception as e:
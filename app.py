@@ -1,6 +1,8 @@
 import streamlit as st
 from PIL import Image
-from vision_agent import vision_agent
+from vision_agent import VisionTextAgent, AgentHealthMonitor
+from preprocess import load_image
+from job_queue import JobQueue
 import os
 from dotenv import load_dotenv
 import base64
@@ -8,6 +10,181 @@ import base64
 # Load environment variables
 load_dotenv()
 
+
+@st.cache_resource(show_spinner=False)
+def get_vision_agent():
+    """Build the agent once per server process instead of on every rerun"""
+    return VisionTextAgent()
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_queue():
+    """Worker pool shared by all sessions; JOB_DB_PATH enables SQLite persistence"""
+    return JobQueue(get_vision_agent(),
+                    max_workers=int(os.getenv('JOB_WORKERS', 4)),
+                    db_path=os.getenv('JOB_DB_PATH') or None)
+
+
+@st.fragment(run_every=1.0)
+def render_job_progress(job_queue, job_id):
+    """Show live stage progress of a queued job and rerun the page when it is done"""
+    job = job_queue.status(job_id)
+    st.progress(job["progress"] / 100)
+    
+    for item in job["items"]:
+        st.markdown(f"""
+        <div style="
+            text-align: center;
+            padding: 1rem;
+            background: linear-gradient(135deg, #667eea10 0%, #764ba210 100%);
+            border-radius: 10px;
+            margin: 1rem 0;
+        ">
+            <span style="font-size: 1.2rem; color: #667eea; font-weight: 600;">
+                🤖 {item['name']}: {item['stage']}
+            </span>
+        </div>
+        """, unsafe_allow_html=True)
+    
+    if job["done"]:
+        st.rerun()
+
+
+def stage_views(agent_result):
+    """Map a compact AgentResult onto the per-stage dicts the detail view renders"""
+    views = {}
+    for stage in agent_result.stages:
+        view = {
+            "name": stage.name,
+            "input": stage.input,
+            "output": stage.output,
+            "status": stage.status,
+            "details": stage.details,
+            "result_data": stage.details
+        }
+        if stage.result_text is not None:
+            view["result_text"] = stage.result_text
+        if stage.result_image is not None:
+            view["result_image"] = stage.result_image.to_image()
+        views[f"stage_{stage.number}"] = view
+    return views
+
+
+BATCH_COLUMNS = ["image", "status", "stage", "text", "latency_s", "error"]
+
+
+def batch_results_table(job):
+    """Flatten a batch job snapshot into one row per image"""
+    import pandas as pd
+    
+    rows = [
+        {
+            "image": item["name"],
+            "status": item["status"],
+            "stage": item["stage"],
+            "text": item["text"] if item["text"] is not None else "",
+            "latency_s": item["latency_s"],
+            "error": item["error"] or ""
+        }
+        for item in job["items"]
+    ]
+    return pd.DataFrame(rows, columns=BATCH_COLUMNS)
+
+
+@st.fragment(run_every=1.0)
+def render_batch_progress(job_queue, job_id):
+    """Stream batch results into the table as images finish; rerun the page when done"""
+    job = job_queue.status(job_id)
+    finished = sum(1 for item in job["items"] if item["status"] in ("completed", "failed"))
+    
+    st.progress(job["progress"] / 100, text=f"{finished} of {len(job['items'])} images processed")
+    st.dataframe(batch_results_table(job), use_container_width=True, hide_index=True)
+    
+    if job["done"]:
+        st.rerun()
+
+
+def render_batch_section(uploaded_files, vision_agent):
+    """Batch view: fan several uploads out to the shared worker pool and collect results"""
+    st.markdown(f"""
+    <div class="glass-card">
+        <h2 style="color: #667eea;">🗂️ Batch Processing</h2>
+        <p style="color: #718096;">{len(uploaded_files)} images ready; each one runs through all 6 agent stages.</p>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    with st.expander("📷 Uploaded Images", expanded=False):
+        preview_cols = st.columns(4)
+        for i, uploaded in enumerate(uploaded_files):
+            with preview_cols[i % 4]:
+                st.image(uploaded, caption=uploaded.name, use_container_width=True)
+    
+    if not vision_agent.is_ready:
+        st.error("❌ Agent system not ready. Please check configuration!")
+        return
+    
+    job_queue = get_job_queue()
+    upload_key = "|".join(f"{f.name}:{f.size}" for f in uploaded_files)
+    
+    if st.button("🚀 Start Batch Processing", type="primary", use_container_width=True):
+        max_side = int(os.getenv('MAX_IMAGE_SIDE', 2048))
+        target_x_height = int(os.getenv('TARGET_X_HEIGHT', 32))
+        images = [load_image(f, max_side=max_side, target_x_height=target_x_height) for f in uploaded_files]
+        
+        # One job for the whole upload; the shared pool processes the images concurrently
+        st.session_state.active_batch = {
+            "upload_key": upload_key,
+            "job_id": job_queue.submit(images, [f.name for f in uploaded_files])
+        }
+    
+    active_batch = st.session_state.get("active_batch") or {}
+    job_id = active_batch.get("job_id") if active_batch.get("upload_key") == upload_key else None
+    
+    if not job_id or job_queue.status(job_id) is None:
+        return
+    
+    if not job_queue.is_done(job_id):
+        render_batch_progress(job_queue, job_id)
+        return
+    
+    table = batch_results_table(job_queue.status(job_id))
+    completed = table[table["status"] == "completed"]
+    
+    st.markdown("""
+    <div class="glass-card">
+        <h2 style="color: #38a169;">✅ Batch Complete!</h2>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    metric_cols = st.columns(3)
+    with metric_cols[0]:
+        st.metric("Images Processed", f"{len(completed)}/{len(table)}")
+    with metric_cols[1]:
+        st.metric("Mean Latency", f"{completed['latency_s'].mean():.2f}s" if len(completed) else "N/A")
+    with metric_cols[2]:
+        st.metric("Max Latency", f"{completed['latency_s'].max():.2f}s" if len(completed) else "N/A")
+    
+    st.dataframe(table, use_container_width=True, hide_index=True)
+    
+    download_cols = st.columns(2)
+    with download_cols[0]:
+        st.download_button("⬇️ Download CSV", table.to_csv(index=False).encode("utf-8"),
+                           file_name=f"visiontext_batch_{job_id}.csv", mime="text/csv",
+                           use_container_width=True)
+    with download_cols[1]:
+        st.download_button("⬇️ Download JSONL",
+                           table.to_json(orient="records", lines=True, force_ascii=False).encode("utf-8"),
+                           file_name=f"visiontext_batch_{job_id}.jsonl", mime="application/jsonl",
+                           use_container_width=True)
+
+
+@st.cache_resource(show_spinner=False)
+def get_health_monitor():
+    """Shared background system check, refreshed every AGENT_HEALTHCHECK_TTL seconds"""
+    ttl = float(os.getenv('AGENT_HEALTHCHECK_TTL', 300))
+    return AgentHealthMonitor(get_vision_agent(), ttl=ttl)
+
+
 # Custom CSS for ultra-modern, attractive UI with animations
 def load_custom_css():
     st.markdown("""
@@ -710,6 +887,9 @@ def main():
     # Load custom CSS
     load_custom_css()
     
+    vision_agent = get_vision_agent()
+    health_monitor = get_health_monitor()
+    
     # Modern header with gradient
     st.markdown("""
     <div class="main-header">
@@ -742,9 +922,8 @@ def main():
         # Get agent info
         agent_info = vision_agent.get_agent_info()
         
-        # Test agent system with modern loading animation
-        with st.spinner("🔄 Initializing Agent System..."):
-            is_ready, status_msg = vision_agent.test_agent_system()
+        # Cached system check; a stale result is refreshed in the background
+        is_ready, status_msg = health_monitor.status()
             
         if is_ready:
             st.markdown("""
@@ -1030,16 +1209,25 @@ def main():
     # </div>
     # """, unsafe_allow_html=True)
     
-    uploaded_file = st.file_uploader(
-        "Drop your image here or click to browse",
+    uploaded_files = st.file_uploader(
+        "Drop your images here or click to browse",
         type=['png', 'jpg', 'jpeg', 'bmp', 'tiff', 'tif'],
-        help="Supported formats: PNG, JPG, JPEG, BMP, TIFF",
+        help="Supported formats: PNG, JPG, JPEG, BMP, TIFF. Upload several pages to process them as a batch.",
+        accept_multiple_files=True,
         label_visibility="collapsed"
-    )
+    ) or []
+    uploaded_file = uploaded_files[0] if len(uploaded_files) == 1 else None
+    
+    if len(uploaded_files) > 1:
+        render_batch_section(uploaded_files, vision_agent)
     
-    if uploaded_file is not None:
+    elif uploaded_file is not None:
         # Display uploaded image with modern styling
-        image = Image.open(uploaded_file)
+        # Large JPEGs are decoded in draft mode so previews and processing skip full-res work
+        image = load_image(uploaded_file,
+                           max_side=int(os.getenv('MAX_IMAGE_SIDE', 2048)),
+                           target_x_height=int(os.getenv('TARGET_X_HEIGHT', 32)))
+        original_width, original_height = image.info.get("original_size", image.size)
         
         st.markdown("""
         <div class="glass-card">
@@ -1064,7 +1252,7 @@ def main():
                 <h4 style="color: #667eea; margin: 0 0 0.5rem 0;">📊 Image Details</h4>
                 <div style="display: flex; justify-content: space-between; margin: 0.3rem 0;">
                     <span>📐 Dimensions:</span>
-                    <span style="font-weight: 600;">{image.size[0]} × {image.size[1]} px</span>
+                    <span style="font-weight: 600;">{original_width} × {original_height} px</span>
                 </div>
                 <div style="display: flex; justify-content: space-between; margin: 0.3rem 0;">
                     <span>📁 Format:</span>
@@ -1098,8 +1286,21 @@ def main():
             
             # Check if agent is ready
             if vision_agent.is_ready:
+                job_queue = get_job_queue()
+                upload_key = f"{uploaded_file.name}:{uploaded_file.size}"
+                
                 # Modern process button
                 if st.button("🚀 Start AI Processing", type="primary", use_container_width=True):
+                    # Queue the job; the worker pool runs it off the script thread
+                    st.session_state.active_job = {
+                        "upload_key": upload_key,
+                        "job_id": job_queue.submit([image], [uploaded_file.name])
+                    }
+                
+                active_job = st.session_state.get("active_job") or {}
+                job_id = active_job.get("job_id") if active_job.get("upload_key") == upload_key else None
+                
+                if job_id and job_queue.status(job_id):
                     
                     # Processing section with modern design
                     st.markdown("""
@@ -1110,55 +1311,37 @@ def main():
                     
                     # Progress tracking with modern design
                     progress_container = st.container()
+                    predicted_text, stage_results = None, {}
                     
                     with progress_container:
-                        # Modern progress bar
-                        progress_bar = st.progress(0)
-                        status_text = st.empty()
-                        
-                        # Stage visualization
-                        stages_container = st.empty()
-                        
-                        def update_progress(stage_msg, progress):
-                            progress_bar.progress(progress / 100)
-                            status_text.markdown(f"""
+                        if job_queue.is_done(job_id):
+                            predicted_text, agent_result = job_queue.result(job_id)
+                            stage_results = stage_views(agent_result) if agent_result else {}
+                            
+                            # Completion animation
+                            st.progress(100)
+                            st.markdown("""
                             <div style="
                                 text-align: center;
-                                padding: 1rem;
-                                background: linear-gradient(135deg, #667eea10 0%, #764ba210 100%);
-                                border-radius: 10px;
+                                padding: 1.5rem;
+                                background: linear-gradient(135deg, #48bb7815 0%, #48bb7825 100%);
+                                border-radius: 15px;
                                 margin: 1rem 0;
                             ">
-                                <span style="font-size: 1.2rem; color: #667eea; font-weight: 600;">
-                                    🤖 {stage_msg}
+                                <span style="font-size: 1.5rem; color: #38a169; font-weight: 700;">
+                                    ✅ Processing Complete!
                                 </span>
                             </div>
                             """, unsafe_allow_html=True)
-                        
-                        # Process with agent
-                        predicted_text, stage_results = vision_agent.process_image_with_agent(
-                            image, 
-                            progress_callback=update_progress
-                        )
-                        
-                        # Completion animation
-                        progress_bar.progress(100)
-                        status_text.markdown("""
-                        <div style="
-                            text-align: center;
-                            padding: 1.5rem;
-                            background: linear-gradient(135deg, #48bb7815 0%, #48bb7825 100%);
-                            border-radius: 15px;
-                            margin: 1rem 0;
-                        ">
-                            <span style="font-size: 1.5rem; color: #38a169; font-weight: 700;">
-                                ✅ Processing Complete!
-                            </span>
-                        </div>
-                        """, unsafe_allow_html=True)
+                        else:
+                            # Polls the job queue; reruns the page once the job has finished
+                            render_job_progress(job_queue, job_id)
                     
                     # Results section with modern design
-                    if predicted_text and predicted_text != "No text detected" and not predicted_text.startswith("Error"):
+                    if predicted_text is None:
+                        st.caption("Results will appear here as soon as the job finishes.")
+                    
+                    elif predicted_text and predicted_text != "No text detected" and not predicted_text.startswith("Error"):
                         
                         # Success message
                         st.markdown("""
@@ -1231,10 +1414,12 @@ def main():
                                                         st.text(f"{key.replace('_', ' ').title()}: {value}")
                                             
                                             with col2:
-                                                st.markdown("**🎯 Attention Weights:**")
-                                                attention_weights = stage_info['result_data'].get('attention_weights', {})
-                                                for head, weight in attention_weights.items():
-                                                    st.text(f"{head.replace('_', ' ').title()}: {weight}")
+                                                st.markdown("**🎯 Text Likelihood:**")
+                                                likelihood = stage_info['result_data'].get('text_likelihood', {})
+                                                for key, value in likelihood.items():
+                                                    st.text(f"{key.replace('_', ' ').title()}: {value}")
+                                                if stage_info.get('result_image') is not None:
+                                                    st.image(stage_info['result_image'], caption="Text-likelihood heatmap", width=250)
                                                 
                                                 st.markdown("**🧠 Spatial Encoding:**")
                                                 spatial_data = stage_info['result_data'].get('spatial_encoding', {})
@@ -1247,6 +1432,9 @@ def main():
                                         st.markdown("**Output:**")
                                         st.success(stage_info['output'])
                                         
+                                        if stage_info.get('result_image') is not None:
+                                            st.image(stage_info['result_image'], caption="Detected words (green) and lines (blue)", width=400)
+                                        
                                         # Create character detection table
                                         if 'result_data' in stage_info and 'characters' in stage_info['result_data']:
                                             st.markdown("**📋 Character Detection Table:**")
@@ -1263,7 +1451,7 @@ def main():
                                                         'Confidence': f"{char_info.get('confidence', 0):.3f}",
                                                         'Font Size Estimate': char_info.get('font_size_estimate', ''),
                                                         'Is Uppercase': '✅' if char_info.get('is_uppercase', False) else '❌',
-                                                        'Stroke Width': char_info.get('stroke_width', ''),
+                                                        'Box': str(char_info.get('bbox', '')),
                                                         'Character Quality': char_info.get('character_quality', '')
                                                     })
                                                 
@@ -1333,8 +1521,10 @@ def main():
                                         
                                         with col2:
                                             st.markdown("**🎯 Quality Metrics:**")
-                                            st.text(f"Avg Word Confidence: {details.get('avg_word_confidence', 0):.3f}")
-                                            st.text(f"Final Confidence: {details.get('final_confidence', 0):.3f}")
+                                            for label, key in (("Avg Word Confidence", 'avg_word_confidence'),
+                                                               ("Final Confidence", 'final_confidence')):
+                                                value = details.get(key)
+                                                st.text(f"{label}: {'N/A' if value is None else f'{value:.3f}'}")
                                     
                                     elif stage_num == 6:  # Final Output - Unique content
                                         st.markdown("**Input:**")
@@ -1402,19 +1592,21 @@ def main():
                                     
                                     with col_a:
                                         st.markdown("**Preprocessing Results:**")
-                                        if "preprocessing" in stage_results:
-                                            prep = stage_results["preprocessing"]
+                                        if "stage_1" in stage_results:
+                                            prep = stage_results["stage_1"]["details"]
                                             st.text(f"Original Size: {prep['original_size']}")
                                             st.text(f"Format: {prep['format']}")
                                             st.text(f"Status: {prep['status']}")
                                     
                                     with col_b:
                                         st.markdown("**Post-processing Results:**")
-                                        if "post_processing" in stage_results:
-                                            post = stage_results["post_processing"]
-                                            st.text(f"Confidence: {post['confidence_score']}")
-                                            st.text(f"Language: {post['language_detected']}")
-                                            st.text(f"Status: {post['status']}")
+                                        if "stage_5" in stage_results:
+                                            post = stage_results["stage_5"]["details"]
+                                            confidence = post.get('final_confidence')
+                                            lexicon = post.get('lexicon')
+                                            st.text(f"Confidence: {'N/A' if confidence is None else f'{confidence:.3f}'}")
+                                            st.text(f"Lexicon: {lexicon['words']} words" if isinstance(lexicon, dict) else f"Lexicon: {lexicon}")
+                                            st.text(f"Status: {stage_results['stage_5']['status']}")
                         
                         # Store result in session state
                         st.session_state.last_result = predicted_text
@@ -0,0 +1,93 @@
+"""
+Lazy backend registry
+=====================
+
+Heavy third-party backends (google.generativeai, torch, transformers,
+pytesseract, tensorflow, matplotlib) are not imported when a module is
+loaded. Modules bind a placeholder instead:
+
+    genai = lazy_module("google.generativeai")
+
+and the real import happens on the first attribute access, once per
+process. The registry records which backends were actually loaded and how
+long each import took, so startup costs stay visible.
+"""
+
+import time
+import importlib
+import importlib.util
+import threading
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class LazyModule:
+    """Module placeholder that imports the real module on first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._import_seconds = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    self._import_seconds = time.perf_counter() - start
+                    self._module = module
+        return self._module
+
+    @property
+    def is_loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self.is_loaded else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_module(name):
+    """
+    Get the shared lazy placeholder for a module
+
+    Args:
+        name (str): Dotted module name, e.g. 'google.generativeai'
+
+    Returns:
+        LazyModule: Placeholder that imports ``name`` on first use
+    """
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = LazyModule(name)
+        return _registry[name]
+
+
+def is_available(name):
+    """Check whether a backend can be imported, without importing it"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def loaded_backends():
+    """
+    Backends imported so far in this process
+
+    Returns:
+        dict: Module name -> import time in seconds
+    """
+    with _registry_lock:
+        modules = list(_registry.values())
+    return {module._name: round(module._import_seconds, 4) for module in modules if module.is_loaded}
@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import threading
+import cv2
+import numpy as np
+from PIL import Image
+
+MODEL_RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_results')
+DEFAULT_CHAR_MODEL = os.path.join(MODEL_RESULTS_DIR, 'best_model_simple_cnn_savedmodel')
+
+_classifiers = {}
+_classifiers_lock = threading.Lock()
+
+
+def preprocess_glyphs(glyphs, img_size=(32, 32)):
+    """
+    Convert glyph crops into the network's input tensor
+
+    Matches model_building.ipynb: grayscale, resize to img_size, scale to [0, 1].
+
+    Args:
+        glyphs: List of PIL Images / numpy arrays, or an (N, H, W[, 1]) array
+        img_size: (height, width) the model was trained on
+
+    Returns:
+        numpy.ndarray: float32 tensor of shape (N, H, W, 1)
+    """
+    height, width = img_size
+    if isinstance(glyphs, np.ndarray) and glyphs.ndim in (3, 4) and glyphs.shape[1:3] == (height, width):
+        batch = glyphs.reshape(len(glyphs), height, width, 1).astype(np.float32, copy=False)
+        return batch / 255.0 if batch.max(initial=0) > 1.0 else batch
+
+    batch = np.empty((len(glyphs), height, width, 1), dtype=np.float32)
+    for i, glyph in enumerate(glyphs):
+        array = np.asarray(glyph.convert('L') if isinstance(glyph, Image.Image) else glyph)
+        if array.ndim == 3:
+            array = cv2.cvtColor(array, cv2.COLOR_RGB2GRAY)
+        batch[i, :, :, 0] = cv2.resize(array, (width, height))
+    return batch / 255.0
+
+
+def load_training_config(labels_path=None, config_path=None):
+    """Read class labels and input size saved next to the model"""
+    labels_path = labels_path or os.path.join(MODEL_RESULTS_DIR, 'label_classes.npy')
+    config_path = config_path or os.path.join(MODEL_RESULTS_DIR, 'training_config.json')
+
+    labels = np.load(labels_path, allow_pickle=True)
+    img_size = (32, 32)
+    if os.path.isfile(config_path):
+        with open(config_path) as f:
+            img_size = tuple(json.load(f).get('img_size', img_size))
+    return labels, img_size
+
+
+def _top_k(probabilities, labels, top_k):
+    """Top-k (label, probability) pairs per row, most likely first (private)"""
+    k = min(top_k, probabilities.shape[1])
+    # argpartition finds the top-k without sorting every class
+    top = np.argpartition(-probabilities, k - 1, axis=1)[:, :k]
+    top_probs = np.take_along_axis(probabilities, top, axis=1)
+    order = np.argsort(-top_probs, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top_probs = np.take_along_axis(top_probs, order, axis=1)
+
+    return [
+        [(str(labels[index]), float(prob)) for index, prob in zip(row, row_probs)]
+        for row, row_probs in zip(top, top_probs)
+    ]
+
+
+class OdiaCharClassifier:
+    def __init__(self, model_path=None, labels_path=None, config_path=None):
+        """
+        Load the 32x32 Odia character CNN trained in model_building.ipynb
+
+        Args:
+            model_path: SavedModel directory or .h5 file (defaults to CHAR_MODEL_PATH,
+                then model_results/best_model_simple_cnn_savedmodel)
+            labels_path: label_classes.npy saved by the notebook's LabelEncoder
+            config_path: training_config.json holding the input size
+        """
+        import tensorflow as tf
+
+        self.model_path = model_path or os.getenv('CHAR_MODEL_PATH') or DEFAULT_CHAR_MODEL
+        self.labels, self.img_size = load_training_config(labels_path, config_path)
+
+        start = time.perf_counter()
+        self._predict = self._load(tf, self.model_path)
+        self.load_time_s = time.perf_counter() - start
+
+    @staticmethod
+    def _load(tf, model_path):
+        """Return a function mapping a float32 (N, H, W, 1) batch to class probabilities (private)"""
+        try:
+            model = tf.keras.models.load_model(model_path, compile=False)
+            return lambda batch: model(batch, training=False).numpy()
+        except (ValueError, OSError):
+            # Keras 3 no longer reads TF2 SavedModel directories; use the serving signature
+            loaded = tf.saved_model.load(model_path)
+            serve = loaded.signatures['serving_default']
+            return lambda batch: next(iter(serve(tf.constant(batch)).values())).numpy()
+
+    def preprocess(self, glyphs):
+        """Convert glyph crops into the network's (N, H, W, 1) float32 input tensor"""
+        return preprocess_glyphs(glyphs, self.img_size)
+
+    def predict_batch(self, glyphs, top_k=3, batch_size=256):
+        """
+        Classify a batch of segmented glyph crops
+
+        Args:
+            glyphs: Glyph crops (see ``preprocess``)
+            top_k: Number of labels returned per glyph
+            batch_size: Glyphs per forward pass
+
+        Returns:
+            list: One list of (label, probability) pairs per glyph, most likely first
+        """
+        if len(glyphs) == 0:
+            return []
+
+        inputs = self.preprocess(glyphs)
+        probabilities = np.concatenate([
+            self._predict(inputs[start:start + batch_size])
+            for start in range(0, len(inputs), batch_size)
+        ])
+
+        return _top_k(probabilities, self.labels, top_k)
+
+
+class TFLiteCharClassifier:
+    def __init__(self, model_path, labels_path=None, config_path=None, num_threads=None):
+        """
+        Run an exported .tflite character model without importing TensorFlow
+
+        Uses ``tflite_runtime`` (or its successor ``ai_edge_litert``); full
+        TensorFlow is only used as a last resort.
+
+        Args:
+            model_path: .tflite file written by export_char_tflite.py
+            labels_path: label_classes.npy saved by the notebook's LabelEncoder
+            config_path: training_config.json holding the input size
+            num_threads: Interpreter threads (defaults to CHAR_MODEL_THREADS or 1)
+        """
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            try:
+                from ai_edge_litert.interpreter import Interpreter
+            except ImportError:
+                from tensorflow.lite import Interpreter
+
+        self.model_path = model_path
+        self.labels, self.img_size = load_training_config(labels_path, config_path)
+
+        start = time.perf_counter()
+        self._interpreter = Interpreter(model_path=model_path,
+                                        num_threads=num_threads or int(os.getenv('CHAR_MODEL_THREADS', 1)))
+        self._interpreter.allocate_tensors()
+        self.load_time_s = time.perf_counter() - start
+
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = 1
+        # One interpreter holds one set of tensors, so calls are serialized
+        self._lock = threading.Lock()
+
+    def _run(self, batch):
+        """Run one batch through the interpreter, (de)quantizing int8 tensors (private)"""
+        if len(batch) != self._batch_size:
+            self._interpreter.resize_tensor_input(self._input['index'], [len(batch), *batch.shape[1:]])
+            self._interpreter.allocate_tensors()
+            self._input = self._interpreter.get_input_details()[0]
+            self._output = self._interpreter.get_output_details()[0]
+            self._batch_size = len(batch)
+
+        scale, zero_point = self._input['quantization']
+        if scale:
+            info = np.iinfo(self._input['dtype'])
+            batch = np.clip(np.round(batch / scale + zero_point), info.min, info.max)
+        self._interpreter.set_tensor(self._input['index'], batch.astype(self._input['dtype']))
+        self._interpreter.invoke()
+
+        output = self._interpreter.get_tensor(self._output['index'])
+        scale, zero_point = self._output['quantization']
+        if scale:
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+    def predict_batch(self, glyphs, top_k=3, batch_size=256):
+        """Same contract as ``OdiaCharClassifier.predict_batch``"""
+        if len(glyphs) == 0:
+            return []
+
+        inputs = preprocess_glyphs(glyphs, self.img_size)
+        with self._lock:
+            probabilities = np.concatenate([
+                self._run(inputs[start:start + batch_size])
+                for start in range(0, len(inputs), batch_size)
+            ])
+        return _top_k(probabilities, self.labels, top_k)
+
+
+def get_char_classifier(model_path=None):
+    """
+    Get the shared character classifier, loading the model on first use
+
+    Args:
+        model_path: SavedModel directory, .h5 file or .tflite file
+
+    Returns:
+        OdiaCharClassifier or TFLiteCharClassifier: Classifier cached per model path
+    """
+    model_path = model_path or os.getenv('CHAR_MODEL_PATH') or DEFAULT_CHAR_MODEL
+    with _classifiers_lock:
+        if model_path not in _classifiers:
+            if model_path.endswith('.tflite'):
+                _classifiers[model_path] = TFLiteCharClassifier(model_path)
+            else:
+                _classifiers[model_path] = OdiaCharClassifier(model_path)
+        return _classifiers[model_path]
+
+
+def benchmark_throughput(classifier, batch_sizes=(1, 8, 32, 128, 512), total=2048):
+    """
+    Measure CPU classification throughput in glyphs/sec
+
+    Args:
+        classifier: OdiaCharClassifier or TFLiteCharClassifier to benchmark
+        batch_sizes: Forward-pass batch sizes to try
+        total: Glyphs classified per batch size
+
+    Returns:
+        list: One dict per batch size with glyphs/sec and per-batch latency
+    """
+    height, width = classifier.img_size
+    glyphs = np.random.default_rng(0).integers(0, 256, size=(total, height, width, 1), dtype=np.uint8)
+    classifier.predict_batch(glyphs[:1])  # warm-up
+
+    results = []
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        classifier.predict_batch(glyphs, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "batch_size": batch_size,
+            "glyphs_per_sec": round(total / elapsed, 1),
+            "batch_latency_ms": round(elapsed / -(-total // batch_size) * 1000, 3)
+        })
+    return results
+
+
+if __name__ == "__main__":
+    classifier = get_char_classifier()
+    print(f"Loaded {classifier.model_path} in {classifier.load_time_s:.2f}s, "
+          f"{len(classifier.labels)} classes, input {classifier.img_size}")
+
+    print(f"{'batch':>6}{'glyphs/s':>12}{'batch ms':>12}")
+    for row in benchmark_throughput(classifier):
+        print(f"{row['batch_size']:>6}{row['glyphs_per_sec']:>12}{row['batch_latency_ms']:>12}")
@@ -0,0 +1,296 @@
+"""
+Near-duplicate detection for uploaded scans
+===========================================
+
+Re-photographed pages and repeated forms are recognized once. Each image is
+reduced to two perceptual hashes computed with numpy only:
+
+- pHash: low-frequency DCT coefficients of a 4x-oversampled grayscale
+  thumbnail, thresholded at their median (robust to scale, blur, JPEG and
+  exposure changes)
+- dHash: signs of horizontal gradients of a small thumbnail (cheap second
+  opinion that separates pages sharing a layout)
+
+Hashes are indexed in a BK-tree per namespace (recognizer/mode), so a lookup
+visits only the subtrees whose distance could still fall within the Hamming
+threshold instead of scanning every stored image.
+"""
+
+import os
+import time
+import threading
+import itertools
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+_dct_matrices = {}
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II matrix of size n, cached (private)"""
+    if n not in _dct_matrices:
+        k = np.arange(n)[:, None]
+        matrix = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+        matrix[0] /= np.sqrt(2.0)
+        _dct_matrices[n] = matrix.astype(np.float32)
+    return _dct_matrices[n]
+
+
+def _gray(image):
+    array = np.asarray(image.convert("L") if isinstance(image, Image.Image) else image)
+    if array.ndim == 3:
+        array = cv2.cvtColor(array, cv2.COLOR_RGB2GRAY)
+    return array
+
+
+def _bits_to_int(bits):
+    """Pack a boolean vector into a Python int (private)"""
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def phash(image, hash_size=8, oversample=4):
+    """
+    DCT perceptual hash
+
+    Args:
+        image (PIL.Image or numpy.ndarray): Input image
+        hash_size (int): Side of the kept low-frequency block (hash_size**2 bits)
+        oversample (int): Thumbnail side as a multiple of ``hash_size``
+
+    Returns:
+        int: hash_size**2-bit hash
+    """
+    size = hash_size * oversample
+    thumb = cv2.resize(_gray(image), (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    dct = _dct_matrix(size)
+    # 2-D DCT as two matrix products; only the low-frequency corner is kept
+    low = (dct[:hash_size] @ thumb @ dct[:hash_size].T).ravel()
+    # The DC term only encodes mean brightness, so it does not vote in the median
+    return _bits_to_int(low > np.median(low[1:]))
+
+
+def dhash(image, hash_size=8):
+    """
+    Difference hash: is each thumbnail pixel brighter than its right neighbour
+
+    Args:
+        image (PIL.Image or numpy.ndarray): Input image
+        hash_size (int): Rows of the thumbnail (hash_size**2 bits)
+
+    Returns:
+        int: hash_size**2-bit hash
+    """
+    thumb = cv2.resize(_gray(image), (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return _bits_to_int((thumb[:, 1:] > thumb[:, :-1]).ravel())
+
+
+def image_hashes(image, hash_size=8):
+    """(pHash, dHash) of an image"""
+    return phash(image, hash_size), dhash(image, hash_size)
+
+
+def hamming(a, b):
+    """Number of differing bits between two integer hashes"""
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance"""
+
+    def __init__(self):
+        # Node: [hash, payload, {distance: child}]
+        self._root = None
+        self.size = 0
+
+    def add(self, key, payload):
+        node = [key, payload, {}]
+        self.size += 1
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            distance = hamming(key, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, key, radius):
+        """
+        Stored entries within ``radius`` bits of ``key``
+
+        Returns:
+            list: (distance, hash, payload), nearest first
+        """
+        if self._root is None:
+            return []
+        found, stack = [], [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(key, node[0])
+            if distance <= radius:
+                found.append((distance, node[0], node[1]))
+            # Triangle inequality: only children at |d - radius| .. d + radius can match
+            low, high = distance - radius, distance + radius
+            stack.extend(child for edge, child in node[2].items() if low <= edge <= high)
+        return sorted(found, key=lambda item: item[0])
+
+
+class DedupCache:
+    def __init__(self, threshold=None, dhash_threshold=None, max_items=None, hash_size=8):
+        """
+        Remember recognition results by perceptual hash
+
+        Args:
+            threshold (int): Largest pHash distance (bits of 64) that counts as a
+                duplicate (defaults to DEDUP_THRESHOLD or 12)
+            dhash_threshold (int): Largest dHash distance also required (defaults
+                to DEDUP_DHASH_THRESHOLD or 18)
+            max_items (int): Results kept per cache; the oldest half is dropped
+                when full (defaults to DEDUP_MAX_ITEMS or 2048)
+            hash_size (int): Hash side, hash_size**2 bits per hash
+        """
+        self.threshold = int(threshold if threshold is not None else os.getenv('DEDUP_THRESHOLD', 12))
+        self.dhash_threshold = int(dhash_threshold if dhash_threshold is not None
+                                   else os.getenv('DEDUP_DHASH_THRESHOLD', 18))
+        self.max_items = int(max_items or os.getenv('DEDUP_MAX_ITEMS', 2048))
+        self.hash_size = hash_size
+        self._trees = {}
+        self._entries = OrderedDict()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "remote_calls_avoided": 0, "hash_ms": 0.0}
+
+    def hashes(self, image):
+        """(pHash, dHash) of an image, timed into the stats"""
+        start = time.perf_counter()
+        hashes = image_hashes(image, self.hash_size)
+        with self._lock:
+            self._stats["hash_ms"] += (time.perf_counter() - start) * 1000
+        return hashes
+
+    def lookup(self, hashes, namespace="default"):
+        """
+        Find an earlier result for a near-duplicate image
+
+        Args:
+            hashes (tuple): (pHash, dHash) from ``hashes``
+            namespace (str): Keeps results of different recognizers apart
+
+        Returns:
+            tuple: (result, pHash distance), or (None, None) when there is no duplicate
+        """
+        p, d = hashes
+        with self._lock:
+            self._stats["lookups"] += 1
+            tree = self._trees.get(namespace)
+            matches = tree.search(p, self.threshold) if tree else []
+            for distance, _, entry_id in matches:
+                entry = self._entries.get(entry_id)
+                if entry is not None and hamming(d, entry["dhash"]) <= self.dhash_threshold:
+                    self._stats["hits"] += 1
+                    self._stats["remote_calls_avoided"] += entry["remote"]
+                    entry["hits"] += 1
+                    return entry["result"], distance
+            self._stats["misses"] += 1
+        return None, None
+
+    def add(self, hashes, result, namespace="default", remote=True):
+        """
+        Store a result under an image's hashes
+
+        Args:
+            hashes (tuple): (pHash, dHash) from ``hashes``
+            result: Anything to hand back on a later hit
+            namespace (str): Recognizer/mode the result belongs to
+            remote (bool): Whether producing the result cost a remote call
+        """
+        p, d = hashes
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = {"namespace": namespace, "phash": p, "dhash": d,
+                                       "result": result, "remote": int(remote), "hits": 0}
+            self._trees.setdefault(namespace, BKTree()).add(p, entry_id)
+            if len(self._entries) > self.max_items:
+                self._evict()
+
+    def _evict(self):
+        """Drop the oldest half and rebuild the trees (BK-trees cannot delete) (private)"""
+        for _ in range(len(self._entries) // 2):
+            self._entries.popitem(last=False)
+        self._trees = {}
+        for entry_id, entry in self._entries.items():
+            self._trees.setdefault(entry["namespace"], BKTree()).add(entry["phash"], entry_id)
+
+    def stats(self):
+        """Lookups, hits, remote calls avoided and hashing time"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        stats["hit_rate"] = round(stats["hits"] / stats["lookups"], 3) if stats["lookups"] else 0.0
+        stats["hash_ms"] = round(stats["hash_ms"], 1)
+        return stats
+
+
+def get_dedup_cache():
+    """
+    Get the process-wide duplicate cache shared by all agent workers
+
+    Returns:
+        DedupCache: Shared cache
+    """
+    with _caches_lock:
+        if "default" not in _caches:
+            _caches["default"] = DedupCache()
+        return _caches["default"]
+
+
+def dedup_enabled():
+    """Whether the dedup stage is on (``DEDUP_ENABLED``, default on)"""
+    return os.getenv('DEDUP_ENABLED', '1').lower() in ('1', 'true', 'yes')
+
+
+if __name__ == "__main__":
+    import io
+    import glob
+    from PIL import ImageEnhance
+
+    def variants(image):
+        """Re-photograph-like edits of a page"""
+        width, height = image.size
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=40)
+        yield "jpeg q40", Image.open(io.BytesIO(buffer.getvalue()))
+        yield "rotate 1.5", image.rotate(1.5, fillcolor="white", resample=Image.BILINEAR)
+        yield "crop 3%", image.crop((width * 0.03, height * 0.03, width * 0.97, height * 0.97))
+        yield "darker", ImageEnhance.Brightness(image).enhance(0.75)
+        yield "half size", image.resize((width // 2, height // 2))
+
+    pages = {path: Image.open(path).convert("RGB") for path in sorted(glob.glob("images/*.jpeg"))}
+    cache = DedupCache()
+    hashes = {path: cache.hashes(page) for path, page in pages.items()}
+
+    print(f"{'variant':<12}{'pHash bits':>12}{'dHash bits':>12}")
+    for path, page in pages.items():
+        for name, variant in variants(page):
+            p, d = cache.hashes(variant)
+            print(f"{name:<12}{hamming(p, hashes[path][0]):>12}{hamming(d, hashes[path][1]):>12}  {path}")
+
+    paths = list(pages)
+    distinct = [hamming(hashes[a][0], hashes[b][0]) for i, a in enumerate(paths) for b in paths[i + 1:]]
+    if distinct:
+        print(f"\nDifferent pages: pHash distance min {min(distinct)}, mean {np.mean(distinct):.1f} "
+              f"(threshold {cache.threshold})")
+
+    start = time.perf_counter()
+    for page in pages.values():
+        image_hashes(page)
+    print(f"Hashing: {(time.perf_counter() - start) * 1000 / max(len(pages), 1):.2f} ms per page")
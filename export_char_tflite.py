@@ -0,0 +1,187 @@
+"""
+Export the Odia character CNN to TFLite
+=======================================
+
+Converts the ``model_results`` SavedModel (or .h5) to ``.tflite`` with
+float16 and full-integer int8 post-training quantization, then compares
+model size, load time and per-batch latency of each export against the
+SavedModel. The exported files are served by ``TFLiteCharClassifier``
+(``CHAR_MODEL_PATH=model_results/simple_cnn_int8.tflite``).
+
+The int8 export calibrates activation ranges on a representative set of
+glyphs segmented from the sample images (or from ``--calibration-dir``).
+
+Usage:
+    python export_char_tflite.py [--model PATH] [--calibration-dir DIR] [--out-dir DIR]
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+import subprocess
+
+import numpy as np
+from PIL import Image
+
+from char_classifier import (DEFAULT_CHAR_MODEL, MODEL_RESULTS_DIR, OdiaCharClassifier,
+                             TFLiteCharClassifier, preprocess_glyphs, load_training_config)
+from glyph_segmentation import segment_page
+
+
+def calibration_glyphs(source_dir=None, img_size=(32, 32), limit=500):
+    """
+    Build the representative dataset for int8 calibration
+
+    Args:
+        source_dir: Folder of glyph images; if omitted, glyphs are segmented
+            from the page images in images/ with glyph_segmentation
+        img_size: Model input size
+        limit: Largest number of glyphs returned
+
+    Returns:
+        numpy.ndarray: float32 (N, H, W, 1) glyph tensor
+    """
+    if source_dir:
+        glyphs = [Image.open(path).convert('L')
+                  for path in sorted(glob.glob(os.path.join(source_dir, '**', '*'), recursive=True))
+                  if path.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp'))]
+        glyphs = preprocess_glyphs(glyphs[:limit], img_size) if glyphs else []
+    else:
+        # Same front end the agent uses, so calibration sees realistic glyphs
+        pages = [segment_page(Image.open(path).convert('L'), size=img_size)[0]
+                 for path in sorted(glob.glob(os.path.join('images', '*.jpeg')))]
+        glyphs = np.concatenate(pages)[:limit] if pages else []
+
+    if len(glyphs) == 0:
+        raise ValueError("No calibration glyphs found")
+    return glyphs
+
+
+def _converter(tf, model_path):
+    if os.path.isdir(model_path):
+        return tf.lite.TFLiteConverter.from_saved_model(model_path)
+    return tf.lite.TFLiteConverter.from_keras_model(tf.keras.models.load_model(model_path, compile=False))
+
+
+def export_tflite(model_path, output_path, quantization="float16", calibration=None):
+    """
+    Convert the character model to a .tflite file
+
+    Args:
+        model_path: SavedModel directory or .h5 file
+        output_path: Destination .tflite file
+        quantization: None (float32), 'float16' or 'int8'
+        calibration: Representative (N, H, W, 1) float32 glyphs, required for int8
+
+    Returns:
+        str: ``output_path``
+    """
+    import tensorflow as tf
+
+    converter = _converter(tf, model_path)
+    if quantization == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        if calibration is None:
+            raise ValueError("int8 quantization needs a calibration set")
+
+        def representative_dataset():
+            for glyph in calibration:
+                yield [glyph[np.newaxis]]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+    return output_path
+
+
+def _model_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path)
+
+
+def cold_import_seconds(module):
+    """Time ``import module`` in a fresh interpreter (None if it is not installed)"""
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    return round(float(result.stdout), 3) if result.returncode == 0 else None
+
+
+def compare(model_paths, glyphs, batch_sizes=(1, 32, 256), repeats=5):
+    """
+    Report size, load time, per-batch latency and top-1 agreement for each model
+
+    Args:
+        model_paths: SavedModel/.h5 path first, then .tflite exports
+        glyphs: (N, H, W, 1) float32 evaluation glyphs
+        batch_sizes: Batch sizes to time
+        repeats: Timed runs per batch size (best run is reported)
+
+    Returns:
+        list: One dict per model
+    """
+    rows, reference = [], None
+    for path in model_paths:
+        classifier = TFLiteCharClassifier(path) if path.endswith('.tflite') else OdiaCharClassifier(path)
+        top1 = [glyph[0][0] for glyph in classifier.predict_batch(glyphs, top_k=1)]
+        reference = reference or top1
+
+        latency = {}
+        for batch_size in batch_sizes:
+            batch = glyphs[np.arange(batch_size) % len(glyphs)]
+            classifier.predict_batch(batch, batch_size=batch_size)
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                classifier.predict_batch(batch, batch_size=batch_size)
+                timings.append(time.perf_counter() - start)
+            latency[batch_size] = round(min(timings) * 1000, 3)
+
+        rows.append({
+            "model": os.path.basename(path.rstrip(os.sep)),
+            "size_kb": round(_model_size(path) / 1024, 1),
+            "load_s": round(classifier.load_time_s, 3),
+            "latency_ms": latency,
+            "top1_agreement": round(float(np.mean([a == b for a, b in zip(top1, reference)])), 4)
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the Odia character CNN to TFLite")
+    parser.add_argument("--model", default=DEFAULT_CHAR_MODEL)
+    parser.add_argument("--calibration-dir", default=None)
+    parser.add_argument("--out-dir", default=MODEL_RESULTS_DIR)
+    args = parser.parse_args()
+
+    _, img_size = load_training_config()
+    glyphs = calibration_glyphs(args.calibration_dir, img_size)
+    print(f"Calibration set: {len(glyphs)} glyphs")
+
+    exports = []
+    for quantization in ("float16", "int8"):
+        path = os.path.join(args.out_dir, f"simple_cnn_{quantization}.tflite")
+        exports.append(export_tflite(args.model, path, quantization, calibration=glyphs))
+        print(f"Wrote {path}")
+
+    print("\nCold import: " + ", ".join(
+        f"{module} {cold_import_seconds(module)}s" for module in ("tensorflow", "tflite_runtime", "ai_edge_litert")))
+
+    print(f"\n{'model':<40}{'size KB':>10}{'load s':>9}  latency ms per batch (1/32/256){'agree':>10}")
+    for row in compare([args.model] + exports, glyphs):
+        latency = " / ".join(str(v) for v in row["latency_ms"].values())
+        print(f"{row['model']:<40}{row['size_kb']:>10}{row['load_s']:>9}  {latency:<31}{row['top1_agreement']:>10}")
+
+
+if __name__ == "__main__":
+    main()
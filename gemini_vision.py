@@ -1,7 +1,13 @@
-import google.generativeai as genai
 from PIL import Image, ImageEnhance, ImageFilter
 import io
 
+from backend_registry import lazy_module
+from predict import predict_multiple_words
+from resilience import backend_timeout, guarded_call
+from rate_limiter import get_rate_limiter
+
+genai = lazy_module("google.generativeai")
+
 
 def setup_gemini(api_key):
     """
@@ -18,6 +24,10 @@ def predict_with_gemini(image, api_key):
     """
     Use AI to recognize text/words from an uploaded image
     
+    Requests are paced to the model's quota (see rate_limiter). Falls back to
+    local Tesseract when the call fails, exceeds GEMINI_TIMEOUT, the quota is
+    exhausted or the circuit breaker is open.
+    
     Args:
         image: PIL Image object
         api_key: AI API key
@@ -37,13 +47,16 @@ def predict_with_gemini(image, api_key):
 Extract the Odia text exactly as written.
 Return only the Odia characters, nothing else."""
         
-        # Generate response
-        response = model.generate_content([prompt, image])
+        def generate(image):
+            response = model.generate_content([prompt, image],
+                                              request_options={"timeout": backend_timeout("gemini")})
+            if response.text:
+                return response.text.strip()
+            else:
+                return "No text detected"
         
-        if response.text:
-            return response.text.strip()
-        else:
-            return "No text detected"
+        # Generate response
+        return guarded_call("gemini", generate, image, fallback=predict_multiple_words, rate_key='gemini-2.0-flash')
             
     except Exception as e:
         return f"Error: {str(e)}"
@@ -64,7 +77,9 @@ def test_gemini_api(api_key):
         model = genai.GenerativeModel('gemini-1.5-pro')
         
         # Test with a simple text prompt
-        response = model.generate_content("Hello, this is a test.")
+        get_rate_limiter().acquire('gemini-1.5-pro')
+        response = model.generate_content("Hello, this is a test.",
+                                          request_options={"timeout": backend_timeout("gemini")})
         return True if response.text else False
         
     except Exception as e:
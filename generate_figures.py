@@ -11,16 +11,19 @@ This script generates all required figures for the LaTeX research paper:
 Run this script to generate all figures before compiling the LaTeX document.
 """
 
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
 import numpy as np
-import seaborn as sns
-from matplotlib.patches import FancyBboxPatch, ConnectionPatch
-import matplotlib.patheffects as path_effects
+from backend_registry import lazy_module
 
-# Set style for professional looking plots
-plt.style.use('seaborn-v0_8-whitegrid')
-sns.set_palette("husl")
+# Plotting libraries are loaded when the first figure is drawn
+plt = lazy_module("matplotlib.pyplot")
+patches = lazy_module("matplotlib.patches")
+path_effects = lazy_module("matplotlib.patheffects")
+sns = lazy_module("seaborn")
+
+def setup_style():
+    """Set style for professional looking plots"""
+    plt.style.use('seaborn-v0_8-whitegrid')
+    sns.set_palette("husl")
 
 def create_agent_architecture():
     """Create the VisionText Agent architecture diagram"""
@@ -42,12 +45,12 @@ def create_agent_architecture():
     boxes = []
     for i, (text, pos, color) in enumerate(stages):
         if i < 6:  # Main pipeline stages
-            box = FancyBboxPatch((pos[0]-1.2, pos[1]-0.4), 2.4, 0.8,
+            box = patches.FancyBboxPatch((pos[0]-1.2, pos[1]-0.4), 2.4, 0.8,
                                boxstyle="round,pad=0.1", 
                                facecolor=color, edgecolor='black', linewidth=2,
                                alpha=0.8)
         else:  # Side stages
-            box = FancyBboxPatch((pos[0]-1.2, pos[1]-0.4), 2.4, 0.8,
+            box = patches.FancyBboxPatch((pos[0]-1.2, pos[1]-0.4), 2.4, 0.8,
                                boxstyle="round,pad=0.1", 
                                facecolor=color, edgecolor='black', linewidth=2,
                                alpha=0.8)
@@ -73,7 +76,7 @@ def create_agent_architecture():
     ax.annotate('', xy=(7, 3.2), xytext=(7, 1.8), arrowprops=arrow_props)
     
     # Add processing metrics boxes
-    metrics_box = FancyBboxPatch((9.5, 6), 3.5, 2.5,
+    metrics_box = patches.FancyBboxPatch((9.5, 6), 3.5, 2.5,
                                boxstyle="round,pad=0.2", 
                                facecolor='#F8F9FA', edgecolor='#2C3E50', linewidth=2,
                                alpha=0.9)
@@ -403,6 +406,7 @@ def main():
     
     try:
         # Generate all figures
+        setup_style()
         create_agent_architecture()
         create_processing_pipeline()
         create_performance_analysis()
@@ -0,0 +1,184 @@
+import cv2
+import numpy as np
+from PIL import Image
+
+from text_detection import binarize, detect_text
+
+
+def _to_gray(image):
+    gray = np.asarray(image.convert("L") if isinstance(image, Image.Image) else image)
+    if gray.ndim == 3:
+        gray = cv2.cvtColor(gray, cv2.COLOR_RGB2GRAY)
+    return np.ascontiguousarray(gray, dtype=np.uint8)
+
+
+def _runs(mask):
+    """Start/stop indices of consecutive True runs in a 1-D mask (private)"""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return edges[0::2], edges[1::2]
+
+
+def _split_wide(ink, x0, x1, max_width):
+    """Cut a too-wide column range at the weakest ink columns (private)"""
+    if x1 - x0 <= max_width:
+        return [(x0, x1)]
+    profile = ink[:, x0:x1].sum(axis=0)
+    # Search for the cut away from the edges so both halves keep a full stroke
+    margin = max((x1 - x0) // 4, 1)
+    cut = x0 + margin + int(np.argmin(profile[margin:-margin]))
+    return _split_wide(ink, x0, cut, max_width) + _split_wide(ink, cut, x1, max_width)
+
+
+def segment_line(line_image, min_ink=2, max_aspect=1.5):
+    """
+    Split a single text line into glyph candidates
+
+    The column projection profile separates glyphs at ink-free columns. Inside
+    each column band, connected components give the vertical extent (so
+    matras above/below the base glyph stay attached), and bands wider than
+    ``max_aspect`` times the line height are cut at their profile minima to
+    separate touching characters.
+
+    Args:
+        line_image (PIL.Image or numpy.ndarray): Line (or word) image
+        min_ink (int): Ink pixels a column needs to count as part of a glyph
+        max_aspect (float): Widest glyph, as a multiple of the line height
+
+    Returns:
+        numpy.ndarray: (N, 4) int array of x0, y0, x1, y1 boxes, left to right
+    """
+    return _segment_ink(binarize(_to_gray(line_image)) > 0, min_ink, max_aspect)
+
+
+def _segment_ink(ink, min_ink=2, max_aspect=1.5):
+    """``segment_line`` on an already binarized ink mask (private)"""
+    if not ink.any():
+        return np.zeros((0, 4), dtype=np.int64)
+
+    rows = np.flatnonzero(ink.any(axis=1))
+    line_height = rows[-1] - rows[0] + 1
+
+    starts, stops = _runs(ink.sum(axis=0) >= min_ink)
+    bands = []
+    for x0, x1 in zip(starts, stops):
+        bands.extend(_split_wide(ink, x0, x1, int(max_aspect * line_height)))
+
+    boxes = []
+    for x0, x1 in bands:
+        band = ink[:, x0:x1].astype(np.uint8)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(band, connectivity=8)
+        if count <= 1:
+            continue
+        # Ignore specks when measuring the vertical extent of the glyph
+        stats = stats[1:]
+        stats = stats[stats[:, 4] >= max(stats[:, 4].max() * 0.05, 2)]
+        y0 = int(stats[:, 1].min())
+        y1 = int((stats[:, 1] + stats[:, 3]).max())
+        boxes.append((int(x0), y0, int(x1), y1))
+
+    return np.array(boxes, dtype=np.int64).reshape(-1, 4)
+
+
+def normalize_glyphs(image, boxes, size=(32, 32)):
+    """
+    Resize every glyph box to ``size`` in one vectorised bilinear gather
+
+    Sampling follows cv2.resize's half-pixel convention and stretches each box
+    to the full output like the training preprocessing did, so the tensor can
+    be fed to the character CNN directly.
+
+    Args:
+        image (PIL.Image or numpy.ndarray): Image the boxes refer to
+        boxes (numpy.ndarray): (N, 4) x0, y0, x1, y1 boxes
+        size (tuple): Output (height, width)
+
+    Returns:
+        numpy.ndarray: float32 tensor of shape (N, height, width, 1) in [0, 1]
+    """
+    gray = _to_gray(image).astype(np.float32) * (1.0 / 255.0)
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    height, width = size
+    if len(boxes) == 0:
+        return np.zeros((0, height, width, 1), dtype=np.float32)
+
+    x0, y0, x1, y1 = boxes.T
+    # Source coordinate of every output pixel centre, per glyph: (N, height) and (N, width)
+    ys = y0[:, None] + (np.arange(height) + 0.5) * ((y1 - y0) / height)[:, None] - 0.5
+    xs = x0[:, None] + (np.arange(width) + 0.5) * ((x1 - x0) / width)[:, None] - 0.5
+    # Clamp to the box (as resizing the crop would), and to the image
+    y_last = np.minimum(y1 - 1, gray.shape[0] - 1)[:, None]
+    x_last = np.minimum(x1 - 1, gray.shape[1] - 1)[:, None]
+    ys = np.clip(ys, y0[:, None], y_last)
+    xs = np.clip(xs, x0[:, None], x_last)
+
+    y_lo = np.floor(ys).astype(np.int64)
+    x_lo = np.floor(xs).astype(np.int64)
+    y_hi = np.minimum(y_lo + 1, y_last.astype(np.int64))
+    x_hi = np.minimum(x_lo + 1, x_last.astype(np.int64))
+    wy = (ys - y_lo)[:, :, None]
+    wx = (xs - x_lo)[:, None, :]
+
+    top = gray[y_lo[:, :, None], x_lo[:, None, :]] * (1 - wx) + gray[y_lo[:, :, None], x_hi[:, None, :]] * wx
+    bottom = gray[y_hi[:, :, None], x_lo[:, None, :]] * (1 - wx) + gray[y_hi[:, :, None], x_hi[:, None, :]] * wx
+    return (top * (1 - wy) + bottom * wy)[..., None].astype(np.float32)
+
+
+def segment_glyphs(line_image, size=(32, 32)):
+    """
+    Segment a line image and normalise its glyphs for the character CNN
+
+    Args:
+        line_image (PIL.Image or numpy.ndarray): Line (or word) image
+        size (tuple): Model input (height, width)
+
+    Returns:
+        tuple: (glyph tensor (N, height, width, 1), boxes (N, 4) x0, y0, x1, y1)
+    """
+    boxes = segment_line(line_image)
+    return normalize_glyphs(line_image, boxes, size), boxes
+
+
+def segment_page(image, size=(32, 32)):
+    """
+    Segment every detected line of a page into one glyph batch
+
+    Args:
+        image (PIL.Image or numpy.ndarray): Page image
+        size (tuple): Model input (height, width)
+
+    Returns:
+        tuple: (glyph tensor (N, height, width, 1), page boxes (N, 4), and a
+        list of (line, word) indices per glyph)
+    """
+    gray = _to_gray(image)
+    # Binarize the page once: a tight word crop is mostly ink, which would flip
+    # the polarity check and hollow out thick strokes if thresholded on its own
+    mask = binarize(gray)
+    detections = detect_text(gray, mask=mask)
+    ink = mask > 0
+
+    boxes, positions = [], []
+    for word_index, word in enumerate(detections["words"]):
+        wx0, wy0, wx1, wy1 = word["bbox"]
+        word_boxes = _segment_ink(ink[wy0:wy1, wx0:wx1])
+        if len(word_boxes):
+            boxes.append(word_boxes + np.array([wx0, wy0, wx0, wy0]))
+            positions.extend((word["line"], word_index) for _ in range(len(word_boxes)))
+
+    boxes = np.concatenate(boxes) if boxes else np.zeros((0, 4), dtype=np.int64)
+    return normalize_glyphs(gray, boxes, size), boxes, positions
+
+
+if __name__ == "__main__":
+    import glob
+    import time
+
+    for path in sorted(glob.glob("images/*.jpeg")):
+        page = Image.open(path).convert("L")
+        segment_page(page)
+        start = time.perf_counter()
+        glyphs, boxes, positions = segment_page(page)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{path}: {len(boxes)} glyphs in {len({p[1] for p in positions})} words, "
+              f"tensor {glyphs.shape}, {elapsed:.1f} ms")
@@ -1,14 +1,55 @@
+import os
 import base64
 import requests
 import json
 from PIL import Image
 import io
 
+from predict import predict_word_from_pil, predict_multiple_words
+from resilience import backend_timeout, guarded_call
+from rate_limiter import get_rate_limiter
+
+# GOOGLE_VISION_ENDPOINT overrides this, e.g. with a proxy or the stub server in tests/test_resilience.py
+DEFAULT_ENDPOINT = "https://vision.googleapis.com/v1/images:annotate"
+
+
+class VisionServiceError(RuntimeError):
+    """Server-side failure (5xx or rate limit) that counts against the circuit breaker"""
+
+    def __init__(self, message, code=None, retry_after=None):
+        super().__init__(message)
+        self.code = code
+        self.retry_after = retry_after
+
+
+def _endpoint(api_key):
+    return f"{os.getenv('GOOGLE_VISION_ENDPOINT', DEFAULT_ENDPOINT)}?key={api_key}"
+
+
+def _post(data, api_key):
+    """POST an annotate request with the backend timeout, raising on server-side failures"""
+    response = requests.post(_endpoint(api_key), headers={"Content-Type": "application/json"}, json=data,
+                             timeout=backend_timeout("google_vision"))
+    if response.status_code >= 500 or response.status_code == 429:
+        raise VisionServiceError(f"API Error: {response.status_code} - {response.text}", code=response.status_code,
+                                 retry_after=response.headers.get("Retry-After"))
+    return response
+
+
+def _local_fallback(pil_image, api_key, mode="single_word"):
+    """Local Tesseract path used while Google Vision is failing"""
+    return predict_word_from_pil(pil_image) if mode == "single_word" else predict_multiple_words(pil_image)
+
 
 def predict_with_google_vision(pil_image, api_key, mode="single_word"):
     """
     Use Google Vision API to extract text from image.
     
+    Calls are paced to the GOOGLE_VISION quota and time out after
+    GOOGLE_VISION_TIMEOUT seconds; failed or timed-out calls, and every call
+    while the quota is exhausted or the circuit breaker is open, are answered
+    by the local Tesseract path instead.
+    
     Args:
         pil_image (PIL.Image): PIL Image object
         api_key (str): Google Vision API key
@@ -18,67 +59,64 @@ def predict_with_google_vision(pil_image, api_key, mode="single_word"):
         str: Predicted text from the image
     """
     try:
-        # Convert PIL image to base64
-        buffered = io.BytesIO()
-        pil_image.save(buffered, format="PNG")
-        img_base64 = base64.b64encode(buffered.getvalue()).decode()
-        
-        # Prepare the request
-        url = f"https://vision.googleapis.com/v1/images:annotate?key={api_key}"
-        
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "requests": [
-                {
-                    "image": {
-                        "content": img_base64
-                    },
-                    "features": [
-                        {
-                            "type": "TEXT_DETECTION",
-                            "maxResults": 10
-                        }
-                    ]
-                }
-            ]
-        }
-        
-        # Make the API request
-        response = requests.post(url, headers=headers, json=data)
+        return guarded_call("google_vision", _annotate_text, pil_image, api_key, mode,
+                            fallback=_local_fallback, rate_key="google_vision")
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+
+def _annotate_text(pil_image, api_key, mode="single_word"):
+    """Request TEXT_DETECTION and pick the text for ``mode`` (private)"""
+    # Convert PIL image to base64
+    buffered = io.BytesIO()
+    pil_image.save(buffered, format="PNG")
+    img_base64 = base64.b64encode(buffered.getvalue()).decode()
+    
+    data = {
+        "requests": [
+            {
+                "image": {
+                    "content": img_base64
+                },
+                "features": [
+                    {
+                        "type": "TEXT_DETECTION",
+                        "maxResults": 10
+                    }
+                ]
+            }
+        ]
+    }
+    
+    # Make the API request
+    response = _post(data, api_key)
+    
+    if response.status_code == 200:
+        result = response.json()
         
-        if response.status_code == 200:
-            result = response.json()
+        if "responses" in result and len(result["responses"]) > 0:
+            response_data = result["responses"][0]
             
-            if "responses" in result and len(result["responses"]) > 0:
-                response_data = result["responses"][0]
+            if "textAnnotations" in response_data and len(response_data["textAnnotations"]) > 0:
+                # Get the full text
+                full_text = response_data["textAnnotations"][0]["description"]
                 
-                if "textAnnotations" in response_data and len(response_data["textAnnotations"]) > 0:
-                    # Get the full text
-                    full_text = response_data["textAnnotations"][0]["description"]
-                    
-                    if mode == "single_word":
-                        # Return just the first word for single word mode
-                        words = full_text.strip().split()
-                        if words:
-                            return words[0]
-                        else:
-                            return "No text detected"
+                if mode == "single_word":
+                    # Return just the first word for single word mode
+                    words = full_text.strip().split()
+                    if words:
+                        return words[0]
                     else:
-                        # Return full text for multiple words mode
-                        return full_text.strip()
+                        return "No text detected"
                 else:
-                    return "No text detected"
+                    # Return full text for multiple words mode
+                    return full_text.strip()
             else:
                 return "No text detected"
         else:
-            return f"API Error: {response.status_code} - {response.text}"
-            
-    except Exception as e:
-        return f"Error: {str(e)}"
-
+            return "No text detected"
+    else:
+        return f"API Error: {response.status_code} - {response.text}"
 
 def get_google_vision_confidence(pil_image, api_key):
     """
@@ -97,13 +135,6 @@ def get_google_vision_confidence(pil_image, api_key):
         pil_image.save(buffered, format="PNG")
         img_base64 = base64.b64encode(buffered.getvalue()).decode()
         
-        # Prepare the request
-        url = f"https://vision.googleapis.com/v1/images:annotate?key={api_key}"
-        
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
         data = {
             "requests": [
                 {
@@ -121,7 +152,8 @@ def get_google_vision_confidence(pil_image, api_key):
         }
         
         # Make the API request
-        response = requests.post(url, headers=headers, json=data)
+        get_rate_limiter().acquire("google_vision")
+        response = _post(data, api_key)
         
         if response.status_code == 200:
             result = response.json()
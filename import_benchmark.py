@@ -0,0 +1,115 @@
+"""
+Import-time budget check
+========================
+
+Imports each entry-point module in a fresh interpreter with
+``python -X importtime`` and compares the cumulative import time against a
+cold-start budget. The heaviest nested imports are listed so a regression
+(a backend imported at module level again) is easy to trace.
+
+Usage:
+    python import_benchmark.py [--top N] [--scale FACTOR] [module ...]
+
+Exits non-zero when any module is over its budget. ``--scale`` loosens all
+budgets on slow machines.
+"""
+
+import sys
+import argparse
+import subprocess
+
+# Cold-start budgets in seconds (cumulative import time of the module)
+BUDGETS = {
+    "app": 1.0,
+    "service": 0.5,
+    "vision_agent": 0.6,
+    "predict": 0.3,
+    "vision_transformer": 0.3,
+    "char_classifier": 0.3,
+    "generate_figures": 0.3,
+    "export_char_tflite": 0.5,
+    "region_recognition": 0.3,
+}
+
+
+def measure_imports(module):
+    """
+    Import a module in a fresh interpreter and parse ``-X importtime`` output
+
+    Args:
+        module (str): Module to import
+
+    Returns:
+        dict: Imported module name -> cumulative import time in seconds, or
+        None if the import failed
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Indentation marks nesting; keep the largest figure seen per name
+        name = name.strip()
+        timings[name] = max(timings.get(name, 0.0), int(cumulative) / 1e6)
+    return timings
+
+
+def check_budgets(modules, top=5, scale=1.0):
+    """
+    Measure each module and compare it to its budget
+
+    Args:
+        modules (list): Module names (must have an entry in BUDGETS)
+        top (int): Heaviest dependencies listed per module
+        scale (float): Multiplier applied to every budget
+
+    Returns:
+        list: One dict per module with seconds, budget, status and heaviest imports
+    """
+    rows = []
+    for module in modules:
+        timings = measure_imports(module)
+        budget = round(BUDGETS.get(module, 0.5) * scale, 3)
+        if timings is None:
+            rows.append({"module": module, "seconds": None, "budget": budget, "ok": False, "heaviest": []})
+            continue
+
+        seconds = timings.get(module, 0.0)
+        heaviest = sorted(((name, t) for name, t in timings.items()
+                           if name != module and "." not in name), key=lambda item: -item[1])[:top]
+        rows.append({
+            "module": module,
+            "seconds": round(seconds, 3),
+            "budget": budget,
+            "ok": seconds <= budget,
+            "heaviest": [(name, round(t, 3)) for name, t in heaviest]
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check cold-start import times against budgets")
+    parser.add_argument("modules", nargs="*", default=list(BUDGETS))
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0)
+    args = parser.parse_args()
+
+    rows = check_budgets(args.modules, top=args.top, scale=args.scale)
+    print(f"{'module':<22}{'import s':>10}{'budget s':>10}  status  heaviest imports")
+    for row in rows:
+        seconds = "failed" if row["seconds"] is None else row["seconds"]
+        status = "ok" if row["ok"] else "OVER"
+        heaviest = ", ".join(f"{name} {t}s" for name, t in row["heaviest"])
+        print(f"{row['module']:<22}{seconds:>10}{row['budget']:>10}  {status:<6}  {heaviest}")
+
+    return 0 if all(row["ok"] for row in rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
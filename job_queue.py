@@ -0,0 +1,294 @@
+"""
+Local job queue for the VisionText Agent
+========================================
+
+Accepts uploads, hands back a job id immediately and runs the multi-stage
+pipeline on a worker pool, so the Streamlit script thread only polls for
+status instead of blocking on a long recognition run.
+
+Jobs live in memory; pass ``db_path`` to also persist job status and
+recognized text in SQLite, so finished jobs survive a server restart.
+Finished jobs (with their images' stage results) are dropped from memory
+after ``JOB_RESULT_TTL`` seconds, or oldest first beyond ``JOB_MAX_FINISHED``
+jobs; with persistence, their status and text are then read back from SQLite.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+INTERRUPTED = "interrupted"
+
+
+class _SQLiteJobStore:
+    """Minimal SQLite persistence for job status snapshots (private)"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, created_at REAL, status TEXT, payload TEXT)"
+            )
+
+    def save(self, snapshot):
+        """Insert or update a job snapshot"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, created_at, status, payload) VALUES (?, ?, ?, ?)",
+                (snapshot["job_id"], snapshot["created_at"], snapshot["status"], json.dumps(snapshot))
+            )
+
+    def load(self, job_id):
+        """Load one job snapshot, or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_all(self):
+        """Load every stored job snapshot, oldest first"""
+        with self._lock:
+            rows = self._conn.execute("SELECT payload FROM jobs ORDER BY created_at").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    """
+    In-process job queue running ``process_image_with_agent`` on a worker pool
+
+    Every image of a job is scheduled as its own task, so a multi-image upload
+    is processed concurrently. Stage progress reported by the agent is recorded
+    per image and can be polled with ``status``.
+    """
+
+    def __init__(self, agent, max_workers=None, db_path=None, compact=True, result_ttl=None, max_finished=None):
+        """
+        Args:
+            agent (VisionTextAgent): Agent shared by all workers
+            max_workers (int): Worker pool size (defaults to JOB_WORKERS or 4)
+            db_path (str): Optional SQLite file for persisting job status
+            compact (bool): Keep slim ``AgentResult`` payloads instead of full stage dicts
+            result_ttl (float): Seconds a finished job stays in memory (defaults
+                to JOB_RESULT_TTL or 3600)
+            max_finished (int): Finished jobs kept in memory, oldest dropped
+                first (defaults to JOB_MAX_FINISHED or 256)
+        """
+        self.agent = agent
+        self.compact = compact
+        self.max_workers = max_workers or int(os.getenv('JOB_WORKERS', 4))
+        self.result_ttl = float(result_ttl if result_ttl is not None else os.getenv('JOB_RESULT_TTL', 3600))
+        self.max_finished = int(max_finished if max_finished is not None else os.getenv('JOB_MAX_FINISHED', 256))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="vision-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._results = {}
+        self._store = _SQLiteJobStore(db_path) if db_path else None
+
+        if self._store:
+            self._restore()
+            with self._lock:
+                self._evict()
+
+    def submit(self, images, names=None):
+        """
+        Queue one or more images for processing
+
+        Args:
+            images (list): PIL Images (a single image is also accepted)
+            names (list): Optional display names, one per image
+
+        Returns:
+            str: Job id to poll with ``status``
+        """
+        if not isinstance(images, (list, tuple)):
+            images = [images]
+        names = list(names) if names else [f"image_{i + 1}" for i in range(len(images))]
+
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            "job_id": job_id,
+            "created_at": time.time(),
+            "status": QUEUED,
+            "items": [
+                {
+                    "index": i,
+                    "name": name,
+                    "status": QUEUED,
+                    "stage": "Waiting for a worker",
+                    "progress": 0,
+                    "text": None,
+                    "error": None,
+                    "started_at": None,
+                    "finished_at": None,
+                    "latency_s": None
+                }
+                for i, name in enumerate(names)
+            ]
+        }
+
+        with self._lock:
+            self._evict()
+            self._jobs[job_id] = job
+            self._results[job_id] = [None] * len(images)
+        self._persist(job_id)
+
+        for index, image in enumerate(images):
+            self._executor.submit(self._run_item, job_id, index, image)
+
+        return job_id
+
+    def status(self, job_id):
+        """
+        Get a snapshot of a job's status and per-image stage progress
+
+        Args:
+            job_id (str): Job id returned by ``submit``
+
+        Returns:
+            dict: Job snapshot (``None`` if the job is unknown)
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            snapshot = None if job is None else {**job, "items": [dict(item) for item in job["items"]]}
+
+        if snapshot is None:
+            # Evicted from memory; the persisted snapshot is final
+            snapshot = self._store.load(job_id) if self._store else None
+            if snapshot is None:
+                return None
+
+        items = snapshot["items"]
+        snapshot["progress"] = round(sum(item["progress"] for item in items) / max(len(items), 1))
+        snapshot["done"] = snapshot["status"] in (COMPLETED, FAILED, INTERRUPTED)
+        return snapshot
+
+    def is_done(self, job_id):
+        """Check whether every image of a job has finished"""
+        snapshot = self.status(job_id)
+        return snapshot is not None and snapshot["done"]
+
+    def result(self, job_id, index=0):
+        """
+        Get the agent output for one image of a finished job
+
+        Args:
+            job_id (str): Job id returned by ``submit``
+            index (int): Image position within the job
+
+        Returns:
+            tuple: (final_text, stage_results); stage results (an ``AgentResult``
+            in compact mode) are only kept in memory, so restored jobs return
+            their text with empty stage results
+        """
+        with self._lock:
+            results = self._results.get(job_id)
+            job = self._jobs.get(job_id)
+
+        if results and results[index] is not None:
+            return results[index]
+        if job is None:
+            job = self._store.load(job_id) if self._store else None
+            if job is None:
+                return None, {}
+
+        item = job["items"][index]
+        if item["status"] == FAILED:
+            return f"Error: {item['error']}", {}
+        return item["text"], {}
+
+    def list_jobs(self):
+        """Snapshots of all known jobs, newest first"""
+        with self._lock:
+            job_ids = list(self._jobs)
+        return sorted((self.status(job_id) for job_id in job_ids), key=lambda job: job["created_at"], reverse=True)
+
+    def shutdown(self, wait=True):
+        """Stop the worker pool and close the persistence layer"""
+        self._executor.shutdown(wait=wait)
+        if self._store:
+            self._store.close()
+
+    def _run_item(self, job_id, index, image):
+        """Process a single image of a job on a worker thread (private)"""
+        def progress_callback(stage_msg, progress):
+            self._update_item(job_id, index, stage=stage_msg, progress=progress)
+
+        started_at = time.time()
+        self._update_item(job_id, index, status=RUNNING, stage="Starting", started_at=started_at)
+
+        try:
+            final_text, stage_results = self.agent.process_image_with_agent(
+                image, progress_callback=progress_callback, compact=self.compact)
+            with self._lock:
+                self._results[job_id][index] = (final_text, stage_results)
+            self._update_item(job_id, index, status=COMPLETED, stage="Completed", progress=100,
+                              text=final_text, finished_at=time.time(),
+                              latency_s=round(time.time() - started_at, 3))
+        except Exception as e:
+            self._update_item(job_id, index, status=FAILED, stage="Failed", progress=100,
+                              error=str(e), finished_at=time.time(),
+                              latency_s=round(time.time() - started_at, 3))
+
+    def _update_item(self, job_id, index, **changes):
+        """Apply changes to an item and recompute the job status (private)"""
+        with self._lock:
+            job = self._jobs[job_id]
+            job["items"][index].update(changes)
+
+            statuses = [item["status"] for item in job["items"]]
+            if all(s in (COMPLETED, FAILED) for s in statuses):
+                job["status"] = FAILED if all(s == FAILED for s in statuses) else COMPLETED
+                job.setdefault("finished_at", time.time())
+            elif any(s != QUEUED for s in statuses):
+                job["status"] = RUNNING
+
+        # Progress ticks stay in memory; only status transitions hit the database
+        if "status" in changes:
+            self._persist(job_id)
+
+    def _evict(self):
+        """Drop finished jobs past the TTL, then the oldest beyond ``max_finished`` (private, lock held)"""
+        finished = sorted((job.get("finished_at") or job["created_at"], job_id)
+                          for job_id, job in self._jobs.items()
+                          if job["status"] in (COMPLETED, FAILED, INTERRUPTED))
+        expired = time.time() - self.result_ttl
+        excess = len(finished) - self.max_finished
+
+        for i, (finished_at, job_id) in enumerate(finished):
+            if finished_at >= expired and i >= excess:
+                break
+            del self._jobs[job_id]
+            self._results.pop(job_id, None)
+
+    def _persist(self, job_id):
+        """Write a job snapshot to SQLite if persistence is enabled (private)"""
+        if self._store:
+            self._store.save(self.status(job_id))
+
+    def _restore(self):
+        """Reload persisted jobs; unfinished ones are marked interrupted (private)"""
+        for snapshot in self._store.load_all():
+            snapshot.pop("progress", None)
+            snapshot.pop("done", None)
+            if snapshot["status"] in (QUEUED, RUNNING):
+                snapshot["status"] = INTERRUPTED
+                for item in snapshot["items"]:
+                    if item["status"] in (QUEUED, RUNNING):
+                        item["status"] = INTERRUPTED
+                        item["stage"] = "Interrupted by server restart"
+            self._jobs[snapshot["job_id"]] = snapshot
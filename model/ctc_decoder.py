@@ -0,0 +1,300 @@
+"""
+CTC prefix beam search with a character n-gram language model and an optional lexicon.
+Decodes the `conf_mats` (model output with `ctc_decode=False`, log posteriors)
+in-process, without Kaldi.
+ * Frames whose only candidate is the blank are skipped in runs (cumulative sums).
+ * Beams are extended for all candidate characters at once (numpy), and the LM
+   distribution of each context is computed once and cached.
+ * Lines are decoded in parallel processes when `processes` > 1.
+"""
+
+import math
+import multiprocessing
+import numpy as np
+
+
+SPACE_TK, BOS_TK, EOS_TK, UNK_TK = "<space>", "<s>", "</s>", "<unk>"
+NEG_INF = -np.inf
+
+
+class ArpaLM():
+    """Back-off n-gram language model read from an ARPA file (SRILM, KenLM, ...)"""
+
+    def __init__(self, path, chars, floor=-10.0):
+        """
+        `chars` are the decoder symbols by id (space as " ", mapped to <space>).
+        Ids len(chars) and len(chars) + 1 are <s> and </s>.
+        """
+
+        self.chars = list(chars)
+        self.bos, self.eos = len(self.chars), len(self.chars) + 1
+        self.size = len(self.chars) + 2
+        self.floor = floor
+
+        index = {(SPACE_TK if c == " " else c): i for i, c in enumerate(self.chars)}
+        index[BOS_TK], index[EOS_TK] = self.bos, self.eos
+
+        self.order = 0
+        self.backoff = {}
+        entries = {}
+        unk = None
+        section = 0
+
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+
+                if not line or line == "\\data\\" or line.startswith("ngram "):
+                    continue
+                if line == "\\end\\":
+                    break
+                if line.startswith("\\") and line.endswith("-grams:"):
+                    section = int(line[1:line.index("-")])
+                    self.order = max(self.order, section)
+                    continue
+
+                parts = line.split()
+                tokens = parts[1:1 + section]
+                logp = float(parts[0]) * math.log(10)
+
+                if section == 1 and tokens[0] == UNK_TK:
+                    unk = logp
+                    continue
+                if any(t not in index for t in tokens):
+                    continue
+
+                ids = tuple(index[t] for t in tokens)
+                entries.setdefault(ids[:-1], {})[ids[-1]] = logp
+
+                if len(parts) > 1 + section:
+                    self.backoff[ids] = float(parts[1 + section]) * math.log(10)
+
+        self.unk = unk if unk is not None else floor * math.log(10)
+        # context -> (next ids, log probs), for one vectorised assignment per context
+        self.explicit = {ctx: (np.fromiter(d.keys(), dtype=np.int64), np.fromiter(d.values(), dtype=np.float64))
+                         for ctx, d in entries.items()}
+        self._cache = {}
+
+    def next_log_probs(self, context):
+        """Natural-log distribution of the next symbol (all ids) after a context tuple"""
+
+        context = tuple(context[-(self.order - 1):]) if self.order > 1 else ()
+        dist = self._cache.get(context)
+
+        if dist is None:
+            if context:
+                dist = self.next_log_probs(context[1:]) + self.backoff.get(context, 0.0)
+            else:
+                dist = np.full(self.size, self.unk, dtype=np.float64)
+
+            if context in self.explicit:
+                ids, logps = self.explicit[context]
+                dist = dist.copy()
+                dist[ids] = logps
+
+            dist[self.bos] = NEG_INF
+            self._cache[context] = dist
+
+        return dist
+
+
+class LexiconTrie():
+    """Prefix tree of allowed words; characters outside every word act as word boundaries"""
+
+    def __init__(self, words, chars):
+        index = {c: i for i, c in enumerate(chars)}
+        self.size = len(chars)
+        self.children = [{}]
+        self.is_word = [False]
+        word_chars = set()
+
+        for word in words:
+            if not word or any(c not in index for c in word):
+                continue
+
+            node = 0
+            for c in word:
+                word_chars.add(index[c])
+                child = self.children[node].get(index[c])
+
+                if child is None:
+                    child = len(self.children)
+                    self.children[node][index[c]] = child
+                    self.children.append({})
+                    self.is_word.append(False)
+                node = child
+
+            self.is_word[node] = True
+
+        self.boundary = np.ones(self.size, dtype=bool)
+        self.boundary[list(word_chars)] = False
+        self._cache = {}
+
+    def transitions(self, node):
+        """Next node per character id (-1 where the character is not allowed after `node`)"""
+
+        table = self._cache.get(node)
+
+        if table is None:
+            table = np.full(self.size, -1, dtype=np.int64)
+
+            if node == 0 or self.is_word[node]:
+                table[self.boundary] = 0
+
+            for char, child in self.children[node].items():
+                table[char] = child
+
+            self._cache[node] = table
+
+        return table
+
+    def can_end(self, node):
+        """Whether a line may end in `node`"""
+
+        return node == 0 or self.is_word[node]
+
+
+class CTCBeamDecoder():
+    """CTC prefix beam search over posteriors whose last column is the blank"""
+
+    def __init__(self, chars, lm=None, lexicon=None, alpha=0.5, beta=1.0, beam_width=16, prune=1e-3,
+                 log_probs=False):
+        """
+        `chars` are the symbols of columns 0..C-2 (tokenizer.chars); `alpha` weights the LM,
+        `beta` is the bonus per emitted character (with an LM), `prune` drops characters
+        below that posterior. With `log_probs`, inputs are log posteriors (HTRModel.predict).
+        """
+
+        self.chars = list(chars)
+        self.lm = lm
+        self.lexicon = lexicon
+        self.alpha = alpha
+        self.beta = beta
+        self.beam_width = beam_width
+        self.prune = math.log(prune)
+        self.log_probs = log_probs
+
+    def decode(self, posteriors):
+        """Best text and its score for one (T, C) posterior matrix"""
+
+        if self.log_probs:
+            logp = np.asarray(posteriors, dtype=np.float64)
+        else:
+            logp = np.log(np.maximum(np.asarray(posteriors, dtype=np.float64), 1e-30))
+        blank = logp.shape[1] - 1
+        candidates = logp[:, :blank] >= self.prune
+        candidates[np.arange(len(logp)), logp[:, :blank].argmax(axis=1)] = True
+        candidates &= (logp[:, :blank] > logp[:, blank:] + self.prune)
+
+        # Frames with no candidate only add the blank: handled in runs with a cumulative sum
+        active = np.flatnonzero(candidates.any(axis=1))
+        blank_cum = np.concatenate([[0.0], np.cumsum(logp[:, blank])])
+
+        lm_bos = (self.lm.bos,) if self.lm else ()
+        context_size = max(self.lm.order - 1, 1) if self.lm else 0
+        prefixes = [()]
+        p_b, p_nb = np.array([0.0]), np.array([NEG_INF])
+        bonus = np.array([0.0])
+        contexts, nodes = [lm_bos], [0]
+        t_prev = 0
+
+        for t in active.tolist():
+            if t > t_prev:
+                p_b = np.logaddexp(p_b, p_nb) + (blank_cum[t] - blank_cum[t_prev])
+                p_nb = np.full_like(p_nb, NEG_INF)
+
+            row = logp[t]
+            cand = np.flatnonzero(candidates[t])
+            last = np.array([p[-1] if p else -1 for p in prefixes])
+            total = np.logaddexp(p_b, p_nb)
+
+            # Stay: blank, or the last character repeated (collapsed)
+            stay_b = total + row[blank]
+            stay_nb = np.where(last >= 0, p_nb + row[np.maximum(last, 0)], NEG_INF)
+
+            # Extend every beam by every candidate at once; a repeat needs a blank in between
+            ext = np.where(cand[None, :] == last[:, None], p_b[:, None], total[:, None]) + row[cand][None, :]
+            ext_bonus = np.broadcast_to(bonus[:, None], ext.shape)
+
+            if self.lm:
+                # The per-character bonus offsets the LM's preference for short lines
+                lm = np.stack([self.lm.next_log_probs(c) for c in contexts])[:, cand]
+                ext_bonus = ext_bonus + self.alpha * lm + self.beta
+
+            if self.lexicon:
+                next_nodes = np.stack([self.lexicon.transitions(n) for n in nodes])[:, cand]
+                ext = np.where(next_nodes >= 0, ext, NEG_INF)
+
+            # Only extensions that could reach the beam go through the (Python) merge
+            ext_score = ext + ext_bonus
+            scores = np.concatenate([np.logaddexp(stay_b, stay_nb) + bonus, ext_score.ravel()])
+            cutoff = np.partition(scores, -self.beam_width)[-self.beam_width] if len(scores) > self.beam_width else NEG_INF
+
+            merged = {}
+            for b, prefix in enumerate(prefixes):
+                merged[prefix] = [stay_b[b], stay_nb[b], bonus[b], contexts[b], nodes[b]]
+
+            for b, k in zip(*np.nonzero((ext_score >= cutoff) & (ext > NEG_INF))):
+                prefix = prefixes[b] + (int(cand[k]),)
+                entry = merged.get(prefix)
+
+                if entry is None:
+                    context = (contexts[b] + (int(cand[k]),))[-context_size:] if self.lm else ()
+                    node = int(next_nodes[b, k]) if self.lexicon else 0
+                    merged[prefix] = [NEG_INF, ext[b, k], ext_bonus[b, k], context, node]
+                else:
+                    entry[1] = np.logaddexp(entry[1], ext[b, k])
+
+            prefixes = list(merged)
+            values = list(merged.values())
+            p_b = np.array([v[0] for v in values])
+            p_nb = np.array([v[1] for v in values])
+            bonus = np.array([v[2] for v in values])
+
+            keep = np.argsort(-(np.logaddexp(p_b, p_nb) + bonus), kind="stable")[:self.beam_width]
+            prefixes = [prefixes[i] for i in keep]
+            p_b, p_nb, bonus = p_b[keep], p_nb[keep], bonus[keep]
+            contexts = [values[i][3] for i in keep]
+            nodes = [values[i][4] for i in keep]
+            t_prev = t + 1
+
+        p_b = np.logaddexp(p_b, p_nb) + (blank_cum[len(logp)] - blank_cum[t_prev])
+        scores = p_b + bonus
+
+        if self.lm:
+            scores = scores + self.alpha * np.array([self.lm.next_log_probs(c)[self.lm.eos] for c in contexts])
+        if self.lexicon:
+            scores = np.where([self.lexicon.can_end(n) for n in nodes], scores, NEG_INF)
+
+        best = int(np.argmax(scores))
+        return "".join(self.chars[c] for c in prefixes[best]), float(scores[best])
+
+    def decode_batch(self, posteriors, processes=None):
+        """Decode a list of posterior matrices (lines), in `processes` worker processes if > 1"""
+
+        return list(self.decode_batches([posteriors], processes))
+
+    def decode_batches(self, batches, processes=None):
+        """Decode an iterable of batches as they arrive (yield), one worker pool for all of them"""
+
+        if not processes or processes < 2:
+            for batch in batches:
+                yield from (self.decode(x) for x in batch)
+            return
+
+        global _worker_decoder
+        _worker_decoder = self
+
+        with multiprocessing.get_context("fork").Pool(processes) as pool:
+            for batch in batches:
+                batch = list(batch)
+                yield from pool.map(_decode_line, batch, chunksize=max(1, len(batch) // (processes * 4)))
+
+
+_worker_decoder = None
+
+
+def _decode_line(posteriors):
+    """Decode one line with the decoder inherited by the forked worker"""
+
+    return _worker_decoder.decode(posteriors)
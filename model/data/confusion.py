@@ -0,0 +1,248 @@
+"""
+Weighted edit distance with an OCR confusion model.
+ * Look-alike characters ('0'/'o', '1'/'l', '5'/'S') substitute cheaply.
+ * Look-alike groups ('rn'/'m', 'cl'/'d') merge or split cheaply, one operation.
+ * Specks read as punctuation ('.', ',', "'") are cheap to insert or delete.
+ * Adjacent transpositions can be enabled (off for CER, which is plain Levenshtein).
+ * Batches of string pairs are aligned in one numpy DP: rows advance in a loop,
+   while pairs and columns are vectorised (insertions through a running minimum).
+"""
+
+import numpy as np
+
+
+# (recognized, truth, cost), applied in both directions
+CONFUSIONS = (
+    ("o", "0", 0.3), ("O", "0", 0.3), ("O", "Q", 0.4), ("0", "Q", 0.4), ("o", "O", 0.3),
+    ("l", "1", 0.3), ("I", "1", 0.3), ("l", "I", 0.3), ("|", "l", 0.3), ("|", "1", 0.3), ("|", "I", 0.3),
+    ("S", "5", 0.3), ("s", "5", 0.4), ("S", "$", 0.4), ("5", "$", 0.4),
+    ("B", "8", 0.3), ("B", "R", 0.5), ("8", "R", 0.5),
+    ("c", "C", 0.4), ("s", "S", 0.4), ("v", "V", 0.4), ("w", "W", 0.4), ("x", "X", 0.4), ("z", "Z", 0.4),
+    ("rn", "m", 0.3), ("cl", "d", 0.3), ("vv", "w", 0.3), ("nn", "m", 0.5), ("ri", "n", 0.5),
+)
+
+# Insertion/deletion cost of characters that specks and stains turn into
+NOISE_COSTS = {".": 0.5, ",": 0.5, "'": 0.5, "`": 0.5}
+
+
+class ConfusionCosts:
+    """Substitution, merge/split and insertion/deletion costs of an OCR confusion model"""
+
+    def __init__(self, confusions=CONFUSIONS, noise_costs=None, default=1.0, transposition=None):
+        self.default = default
+        self.transposition = transposition
+        self.substitution = {}
+        self.groups = {}
+        self.indel = dict(NOISE_COSTS if noise_costs is None else noise_costs)
+
+        for recognized, truth, cost in confusions:
+            for source, target in ((recognized, truth), (truth, recognized)):
+                if len(source) == 1 and len(target) == 1:
+                    self.substitution[(source, target)] = min(cost, self.substitution.get((source, target), default))
+                elif len(source) + len(target) == 3:
+                    self.groups[(source, target)] = min(cost, self.groups.get((source, target), default))
+                else:
+                    raise ValueError(f"Only 1:1, 2:1 and 1:2 confusions are supported: {source!r} -> {target!r}")
+
+    def similar(self, text):
+        """Characters or groups commonly confused with `text` (one character or a 2-character group)"""
+        pairs = list(self.substitution.items()) + list(self.groups.items())
+        return [target for (source, target), _ in sorted(pairs, key=lambda item: item[1]) if source == text]
+
+    def matrix(self, alphabet):
+        """Dense substitution cost matrix over a list of characters"""
+        index = {char: i for i, char in enumerate(alphabet)}
+        matrix = np.full((len(alphabet), len(alphabet)), self.default, dtype=np.float64)
+        np.fill_diagonal(matrix, 0.0)
+
+        for (source, target), cost in self.substitution.items():
+            if source in index and target in index:
+                matrix[index[source], index[target]] = cost
+        return matrix
+
+    def indel_costs(self, alphabet):
+        """Insertion/deletion cost per character of a list of characters"""
+        return np.array([self.indel.get(char, self.default) for char in alphabet], dtype=np.float64)
+
+
+_default_costs = None
+
+
+def default_costs():
+    """Shared cost model built from CONFUSIONS and NOISE_COSTS"""
+
+    global _default_costs
+
+    if _default_costs is None:
+        _default_costs = ConfusionCosts()
+
+    return _default_costs
+
+
+def _codes(texts, width):
+    """Code points of each text, zero-padded to `width` columns"""
+
+    return np.array(texts, dtype=f"<U{max(width, 1)}").view(np.uint32).reshape(len(texts), max(width, 1))
+
+
+def _batch_distances(predicts, ground_truth, costs):
+    """Weighted distances of one batch of pairs"""
+
+    n = len(predicts)
+    la = np.fromiter((len(x) for x in predicts), dtype=np.int64, count=n)
+    lb = np.fromiter((len(x) for x in ground_truth), dtype=np.int64, count=n)
+    a_codes, b_codes = _codes(predicts, int(la.max())), _codes(ground_truth, int(lb.max()))
+
+    # Alphabet of this batch; code point 0 is the padding
+    alphabet, inverse = np.unique(np.concatenate([a_codes.ravel(), b_codes.ravel()]), return_inverse=True)
+    a_idx, b_idx = inverse[:a_codes.size].reshape(a_codes.shape), inverse[a_codes.size:].reshape(b_codes.shape)
+    chars = [chr(c) for c in alphabet.tolist()]
+    substitution, indel = costs.matrix(chars), costs.indel_costs(chars)
+
+    # Merge (2 recognized -> 1 true) and split (1 recognized -> 2 true) rules, as masks
+    # over the recognized positions and the truth columns they apply to
+    present = set(chars)
+    merges, splits = [], []
+
+    for (source, target), cost in costs.groups.items():
+        if not set(source + target) <= present:
+            continue
+        if len(source) == 2:
+            a_hit = (a_codes[:, :-1] == ord(source[0])) & (a_codes[:, 1:] == ord(source[1]))
+            merges.append((a_hit, b_codes == ord(target), cost))
+        elif b_codes.shape[1] > 1:
+            b_hit = (b_codes[:, :-1] == ord(target[0])) & (b_codes[:, 1:] == ord(target[1]))
+            splits.append((a_codes == ord(source), b_hit, cost))
+
+    if costs.transposition is not None and b_codes.shape[1] > 1:
+        # swapped[:, i, j]: a[i:i + 2] is b[j:j + 2] reversed (and not a doubled letter)
+        swapped = ((a_codes[:, :-1, None] == b_codes[:, None, 1:]) & (a_codes[:, 1:, None] == b_codes[:, None, :-1])
+                   & (a_codes[:, :-1] != a_codes[:, 1:])[:, :, None])
+    else:
+        swapped = None
+
+    # Row 0: the truth prefix is all insertions; cum[:, j] = cost of inserting b[:j]
+    cum = np.zeros((n, b_codes.shape[1] + 1), dtype=np.float64)
+    cum[:, 1:] = np.cumsum(indel[b_idx], axis=1)
+    rows = np.arange(n)
+    result = cum[rows, lb].copy()
+    previous2, previous = None, cum
+
+    for i in range(1, a_codes.shape[1] + 1):
+        a_i = a_idx[:, i - 1]
+        deletion = indel[a_i][:, None]
+
+        current = np.empty_like(previous)
+        current[:, 0] = previous[:, 0] + deletion[:, 0]
+        current[:, 1:] = np.minimum(previous[:, 1:] + deletion, previous[:, :-1] + substitution[a_i[:, None], b_idx])
+
+        # Only the pairs whose recognized text has the group at this row are touched
+        for a_hit, b_hit, cost in splits:
+            k = np.flatnonzero(a_hit[:, i - 1])
+            if len(k):
+                current[k, 2:] = np.minimum(current[k, 2:], np.where(b_hit[k], previous[k, :-2] + cost, np.inf))
+
+        if previous2 is not None and swapped is not None:
+            current[:, 2:] = np.minimum(current[:, 2:],
+                                        np.where(swapped[:, i - 2], previous2[:, :-2] + costs.transposition, np.inf))
+
+        if previous2 is not None:
+            for a_hit, b_hit, cost in merges:
+                k = np.flatnonzero(a_hit[:, i - 2])
+                if len(k):
+                    current[k, 1:] = np.minimum(current[k, 1:], np.where(b_hit[k], previous2[k, :-1] + cost, np.inf))
+
+        # Insertions chain along the row: cur[j] = min(cur[j], cur[j-1] + ins(b[j-1])) as one running minimum
+        current = np.minimum.accumulate(current - cum, axis=1) + cum
+
+        done = la == i
+        result[done] = current[rows[done], lb[done]]
+        previous2, previous = previous, current
+
+    return result
+
+
+def weighted_distances(predicts, ground_truth, costs=None, batch_size=512):
+    """
+    Weighted edit distance of each (predict, ground truth) pair
+
+    Pairs are sorted by length and aligned in batches, so padding stays small
+    and each batch is a handful of numpy operations per predicted character.
+    """
+
+    if len(predicts) != len(ground_truth):
+        raise ValueError("predicts and ground_truth must have the same length")
+
+    costs = costs or default_costs()
+    distances = np.zeros(len(predicts), dtype=np.float64)
+    order = sorted(range(len(predicts)), key=lambda k: (len(predicts[k]), len(ground_truth[k])))
+
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        distances[batch] = _batch_distances([predicts[k] for k in batch], [ground_truth[k] for k in batch], costs)
+
+    return distances
+
+
+def weighted_distance(predict, ground_truth, costs=None):
+    """Weighted edit distance of a single pair"""
+
+    return float(weighted_distances([predict], [ground_truth], costs)[0])
+
+
+if __name__ == "__main__":
+    import time
+    import random
+
+    try:
+        import editdistance
+    except ImportError:
+        editdistance = None
+
+    def python_distance(a, b):
+        """Plain Levenshtein DP, the reference when editdistance is missing"""
+        previous = list(range(len(b) + 1))
+        for i, x in enumerate(a, 1):
+            current = [i]
+            for j, y in enumerate(b, 1):
+                current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y)))
+            previous = current
+        return previous[-1]
+
+    random.seed(42)
+    alphabet = "abcdefghijklmnopqrstuvwxyz .,0123456789"
+    truth = ["".join(random.choice(alphabet) for _ in range(random.randint(20, 80))) for _ in range(5000)]
+    noisy = []
+
+    for line in truth:
+        chars = list(line)
+        for _ in range(random.randint(0, 6)):
+            k = random.randrange(len(chars))
+            chars[k:k + 1] = random.choice(([], [random.choice(alphabet)], [chars[k], random.choice(alphabet)]))
+        noisy.append("".join(chars))
+
+    uniform = ConfusionCosts(confusions=(), noise_costs={})
+
+    start = time.perf_counter()
+    vectorised = weighted_distances(noisy, truth, uniform)
+    vectorised_time = time.perf_counter() - start
+
+    reference_name = "editdistance" if editdistance else "python DP"
+    reference = editdistance.eval if editdistance else python_distance
+
+    start = time.perf_counter()
+    expected = [reference(a, b) for a, b in zip(noisy, truth)]
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    weighted_distances(noisy, truth)
+    weighted_time = time.perf_counter() - start
+
+    print(f"{len(truth)} pairs, {sum(map(len, truth)) / len(truth):.0f} characters per line")
+    print(f"uniform costs:  numpy batch {vectorised_time:.3f}s, {reference_name} {reference_time:.3f}s, "
+          f"identical: {np.array_equal(vectorised, expected)}")
+    print(f"confusion costs: numpy batch {weighted_time:.3f}s")
+
+    for predict, target in (("rnodern", "modern"), ("c1ear", "clear"), ("5ign.", "Sign"), ("bold", "hold")):
+        print(f"{predict!r:>10} -> {target!r:<8} weighted {weighted_distance(predict, target):.1f}, "
+              f"plain {python_distance(predict, target)}")
@@ -1,6 +1,7 @@
 """
 Tool to metrics calculation through data and label (string and string).
  * Calculation from Optical Character Recognition (OCR) metrics with editdistance.
+ * Optional confusion-weighted CER (look-alike characters cost less), see data.confusion.
 """
 
 import string
@@ -8,14 +9,20 @@ import unicodedata
 import editdistance
 import numpy as np
 
+from data.confusion import weighted_distances
 
-def ocr_metrics(predicts, ground_truth, norm_accentuation=False, norm_punctuation=False):
-    """Calculate Character Error Rate (CER), Word Error Rate (WER) and Sequence Error Rate (SER)"""
+
+def ocr_metrics(predicts, ground_truth, norm_accentuation=False, norm_punctuation=False, weighted=False, costs=None):
+    """
+    Calculate Character Error Rate (CER), Word Error Rate (WER) and Sequence Error Rate (SER),
+    followed by the confusion-weighted CER when `weighted` (costs default to data.confusion)
+    """
 
     if len(predicts) == 0 or len(ground_truth) == 0:
-        return (1, 1, 1)
+        return (1, 1, 1, 1) if weighted else (1, 1, 1)
 
     cer, wer, ser = [], [], []
+    pairs = []
 
     for (pd, gt) in zip(predicts, ground_truth):
         if norm_accentuation:
@@ -26,6 +33,7 @@ def ocr_metrics(predicts, ground_truth, norm_accentuation=False, norm_punctuatio
             pd = pd.translate(str.maketrans("", "", string.punctuation))
             gt = gt.translate(str.maketrans("", "", string.punctuation))
 
+        pairs.append((pd, gt))
         pd_cer, gt_cer = list(pd), list(gt)
         dist = editdistance.eval(pd_cer, gt_cer)
         cer.append(dist / (max(len(pd_cer), len(gt_cer))))
@@ -39,6 +47,13 @@ def ocr_metrics(predicts, ground_truth, norm_accentuation=False, norm_punctuatio
         ser.append(dist / (max(len(pd_ser), len(gt_ser))))
 
     metrics = [cer, wer, ser]
+
+    if weighted:
+        # All pairs in one vectorised pass
+        pds, gts = zip(*pairs)
+        lengths = np.maximum([len(pd) for pd in pds], [len(gt) for gt in gts])
+        metrics.append(weighted_distances(list(pds), list(gts), costs) / lengths)
+
     metrics = np.mean(metrics, axis=1)
 
     return metrics
@@ -95,15 +95,20 @@ Preprocess metodology based in:
 def preprocess(img, input_size):
     """Make the process with the `input_size` to the scale resize"""
 
+    def background(img):
+        u, i = np.unique(np.array(img).flatten(), return_inverse=True)
+        return int(u[np.argmax(np.bincount(i))])
+
     def imread(path):
         img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
-        u, i = np.unique(np.array(img).flatten(), return_inverse=True)
-        background = int(u[np.argmax(np.bincount(i))])
-        return img, background
+        return img, background(img)
 
     if isinstance(img, str):
         img, bg = imread(img)
 
+    elif isinstance(img, np.ndarray):
+        bg = background(img)
+
     if isinstance(img, tuple):
         image, boundbox = img
         img, bg = imread(image)
@@ -5,12 +5,20 @@ Provides options via the command line to perform project tasks.
 * `--transform`: transform dataset to the HDF5 file
 * `--cv2`: visualize sample from transformed dataset
 * `--kaldi_assets`: save all assets for use with kaldi
+* `--ark_storage`: `float32`, `int16` (2-byte) or `compressed` (1-byte) posteriors in the kaldi ark
+* `--lm`: decode the test partition with a character n-gram language model
+* `--lm_backend`: `kaldi` (external decode script) or `beam` (in-process CTC prefix beam search)
+* `--lm_path`: character n-gram for the `beam` backend, a saved model directory or an ARPA file
+  (default `<output>/language/chars_<N>gram`, trained in-process from train/valid when missing)
+* `--lm_train`: (re)train the in-process character n-gram before decoding
+* `--lexicon`: restrict the `beam` backend to words of the train/valid ground truth
 * `--image`: predict a single image with the source parameter
 * `--train`: train model with the source argument
 * `--test`: evaluate the predict model with the source argument
 * `--evaluate`: evaluate the model outputs with an arbitrary directory
 * `--norm_accentuation`: discard accentuation marks in the evaluation
 * `--norm_punctuation`: discard punctuation marks in the evaluation
+* `--weighted_cer`: also report the OCR-confusion-weighted CER in the evaluation
 * `--epochs`: number of epochs
 * `--batch_size`: number of batches
 """
@@ -45,11 +53,19 @@ if __name__ == "__main__":
     parser.add_argument("--predictions_path", default=None)
 
     parser.add_argument("--kaldi_assets", action="store_true", default=False)
+    parser.add_argument("--ark_storage", type=str, default="float32", choices=["float32", "int16", "compressed"])
     parser.add_argument("--lm", action="store_true", default=False)
+    parser.add_argument("--lm_backend", type=str, default="kaldi", choices=["kaldi", "beam"])
+    parser.add_argument("--lm_path", type=str, default="")
+    parser.add_argument("--lm_alpha", type=float, default=0.5)
+    parser.add_argument("--lm_beta", type=float, default=1.0)
+    parser.add_argument("--lexicon", action="store_true", default=False)
+    parser.add_argument("--lm_train", action="store_true", default=False)
     parser.add_argument("--N", type=int, default=2)
 
     parser.add_argument("--norm_accentuation", action="store_true", default=False)
     parser.add_argument("--norm_punctuation", action="store_true", default=False)
+    parser.add_argument("--weighted_cer", action="store_true", default=False)
 
     parser.add_argument("--epochs", type=int, default=10000)
     parser.add_argument("--batch_size", type=int, default=8)
@@ -143,11 +159,12 @@ if __name__ == "__main__":
         model.compile(learning_rate=0.001)
         model.load_checkpoint(target=target_path)
 
-        if args.kaldi_assets:
-            predicts, _ = model.predict(x=dtgen.next_test_batch(), steps=dtgen.steps['test'], ctc_decode=False)
+        # test posteriors batch by batch, so assets and decoding stream instead of holding the test set
+        test_predicts = (model.predict(x=x, ctc_decode=False)[0] for x in dtgen.next_test_batch())
 
+        if args.kaldi_assets:
             lm = LanguageModel(output_path, args.N)
-            lm.generate_kaldi_assets(dtgen, predicts)
+            lm.generate_kaldi_assets(dtgen, test_predicts, storage=args.ark_storage)
 
         elif args.lm:
             lm = LanguageModel(output_path, args.N)
@@ -155,22 +172,35 @@ if __name__ == "__main__":
 
             start_time = datetime.datetime.now()
 
-            predicts, _ = model.predict(x=dtgen.next_test_batch(), steps=dtgen.steps['test'], ctc_decode=False)
-            lm.generate_kaldi_assets(dtgen, predicts)
+            if args.lm_backend == "kaldi":
+                lm.generate_kaldi_assets(dtgen, test_predicts, storage=args.ark_storage)
+
+                lm.kaldi(predict=False)
+                predicts = lm.kaldi(predict=True)
+            else:
+                if args.lm_train or not (args.lm_path or os.path.isdir(lm.ngram_path)):
+                    lm.train(dtgen)
 
-            lm.kaldi(predict=False)
-            predicts = lm.kaldi(predict=True)
+                predicts = lm.ctc_decode(test_predicts,
+                                         chars=dtgen.tokenizer.chars,
+                                         lm_path=args.lm_path,
+                                         words=lm.lexicon(dtgen) if args.lexicon else None,
+                                         alpha=args.lm_alpha,
+                                         beta=args.lm_beta,
+                                         processes=os.cpu_count())
+                predicts = [dtgen.tokenizer.remove_tokens(x).strip() for x in predicts]
 
             total_time = datetime.datetime.now() - start_time
 
-            with open(os.path.join(output_path, "predict_kaldi.txt"), "w") as lg:
+            with open(os.path.join(output_path, f"predict_{args.lm_backend}.txt"), "w") as lg:
                 for pd, gt in zip(predicts, ground_truth):
                     lg.write(f"TE_L {gt}\nTE_P {pd}\n")
 
             evaluate = evaluation.ocr_metrics(predicts=predicts,
                                               ground_truth=ground_truth,
                                               norm_accentuation=args.norm_accentuation,
-                                              norm_punctuation=args.norm_punctuation)
+                                              norm_punctuation=args.norm_punctuation,
+                                              weighted=args.weighted_cer)
 
             e_corpus = "\n".join([
                 f"Total test images:    {dtgen.size['test']}",
@@ -180,13 +210,13 @@ if __name__ == "__main__":
                 f"Character Error Rate: {evaluate[0]:.8f}",
                 f"Word Error Rate:      {evaluate[1]:.8f}",
                 f"Sequence Error Rate:  {evaluate[2]:.8f}"
-            ])
+            ] + ([f"Weighted CER:         {evaluate[3]:.8f}"] if args.weighted_cer else []))
 
             sufix = ("_norm" if args.norm_accentuation or args.norm_punctuation else "") + \
                     ("_accentuation" if args.norm_accentuation else "") + \
                     ("_punctuation" if args.norm_punctuation else "")
 
-            with open(os.path.join(output_path, f"evaluate_kaldi{sufix}.txt"), "w") as lg:
+            with open(os.path.join(output_path, f"evaluate_{args.lm_backend}{sufix}.txt"), "w") as lg:
                 lg.write(e_corpus)
                 print(e_corpus)
 
@@ -253,7 +283,8 @@ if __name__ == "__main__":
             evaluate = evaluation.ocr_metrics(predicts=predicts,
                                               ground_truth=ground_truth,
                                               norm_accentuation=args.norm_accentuation,
-                                              norm_punctuation=args.norm_punctuation)
+                                              norm_punctuation=args.norm_punctuation,
+                                              weighted=args.weighted_cer)
 
             e_corpus = "\n".join([
                 f"Total test images:    {dtgen.size['test']}",
@@ -263,7 +294,7 @@ if __name__ == "__main__":
                 f"Character Error Rate: {evaluate[0]:.8f}",
                 f"Word Error Rate:      {evaluate[1]:.8f}",
                 f"Sequence Error Rate:  {evaluate[2]:.8f}"
-            ])
+            ] + ([f"Weighted CER:         {evaluate[3]:.8f}"] if args.weighted_cer else []))
 
             sufix = ("_norm" if args.norm_accentuation or args.norm_punctuation else "") + \
                     ("_accentuation" if args.norm_accentuation else "") + \
@@ -308,7 +339,8 @@ if __name__ == "__main__":
 
                     ground_truth.append(' '.join(open(ds.dataset['test']['path'][i]).read().splitlines()))
 
-                evaluate = evaluation.ocr_metrics(predicts=predicts, ground_truth=ground_truth)
+                evaluate = evaluation.ocr_metrics(predicts=predicts, ground_truth=ground_truth,
+                                                  weighted=args.weighted_cer)
 
                 e_corpus = "\n".join([
                     f"Total test images:    {dtgen.size['test']}",
@@ -316,6 +348,6 @@ if __name__ == "__main__":
                     f"Character Error Rate: {evaluate[0]:.8f}",
                     f"Word Error Rate:      {evaluate[1]:.8f}",
                     f"Sequence Error Rate:  {evaluate[2]:.8f}"
-                ])
+                ] + ([f"Weighted CER:         {evaluate[3]:.8f}"] if args.weighted_cer else []))
 
                 print(e_corpus)
\ No newline at end of file
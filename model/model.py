@@ -1,13 +1,33 @@
 """
 Language Model class.
 Create and read the corpus with the language model file.
+Train the character n-gram and decode in-process (CTC prefix beam search),
+or export the assets for Kaldi/SRILM.
 """
 
 import os
 import re
 import string
+import numpy as np
 
 from kaldiio import WriteHelper
+from kaldiio.compression_header import kAutomaticMethod, kTwoByteAuto
+from language.ctc_decoder import ArpaLM, CTCBeamDecoder, LexiconTrie
+from language.ngram import NGramLM
+
+
+# Kaldi matrix storage for the posteriors (kaldiio `compression_method`):
+#  * `float32`: full matrices (`FM`)
+#  * `int16`: two-byte compressed matrices (`CM2`), 16-bit linear quantization over the matrix range
+#  * `compressed`: Kaldi's automatic compression, what `copy-matrix --compress` writes
+#    (one byte per value over per-column ranges, `CM`, for matrices of more than 8 frames)
+ARK_STORAGE = {"float32": None, "int16": kTwoByteAuto, "compressed": kAutomaticMethod}
+
+
+def batches(predicts):
+    """Posteriors as batches: a list or array is one batch, a generator streams batches (B, T, C)"""
+
+    return [predicts] if isinstance(predicts, (list, tuple, np.ndarray)) else predicts
 
 
 class LanguageModel():
@@ -15,17 +35,17 @@ class LanguageModel():
     def __init__(self, output, N=3):
         self.output_path = os.path.join(output, "language")
         self.N = N
+        self.ngram_path = os.path.join(self.output_path, f"chars_{N}gram")
 
-    def generate_kaldi_assets(self, dtgen, predicts):
-        # get data and ground truth lists
-        ctc_TK, space_TK, ground_truth = "<ctc>", "<space>", []
-
-        for pt in ['train', 'valid', 'test']:
-            for x in dtgen.dataset[pt]['gt']:
-                ground_truth.append([space_TK if y == " " else y for y in list(f" {x} ")])
+    def generate_kaldi_assets(self, dtgen, predicts, storage="float32"):
+        """
+        Save the Kaldi decode inputs. `predicts` (test log posteriors) may be a generator of
+        batches, written to the ark as they are produced. `storage` is one of `ARK_STORAGE`.
+        """
 
         # define dataset size and default tokens
         ds_size = dtgen.size['train'] + dtgen.size['valid'] + dtgen.size['test']
+        ctc_TK, space_TK = "<ctc>", "<space>"
 
         # get chars list and save with the ctc and space tokens
         chars = list(dtgen.tokenizer.chars) + [ctc_TK]
@@ -40,15 +60,27 @@ class LanguageModel():
         ark_file_name = os.path.join(kaldi_path, "conf_mats.ark")
         scp_file_name = os.path.join(kaldi_path, "conf_mats.scp")
 
-        # save ark and scp file (laia output/kaldi input format)
-        with WriteHelper(f"ark,scp:{ark_file_name},{scp_file_name}") as writer:
-            for i, item in enumerate(predicts):
-                writer(str(i + ds_size), item)
+        if storage not in ARK_STORAGE:
+            raise ValueError(f"Unknown ark storage {storage!r}, expected one of {tuple(ARK_STORAGE)}")
 
-        # save ground_truth.lst file with sparse sentences
+        # save ark and scp file (laia output/kaldi input format), one matrix at a time
+        with WriteHelper(f"ark,scp:{ark_file_name},{scp_file_name}",
+                         compression_method=ARK_STORAGE[storage]) as writer:
+            i = ds_size
+
+            for batch in batches(predicts):
+                for item in batch:
+                    writer(str(i), item)
+                    i += 1
+
+        # save ground_truth.lst file with sparse sentences (train, valid and test ground truth)
         with open(os.path.join(kaldi_path, "ground_truth.lst"), "w") as lg:
-            for i, item in enumerate(ground_truth):
-                lg.write(f"{i} {' '.join(item)}\n")
+            i = 0
+
+            for pt in ['train', 'valid', 'test']:
+                for x in dtgen.dataset[pt]['gt']:
+                    lg.write(f"{i} {' '.join(space_TK if y == ' ' else y for y in f' {x} ')}\n")
+                    i += 1
 
         # save indexes of the train/valid and test partitions
         with open(os.path.join(kaldi_path, "ID_train.lst"), "w") as lg:
@@ -59,6 +91,72 @@ class LanguageModel():
             range_index = [str(i) for i in range(ds_size - dtgen.size['test'], ds_size)]
             lg.write("\n".join(range_index))
 
+    def lexicon(self, dtgen, partitions=('train', 'valid')):
+        """Words (letters only) of the ground truth partitions, for the lexicon-constrained search"""
+
+        words = set()
+
+        for pt in partitions:
+            for x in dtgen.dataset[pt]['gt']:
+                words.update(re.findall(r"[^\W\d_]+", x.decode() if isinstance(x, bytes) else x))
+
+        return words
+
+    def train(self, dtgen, partitions=('train', 'valid'), chunk_size=4096):
+        """
+        Train the character N-gram (modified Kneser-Ney) on the ground truth partitions,
+        streamed in chunks, and save it to `ngram_path` (memory-mappable arrays).
+        """
+
+        def lines():
+            for pt in partitions:
+                gt = dtgen.dataset[pt]['gt']
+
+                for i in range(0, dtgen.size[pt], chunk_size):
+                    yield from gt[i:i + chunk_size]
+
+        lm = NGramLM.train(lines(), dtgen.tokenizer.chars, order=self.N, chunk_size=chunk_size)
+        lm.save(self.ngram_path)
+
+        return lm
+
+    def load(self, chars, lm_path=None):
+        """
+        Character n-gram at `lm_path`: a model directory saved by `train` or an ARPA file.
+        Defaults to `ngram_path`, then `<output>/language/chars_<N>gram.arpa`.
+        """
+
+        for path in ([lm_path] if lm_path else [self.ngram_path, f"{self.ngram_path}.arpa"]):
+            if os.path.isdir(path):
+                return NGramLM.load(path, chars)
+            if os.path.isfile(path):
+                return ArpaLM(path, chars)
+
+        return None
+
+    def ctc_decode(self, predicts, chars, lm_path=None, words=None, alpha=0.5, beta=1.0, beam_width=16,
+                   processes=None):
+        """
+        In-process CTC prefix beam search over the log posteriors (`ctc_decode=False` output),
+        with the character n-gram LM (see `load`) and, with `words`, a lexicon constraint.
+        Needs neither Kaldi nor SRILM.
+        """
+
+        lm = self.load(chars, lm_path)
+
+        if lm is None:
+            print(f"No language model at {lm_path or self.ngram_path}: decoding without LM.")
+
+        decoder = CTCBeamDecoder(chars,
+                                 lm=lm,
+                                 lexicon=LexiconTrie(words, chars) if words else None,
+                                 alpha=alpha,
+                                 beta=beta,
+                                 beam_width=beam_width,
+                                 log_probs=True)
+
+        return [text for text, _ in decoder.decode_batches(batches(predicts), processes=processes)]
+
     def kaldi(self, predict=True):
         """
         Kaldi Speech Recognition Toolkit with SRI Language Modeling Toolkit.
@@ -0,0 +1,310 @@
+"""
+Character n-gram language model with interpolated modified Kneser-Ney smoothing,
+trained in-process (no SRILM) and queried by the CTC beam search (`ctc_decoder.py`).
+ * Lines are streamed in chunks: each chunk becomes one id array, n-grams of every
+   order are packed into int64 keys and counted with `np.unique`, then merged into
+   the running counts. Memory follows the distinct n-grams, not the corpus.
+ * Each order is an array-backed trie level: sorted context keys, a CSR pointer
+   into (next id, probability) arrays and the context's interpolation weight.
+ * The model is saved as a directory of `.npy` arrays plus `meta.json` and loaded
+   memory-mapped, so processes share the pages and loading is immediate.
+Same query interface as `ArpaLM`: `order`, `bos`, `eos`, `size`, `next_log_probs`.
+"""
+
+import os
+import json
+import numpy as np
+
+
+LEVEL_ARRAYS = ("ctx", "ptr", "gamma", "ids", "prob")
+
+
+def _windows(ids, lines, k):
+    """The k-grams (rows of k ids) that do not cross a line boundary"""
+
+    if len(ids) < k:
+        return np.zeros((0, k), dtype=np.int64)
+
+    view = np.lib.stride_tricks.sliding_window_view(ids, k)
+    valid = lines[:len(view)] == lines[k - 1:]
+    return view[valid]
+
+
+def _discounts(counts):
+    """Modified Kneser-Ney discounts D1, D2, D3+ from the count-of-counts (Chen & Goodman)"""
+
+    n = np.bincount(np.minimum(counts, 5), minlength=5)[1:5].astype(np.float64)
+
+    if n[0] == 0 or n[1] == 0:
+        return np.array([0.5, 1.0, 1.5])
+
+    y = n[0] / (n[0] + 2 * n[1])
+    d = np.array([1 - 2 * y * n[1] / n[0],
+                  2 - 3 * y * n[2] / n[1],
+                  3 - 4 * y * n[3] / n[2] if n[2] else 1.5])
+
+    # Small corpora can push D_r to 0 or r; keep every seen n-gram some explicit mass
+    return np.clip(d, 0.05, [0.95, 1.95, 2.95])
+
+
+class NGramLM():
+    """Character n-gram LM (interpolated modified Kneser-Ney) over array-backed trie levels"""
+
+    def __init__(self, chars, order, levels, meta=None):
+        """
+        `chars` are the symbols by id (tokenizer.chars); ids len(chars) and len(chars) + 1
+        are <s> and </s>. `levels[k - 1]` holds the arrays of order k.
+        """
+
+        self.chars = "".join(chars)
+        self.order = order
+        self.bos, self.eos = len(self.chars), len(self.chars) + 1
+        self.size = len(self.chars) + 2
+        self.levels = levels
+        self.meta = meta or {}
+        self._cache = {}
+
+    @classmethod
+    def train(cls, texts, chars, order=3, chunk_size=4096):
+        """
+        Count and smooth the n-grams of an iterable of lines (str or bytes) in one pass.
+        Characters outside `chars` are dropped; whitespace runs become one space.
+        """
+
+        chars = "".join(chars)
+        size = len(chars) + 2
+        bos, eos = len(chars), len(chars) + 1
+
+        if size ** order >= 2 ** 62:
+            raise ValueError(f"{order}-grams over {size} symbols do not fit in int64 keys")
+
+        index = {c: i for i, c in enumerate(chars)}
+        table = np.full(max(map(ord, chars)) + 1, -1, dtype=np.int64)
+        table[[ord(c) for c in chars]] = [index[c] for c in chars]
+
+        # Powers of the symbol count, to pack k ids into one key
+        powers = [size ** np.arange(k - 1, -1, -1, dtype=np.int64) for k in range(1, order + 1)]
+        keys, counts = [np.zeros(0, dtype=np.int64)] * order, [np.zeros(0, dtype=np.int64)] * order
+        lines_count, chars_count = 0, 0
+
+        def flush(chunk):
+            nonlocal lines_count, chars_count
+
+            text = "\n".join(" ".join(x.split()) for x in chunk)
+            points = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+            ids = np.where(points < len(table), table[np.minimum(points, len(table) - 1)], -1)
+            ids[points == ord("\n")] = -2
+
+            # <s> line </s>, lines numbered so windows across them can be dropped
+            breaks = np.flatnonzero(ids == -2)
+            line_of = np.zeros(len(ids), dtype=np.int64)
+            line_of[breaks[breaks + 1 < len(ids)] + 1] = 1
+            line_of = np.cumsum(line_of)
+            keep = ids >= 0
+
+            ids, line_of = ids[keep], line_of[keep]
+            starts = np.searchsorted(line_of, np.arange(len(chunk)))
+            ends = np.searchsorted(line_of, np.arange(len(chunk)), side="right")
+
+            seq = np.insert(ids, np.concatenate([starts, ends]), [bos] * len(chunk) + [eos] * len(chunk))
+            lines = np.insert(line_of, np.concatenate([starts, ends]), np.tile(np.arange(len(chunk)), 2))
+            order_idx = np.argsort(lines, kind="stable")
+            seq, lines = seq[order_idx], lines[order_idx]
+
+            lines_count += len(chunk)
+            chars_count += len(ids)
+
+            for k in range(1, order + 1):
+                chunk_keys, chunk_counts = np.unique(_windows(seq, lines, k) @ powers[k - 1], return_counts=True)
+                merged, inverse = np.unique(np.concatenate([keys[k - 1], chunk_keys]), return_inverse=True)
+                counts[k - 1] = np.bincount(inverse, weights=np.concatenate([counts[k - 1], chunk_counts]),
+                                            minlength=len(merged)).astype(np.int64)
+                keys[k - 1] = merged
+
+        chunk = []
+        for x in texts:
+            chunk.append(x.decode() if isinstance(x, bytes) else x)
+
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+
+        if chunk:
+            flush(chunk)
+
+        # Kneser-Ney adjusted counts: below the top order, the number of distinct left
+        # extensions (continuation count), except for n-grams starting with <s>
+        adjusted = list(counts)
+
+        for k in range(1, order):
+            suffix = keys[k] % (size ** k)
+            distinct, continuation = np.unique(suffix, return_counts=True)
+            cont = np.zeros(len(keys[k - 1]), dtype=np.int64)
+            cont[np.searchsorted(keys[k - 1], distinct)] = continuation
+
+            starts_bos = (keys[k - 1] // (size ** (k - 1))) == bos if k > 1 else np.zeros(len(cont), dtype=bool)
+            adjusted[k - 1] = np.where(starts_bos, counts[k - 1], cont)
+
+        levels, discounts = [], []
+        ids_dtype = np.uint16 if size <= np.iinfo(np.uint16).max else np.uint32
+
+        for k in range(1, order + 1):
+            # <s> is never predicted; n-grams with no adjusted count carry no mass
+            key, count = keys[k - 1], adjusted[k - 1]
+            mask = (key % size != bos) & (count > 0)
+            key, count = key[mask], count[mask]
+
+            d = _discounts(count)
+            discount = d[np.minimum(count, 3) - 1]
+
+            context, word = key // size, key % size
+            ctx, start = np.unique(context, return_index=True)
+            ptr = np.append(start, len(key)).astype(np.int64)
+
+            total = np.add.reduceat(count, start).astype(np.float64)
+            removed = np.add.reduceat(discount, start)
+
+            prob = (count - discount) / np.repeat(total, np.diff(ptr))
+            gamma = removed / total
+
+            levels.append({"ctx": ctx, "ptr": ptr, "gamma": gamma.astype(np.float32),
+                           "ids": word.astype(ids_dtype), "prob": prob.astype(np.float32)})
+            discounts.append(d.tolist())
+
+        meta = {"chars": chars, "order": order, "lines": lines_count, "characters": chars_count,
+                "ngrams": [len(x["ids"]) for x in levels], "discounts": discounts}
+
+        return cls(chars, order, levels, meta)
+
+    def save(self, path):
+        """Write the trie levels as `.npy` arrays plus `meta.json` into the `path` directory"""
+
+        os.makedirs(path, exist_ok=True)
+
+        for k, level in enumerate(self.levels, 1):
+            for name in LEVEL_ARRAYS:
+                np.save(os.path.join(path, f"{name}_{k}.npy"), np.ascontiguousarray(level[name]))
+
+        with open(os.path.join(path, "meta.json"), "w") as lg:
+            json.dump(self.meta | {"chars": self.chars, "order": self.order}, lg, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path, chars=None):
+        """Memory-map a saved model; `chars` (if given) must match the training symbols"""
+
+        with open(os.path.join(path, "meta.json")) as lg:
+            meta = json.load(lg)
+
+        if chars is not None and "".join(chars) != meta["chars"]:
+            raise ValueError(f"Language model at {path} was trained on a different charset")
+
+        levels = [{name: np.load(os.path.join(path, f"{name}_{k}.npy"), mmap_mode="r") for name in LEVEL_ARRAYS}
+                  for k in range(1, meta["order"] + 1)]
+
+        return cls(meta["chars"], meta["order"], levels, meta)
+
+    def _explicit(self, context):
+        """(next ids, probs, gamma) of a context at order len(context) + 1, or None if unseen"""
+
+        level = self.levels[len(context)]
+        key = 0
+
+        for x in context:
+            key = key * self.size + x
+
+        i = int(np.searchsorted(level["ctx"], key))
+
+        if i == len(level["ctx"]) or level["ctx"][i] != key:
+            return None
+
+        start, end = level["ptr"][i], level["ptr"][i + 1]
+        return level["ids"][start:end], level["prob"][start:end], float(level["gamma"][i])
+
+    def _probs(self, context):
+        """Interpolated probabilities of the next symbol after a context tuple (cached)"""
+
+        dist = self._cache.get(context)
+
+        if dist is None:
+            if context:
+                lower = self._probs(context[1:])
+            else:
+                # The unigrams interpolate with a uniform distribution over all but <s>
+                lower = np.full(self.size, 1.0 / (self.size - 1))
+                lower[self.bos] = 0.0
+
+            explicit = self._explicit(context)
+
+            if explicit is None:
+                dist = lower
+            else:
+                ids, prob, gamma = explicit
+                dist = gamma * lower
+                dist[ids.astype(np.int64)] += prob
+
+            self._cache[context] = dist
+
+        return dist
+
+    def next_log_probs(self, context):
+        """Natural-log distribution of the next symbol (all ids) after a context tuple"""
+
+        context = tuple(context[-(self.order - 1):]) if self.order > 1 else ()
+        key = ("log",) + context
+        dist = self._cache.get(key)
+
+        if dist is None:
+            with np.errstate(divide="ignore"):
+                dist = np.log(self._probs(context))
+            self._cache[key] = dist
+
+        return dist
+
+    def score(self, text):
+        """Natural-log probability of a line, <s> and </s> included"""
+
+        index = {c: i for i, c in enumerate(self.chars)}
+        ids = [index[c] for c in " ".join(text.split()) if c in index] + [self.eos]
+        context, total = (self.bos,), 0.0
+
+        for x in ids:
+            total += float(self.next_log_probs(context)[x])
+            context = context + (x,)
+
+        return total
+
+
+if __name__ == "__main__":
+    import time
+    import random
+    import tempfile
+
+    random.seed(42)
+    words = ["".join(random.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(random.randint(2, 9)))
+             for _ in range(3000)]
+    weights = [1 / (i + 1) for i in range(len(words))]
+    lines = [" ".join(random.choices(words, weights, k=random.randint(4, 12))) for _ in range(100_000)]
+    charset = "¶¤" + "".join(chr(i) for i in range(32, 127))
+
+    print(f"{len(lines)} lines, {sum(map(len, lines))} characters")
+
+    for n in (3, 5):
+        start = time.perf_counter()
+        lm = NGramLM.train(iter(lines[:-1000]), charset, order=n)
+        build = time.perf_counter() - start
+
+        with tempfile.TemporaryDirectory() as path:
+            lm.save(path)
+            start = time.perf_counter()
+            lm = NGramLM.load(path, charset)
+            load = time.perf_counter() - start
+
+            held_out = lines[-1000:]
+            start = time.perf_counter()
+            logp = sum(lm.score(x) for x in held_out)
+            query = time.perf_counter() - start
+            ppl = np.exp(-logp / sum(len(x) + 1 for x in held_out))
+
+        sums = [float(np.exp(lm.next_log_probs(c)).sum()) for c in ((lm.bos,), (lm.bos, 66), tuple(range(40, 44)))]
+        print(f"{n}-gram: build {build:.2f}s, load {load * 1000:.1f}ms, held-out perplexity {ppl:.2f} "
+              f"({query:.2f}s), n-grams {lm.meta['ngrams']}, distributions sum to {np.round(sums, 6).tolist()}")
@@ -0,0 +1,158 @@
+import cv2
+import numpy as np
+from PIL import Image
+from numpy.lib.stride_tricks import as_strided
+
+
+# Larger images are analyzed on an area-downsampled copy (same patch grid)
+ANALYSIS_PIXELS = 1_000_000
+
+
+def patch_grid(array, patch_size=16):
+    """
+    View an image as a grid of non-overlapping square patches without copying.
+
+    Args:
+        array (numpy.ndarray): 2-D image, or 3-D stack of images (channels first)
+        patch_size (int): Patch side length in pixels
+
+    Returns:
+        numpy.ndarray: Read-only view of shape (rows, cols, p, p), or
+        (channels, rows, cols, p, p) for a stack; edge pixels that do not fill
+        a whole patch are dropped
+    """
+    rows = array.shape[-2] // patch_size
+    cols = array.shape[-1] // patch_size
+    cropped = array[..., :rows * patch_size, :cols * patch_size]
+
+    row_stride, col_stride = cropped.strides[-2:]
+    shape = cropped.shape[:-2] + (rows, cols, patch_size, patch_size)
+    strides = cropped.strides[:-2] + (row_stride * patch_size, col_stride * patch_size, row_stride, col_stride)
+    return as_strided(cropped, shape=shape, strides=strides, writeable=False)
+
+
+def patch_sums(integral, patch_size):
+    """
+    Sum every non-overlapping patch from an integral image.
+
+    Args:
+        integral (numpy.ndarray): (H + 1, W + 1) integral image (``cv2.integral``)
+        patch_size (int): Patch side length in pixels; H and W are multiples of it
+
+    Returns:
+        numpy.ndarray: Patch sums of shape (H // patch_size, W // patch_size)
+    """
+    corners = integral[::patch_size, ::patch_size]
+    return corners[1:, 1:] - corners[:-1, 1:] - corners[1:, :-1] + corners[:-1, :-1]
+
+
+def analyze_patches(image, patch_size=16, text_threshold=0.35, max_pixels=ANALYSIS_PIXELS):
+    """
+    Compute per-patch ink ratio, Sobel edge density and variance.
+
+    Large images are first area-downsampled by a power of two (to at most
+    ``max_pixels``, patches of at least 4 pixels) so the patch grid is
+    unchanged; the pixel maps are then reduced to per-patch sums with
+    integral images, four lookups per patch.
+
+    Args:
+        image (PIL.Image or numpy.ndarray): Input image
+        patch_size (int): Patch side length in pixels
+        text_threshold (float): Text likelihood above which a patch counts as text
+        max_pixels (int): Pixel budget of the analyzed image (None analyzes full resolution)
+
+    Returns:
+        dict: ``ink_ratio``, ``edge_density``, ``variance`` and ``text_likelihood``
+        arrays of shape (rows, cols), plus ``otsu_threshold`` and ``text_mask``
+    """
+    gray = np.asarray(image.convert("L") if isinstance(image, Image.Image) else image)
+    if gray.ndim == 3:
+        gray = cv2.cvtColor(gray, cv2.COLOR_RGB2GRAY)
+    rows, cols = gray.shape[0] // patch_size, gray.shape[1] // patch_size
+    gray = np.ascontiguousarray(gray[:rows * patch_size, :cols * patch_size], dtype=np.uint8)
+
+    scale = 1
+    while (max_pixels is not None and gray.size > max_pixels * scale * scale
+           and patch_size % (scale * 2) == 0 and patch_size // (scale * 2) >= 4):
+        scale *= 2
+    if scale > 1:
+        gray = cv2.resize(gray, (cols * patch_size // scale, rows * patch_size // scale),
+                          interpolation=cv2.INTER_AREA)
+    patch_size //= scale
+
+    otsu_threshold, binary = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # Ink is the minority class; flip for light text on a dark background
+    if cv2.countNonZero(binary) > binary.size // 2:
+        binary = 1 - binary
+
+    # 3x3 Sobel derivatives; |gx| + |gy| approximates the gradient magnitude
+    grad_x, grad_y = cv2.spatialGradient(gray)
+    magnitude = cv2.add(cv2.convertScaleAbs(grad_x, alpha=0.5), cv2.convertScaleAbs(grad_y, alpha=0.5))
+    magnitude_mean, magnitude_std = cv2.meanStdDev(magnitude)
+    edge_threshold = max(float(magnitude_mean[0, 0] + magnitude_std[0, 0]), 1.0)
+    _, edges = cv2.threshold(magnitude, edge_threshold, 1, cv2.THRESH_BINARY)
+
+    # Patch sums of intensity and its square (for the variance), ink and edges
+    area = patch_size * patch_size
+    total, squares = cv2.integral2(gray, sdepth=cv2.CV_64F)
+    mean = patch_sums(total, patch_size) / (255.0 * area)
+    mean_sq = patch_sums(squares, patch_size) / (255.0 * 255.0 * area)
+    ink_ratio = patch_sums(cv2.integral(binary), patch_size) / area
+    edge_density = patch_sums(cv2.integral(edges), patch_size) / area
+    variance = np.maximum(mean_sq - mean * mean, 0.0)
+
+    # Text patches hold some ink (not a solid blob), many strokes and contrast
+    ink_score = np.clip(ink_ratio / 0.05, 0.0, 1.0) * np.clip((0.7 - ink_ratio) / 0.2, 0.0, 1.0)
+    edge_score = edge_density / max(float(edge_density.max()), 1e-6)
+    variance_score = np.sqrt(variance / max(float(variance.max()), 1e-6))
+    text_likelihood = ink_score * np.sqrt(edge_score * variance_score)
+
+    return {
+        "ink_ratio": ink_ratio,
+        "edge_density": edge_density,
+        "variance": variance,
+        "text_likelihood": text_likelihood,
+        "text_mask": text_likelihood > text_threshold,
+        "otsu_threshold": float(otsu_threshold)
+    }
+
+
+def heatmap_image(text_likelihood, size=None):
+    """
+    Render a text-likelihood grid as a colour heatmap.
+
+    Args:
+        text_likelihood (numpy.ndarray): Grid of values in [0, 1]
+        size (tuple): Optional (width, height) to scale the heatmap to
+
+    Returns:
+        PIL.Image: RGB heatmap (red = likely text)
+    """
+    grid = np.clip(text_likelihood * 255, 0, 255).astype(np.uint8)
+    if size is not None:
+        grid = cv2.resize(grid, size, interpolation=cv2.INTER_NEAREST)
+    colored = cv2.applyColorMap(grid, cv2.COLORMAP_JET)
+    return Image.fromarray(cv2.cvtColor(colored, cv2.COLOR_BGR2RGB))
+
+
+if __name__ == "__main__":
+    import glob
+    import time
+
+    for path in sorted(glob.glob("images/*")):
+        image = Image.open(path).convert("L")
+        # Upscale to roughly 2 MP so timings are comparable across samples
+        scale = (2_000_000 / (image.size[0] * image.size[1])) ** 0.5
+        image = image.resize((int(image.size[0] * scale), int(image.size[1] * scale)))
+
+        full = analyze_patches(image, max_pixels=None)
+        analyze_patches(image)
+        start = time.perf_counter()
+        for _ in range(10):
+            result = analyze_patches(image)
+        elapsed = (time.perf_counter() - start) / 10
+        agreement = float((result["text_mask"] == full["text_mask"]).mean())
+
+        print(f"{path}: {image.size[0]}x{image.size[1]}, {result['text_likelihood'].size} patches, "
+              f"{int(result['text_mask'].sum())} text, {elapsed * 1000:.2f} ms, "
+              f"{agreement:.1%} mask agreement with full resolution")
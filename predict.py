@@ -1,8 +1,12 @@
-import pytesseract
 import cv2
 import numpy as np
 from preprocess import preprocess_image, preprocess_pil_image
 import re
+from concurrent.futures import ThreadPoolExecutor
+from backend_registry import lazy_module
+
+# pytesseract pulls in pandas; import it only when OCR actually runs
+pytesseract = lazy_module("pytesseract")
 
 
 # Configure Tesseract path (update this path based on your Tesseract installation)
@@ -97,6 +101,59 @@ def predict_multiple_words(pil_image):
         return f"Error processing image: {str(e)}"
 
 
+def recognize_crops(crops, max_workers=1):
+    """
+    Recognize a batch of single-line crops with Tesseract.
+    
+    Each crop runs in its own Tesseract process; ``recognize_regions``
+    already runs batches concurrently, so crops within a batch are
+    sequential unless ``max_workers`` is raised.
+    
+    Args:
+        crops (list): PIL Image crops, one text line (or word) each
+        max_workers (int): Concurrent Tesseract processes for this batch
+        
+    Returns:
+        list: Recognized text per crop (empty string when nothing is found)
+    """
+    # Using PSM 7 for a single text line
+    custom_config = r'--oem 3 --psm 7'
+    
+    def recognize(crop):
+        try:
+            text = clean_text(pytesseract.image_to_string(preprocess_pil_image(crop), config=custom_config))
+            return "" if text == "No text detected" else text
+        except Exception:
+            return ""
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(recognize, crops))
+
+
+def predict_regions(pil_image, unit="line", batch_size=8, max_workers=4):
+    """
+    Predict text by recognizing detected text regions instead of the whole image.
+    
+    Args:
+        pil_image (PIL.Image): PIL Image object
+        unit (str): Region granularity, 'line' or 'word'
+        batch_size (int): Crops per batch
+        max_workers (int): Concurrent batches
+        
+    Returns:
+        str: Predicted text, lines in reading order
+    """
+    from region_recognition import recognize_regions
+    
+    try:
+        text, _ = recognize_regions(pil_image, recognize_crops, unit=unit,
+                                    batch_size=batch_size, max_workers=max_workers)
+        return text if text else "No text detected"
+        
+    except Exception as e:
+        return f"Error processing image: {str(e)}"
+
+
 def clean_text(text):
     """
     Clean and format the extracted text.
@@ -120,3 +120,198 @@ def enhance_contrast(image):
     enhanced = clahe.apply(image)
     
     return enhanced
+
+
+
+def draft_image(pil_image, max_side=2048):
+    """
+    Ask the JPEG decoder for a reduced-resolution decode of a large image.
+
+    ``Image.draft`` lets libjpeg scale by 1/2, 1/4 or 1/8 while decoding, so a
+    4000x3000 phone photo never has to be expanded to full resolution. The
+    decoded image is never smaller than ``max_side`` on its longest side. It
+    only has an effect on JPEG files that have not been loaded yet; for every
+    other image this is a no-op.
+
+    Args:
+        pil_image (PIL.Image): Freshly opened (not yet loaded) PIL Image
+        max_side (int): Longest side the decoded image needs to cover
+
+    Returns:
+        PIL.Image: The same image object, configured for draft decoding
+    """
+    width, height = pil_image.size
+    pil_image.info.setdefault("original_size", (width, height))
+
+    if pil_image.format == "JPEG" and max(width, height) > max_side:
+        scale = max_side / max(width, height)
+        pil_image.draft(None, (max(1, int(width * scale)), max(1, int(height * scale))))
+
+    return pil_image
+
+
+def estimate_text_height(gray, analysis_side=1024):
+    """
+    Estimate the typical glyph height of the text in a grayscale image.
+
+    The image is binarized with Otsu's method (dark ink on light paper) and
+    the median height of plausible connected components is taken as the text
+    height. Analysis runs on a copy capped at ``analysis_side`` pixels and the
+    result is scaled back to the input resolution.
+
+    Args:
+        gray (numpy.ndarray): Grayscale image (uint8)
+        analysis_side (int): Longest side used for the analysis
+
+    Returns:
+        float or None: Estimated text height in pixels, or None if no text-like
+        components were found
+    """
+    height, width = gray.shape[:2]
+    factor = min(1.0, analysis_side / max(height, width))
+
+    if factor < 1.0:
+        small = cv2.resize(gray, (max(1, int(width * factor)), max(1, int(height * factor))),
+                           interpolation=cv2.INTER_AREA)
+    else:
+        small = gray
+
+    _, binary = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+
+    if count <= 1:
+        return None
+
+    # Skip the background label and drop specks and page-sized blobs
+    stats = stats[1:]
+    heights = stats[:, cv2.CC_STAT_HEIGHT]
+    widths = stats[:, cv2.CC_STAT_WIDTH]
+    areas = stats[:, cv2.CC_STAT_AREA]
+
+    keep = ((areas >= 4) & (heights >= 2)
+            & (heights < small.shape[0] * 0.5) & (widths < small.shape[1] * 0.5))
+    heights = heights[keep]
+
+    if heights.size == 0:
+        return None
+
+    # Use the interquartile range so that dots and merged lines do not dominate
+    low, high = np.percentile(heights, [25, 75])
+    core = heights[(heights >= low) & (heights <= high)]
+    text_height = float(np.median(core if core.size else heights))
+
+    return text_height / factor
+
+
+def _text_height_scale(size, text_height, target_x_height, max_side, min_side):
+    """Scale factor (never above 1) that brings text to the target height"""
+    scale = 1.0
+    if text_height:
+        scale = min(scale, target_x_height / text_height)
+    scale = min(scale, max_side / max(size))
+    return max(scale, min(1.0, min_side / min(size)))
+
+
+def load_image(source, max_side=2048, target_x_height=None, min_side=512):
+    """
+    Open an uploaded image, decoding large JPEGs in draft mode.
+
+    With ``target_x_height`` set, a JPEG is first decoded at reduced
+    resolution only to estimate its text height, then decoded again at the
+    smallest draft scale that still covers the target, so full-resolution
+    pixels are never produced.
+
+    Args:
+        source: File path or seekable file-like object (e.g. a Streamlit upload)
+        max_side (int): Upper bound for the longest side of the result
+        target_x_height (int): Desired glyph height in pixels (optional)
+        min_side (int): Lower bound for the shorter side of the result
+
+    Returns:
+        PIL.Image: Loaded PIL Image; ``info["original_size"]`` keeps the
+        on-disk dimensions and, when it was estimated, ``info["original_text_height"]``
+        the text height at that size (reused by ``downscale_to_text_height``)
+    """
+    if hasattr(source, "seek"):
+        source.seek(0)
+    pil_image = Image.open(source)
+    original_size = pil_image.size
+    text_height = None
+    estimated = False
+
+    if target_x_height and pil_image.format == "JPEG":
+        # First pass: cheap reduced decode used only for the text height estimate
+        draft_image(pil_image, 1024)
+        probe = pil_image.convert("L")
+        text_height = estimate_text_height(np.asarray(probe))
+        if text_height:
+            text_height *= original_size[0] / probe.size[0]
+        estimated = True
+
+        scale = _text_height_scale(original_size, text_height, target_x_height, max_side, min_side)
+
+        # Second pass: decode at the smallest draft scale that covers the target
+        if hasattr(source, "seek"):
+            source.seek(0)
+        pil_image = Image.open(source)
+        draft_image(pil_image, max(1, int(max(original_size) * scale)))
+    else:
+        draft_image(pil_image, max_side)
+
+    pil_image.load()
+    pil_image.info["original_size"] = original_size
+    if estimated:
+        pil_image.info["original_text_height"] = text_height
+    return pil_image
+
+
+def downscale_to_text_height(pil_image, target_x_height=32, max_side=2048, min_side=512):
+    """
+    Resize an image so its text lands near a target glyph height.
+
+    Large uploads are first decoded in JPEG draft mode (when still possible),
+    then the text height is estimated and the image is shrunk so glyphs are
+    roughly ``target_x_height`` pixels tall. Images are never upscaled, and the
+    shorter side is kept at or above ``min_side``.
+
+    Args:
+        pil_image (PIL.Image): Input image
+        target_x_height (int): Desired glyph height in pixels
+        max_side (int): Upper bound for the longest side of the result
+        min_side (int): Lower bound for the shorter side of the result
+
+    Returns:
+        tuple: (resized PIL.Image, dict with resize details)
+    """
+    original_size = pil_image.info.get("original_size", pil_image.size)
+    draft_image(pil_image, max_side)
+
+    image = pil_image if pil_image.mode in ("RGB", "L") else pil_image.convert("RGB")
+    decoded_size = image.size
+
+    if "original_text_height" in pil_image.info:
+        # Estimated by load_image on the reduced probe decode; only rescale it
+        text_height = pil_image.info["original_text_height"]
+        text_height = text_height * decoded_size[0] / original_size[0] if text_height else None
+    else:
+        text_height = estimate_text_height(np.asarray(image.convert("L")))
+    scale = _text_height_scale(decoded_size, text_height, target_x_height, max_side, min_side)
+
+    if scale < 1.0:
+        new_size = (max(1, round(decoded_size[0] * scale)), max(1, round(decoded_size[1] * scale)))
+        resized = image.resize(new_size, Image.LANCZOS, reducing_gap=2.0)
+    else:
+        resized = image.copy()
+
+    resized.format = pil_image.format
+
+    details = {
+        "original_size": f"{original_size[0]}x{original_size[1]}",
+        "decoded_size": f"{decoded_size[0]}x{decoded_size[1]}",
+        "working_size": f"{resized.size[0]}x{resized.size[1]}",
+        "estimated_text_height": round(text_height, 1) if text_height else None,
+        "target_x_height": target_x_height,
+        "scale": round(resized.size[0] / original_size[0], 4),
+    }
+
+    return resized, details
@@ -0,0 +1,323 @@
+"""
+Client-side rate limiting for the API recognizers
+=================================================
+
+A token bucket per model, kept in SQLite so every thread and every process
+on the machine (Streamlit workers, batch scripts, the job queue) draws from
+the same quota.
+
+The bucket is stored as a theoretical arrival time (GCRA), so ``acquire``
+does not poll: it reserves the next free send slot in one ``BEGIN IMMEDIATE``
+transaction and sleeps until that slot. Requests leave evenly spaced at
+exactly the quota, with no bursts and no 429-and-retry loops.
+
+Limits come from ``RATE_LIMIT_<KEY>`` (key upper-cased, non-alphanumerics
+as ``_``), e.g. ``RATE_LIMIT_GEMINI_2_0_FLASH=15/min,1500/day``. The
+shortest window paces requests (``RATE_LIMIT_BURST`` requests may go back
+to back, default 1). Longer windows are budgets: the send times of the
+last ``count`` slots are kept, and no window of that length ever holds
+more than ``count`` sends. Keys without a limit are not throttled.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+PERIODS = {"s": 1, "sec": 1, "second": 1, "m": 60, "min": 60, "minute": 60,
+           "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+# Free-tier quotas; override per key with RATE_LIMIT_<KEY>
+DEFAULT_LIMITS = {
+    "gemini-2.0-flash": "15/min,1500/day",
+    "gemini-1.5-pro": "2/min,50/day",
+    "gemini-pro-vision": "60/min",
+    "gemini-pro": "60/min",
+    "google_vision": "1800/min",
+}
+
+DEFAULT_DB_PATH = os.path.join(os.path.expanduser("~"), ".cache", "visiontext", "rate_limits.sqlite3")
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class QuotaExceeded(RuntimeError):
+    """Raised when the next free slot is further away than the caller will wait"""
+
+    def __init__(self, key, wait):
+        super().__init__(f"Rate limit for {key}: next slot in {wait:.1f}s")
+        self.key = key
+        self.wait = wait
+
+
+def parse_limits(spec):
+    """
+    Parse a limit spec such as '15/min,1500/day'
+
+    Args:
+        spec (str): Comma-separated ``count/period`` pairs
+
+    Returns:
+        list: (count, period seconds) pairs, shortest period first
+    """
+    limits = []
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        count, _, period = part.partition("/")
+        seconds = PERIODS.get(period.strip().lower())
+        if seconds is None:
+            raise ValueError(f"Unknown rate limit period in {part!r}")
+        limits.append((float(count), float(seconds)))
+    return sorted(limits, key=lambda limit: limit[1])
+
+
+def limits_for(key):
+    """Configured limits for a key (env first, then DEFAULT_LIMITS)"""
+    env_name = "RATE_LIMIT_" + re.sub(r"[^0-9A-Za-z]", "_", key).upper()
+    return parse_limits(os.getenv(env_name, DEFAULT_LIMITS.get(key, "")))
+
+
+class RateLimiter:
+    def __init__(self, db_path=None, burst=None, max_wait=None):
+        """
+        Shared token buckets backed by a SQLite file
+
+        Args:
+            db_path (str): SQLite file shared by all processes (defaults to
+                RATE_LIMIT_DB or ~/.cache/visiontext/rate_limits.sqlite3)
+            burst (int): Requests allowed back to back in the pacing window
+                (defaults to RATE_LIMIT_BURST or 1)
+            max_wait (float): Longest wait ``acquire`` accepts before raising
+                QuotaExceeded (defaults to RATE_LIMIT_MAX_WAIT or 120 seconds)
+        """
+        self.db_path = db_path or os.getenv('RATE_LIMIT_DB') or DEFAULT_DB_PATH
+        self.burst = int(burst or os.getenv('RATE_LIMIT_BURST', 1))
+        self.max_wait = float(max_wait if max_wait is not None else os.getenv('RATE_LIMIT_MAX_WAIT', 120))
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+
+        self._local = threading.local()
+        self._limits = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tat REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS sends (key TEXT, t REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS sends_key_t ON sends (key, t)")
+
+    def _connection(self):
+        """One connection per thread; SQLite serializes writers across processes (private)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _buckets(self, key):
+        """
+        Pacing bucket and budget windows of ``key`` (private)
+
+        Returns:
+            tuple: ((bucket key, emission interval, tolerance) or None,
+                [(window key, count, period seconds), ...] for the longer windows)
+        """
+        with self._lock:
+            if key not in self._limits:
+                limits = limits_for(key)
+                pace, budgets = None, []
+                if limits:
+                    count, period = limits[0]
+                    interval = period / count
+                    pace = (f"{key}|{count:g}/{period:g}s", interval, (self.burst - 1) * interval)
+                    budgets = [(f"{key}|{count:g}/{period:g}s", int(count), period) for count, period in limits[1:]]
+                self._limits[key] = (pace, budgets)
+            return self._limits[key]
+
+    def reserve(self, key, max_wait=None):
+        """
+        Reserve the next send slot for ``key`` without sleeping
+
+        Args:
+            key (str): Model or service name
+            max_wait (float): Refuse slots further away than this (defaults to ``max_wait``)
+
+        Returns:
+            float: Seconds until the reserved slot (0 if the key is unlimited)
+
+        Raises:
+            QuotaExceeded: The slot is too far away; nothing is reserved
+        """
+        pace, budgets = self._buckets(key)
+        if pace is None:
+            return 0.0
+        max_wait = self.max_wait if max_wait is None else max_wait
+        bucket, interval, tolerance = pace
+
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tat FROM buckets WHERE key = ?", (bucket,)).fetchone()
+            tat = row[0] if row else now
+            slot = max(now, tat - tolerance)
+            for window, count, period in budgets:
+                # The count-th most recent send must have left the window before this one goes
+                row = conn.execute("SELECT t FROM sends WHERE key = ? ORDER BY t DESC LIMIT 1 OFFSET ?",
+                                   (window, count - 1)).fetchone()
+                if row:
+                    slot = max(slot, row[0] + period)
+
+            wait = slot - now
+            if wait > max_wait:
+                conn.execute("ROLLBACK")
+                raise QuotaExceeded(key, wait)
+
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tat) VALUES (?, ?)", (bucket, max(tat, slot) + interval))
+            for window, _, period in budgets:
+                conn.execute("INSERT INTO sends (key, t) VALUES (?, ?)", (window, slot))
+                conn.execute("DELETE FROM sends WHERE key = ? AND t <= ?", (window, now - period))
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+
+        self._record(key, wait)
+        return wait
+
+    def acquire(self, key, max_wait=None):
+        """
+        Block until ``key`` may send one request
+
+        Returns:
+            float: Seconds waited
+
+        Raises:
+            QuotaExceeded: The next slot is further away than ``max_wait``
+        """
+        wait = self.reserve(key, max_wait)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def penalize(self, key, seconds):
+        """
+        Push every process's next slot for ``key`` back after a 429 from the server
+
+        Args:
+            key (str): Model or service name
+            seconds (float): Back-off (the server's Retry-After when it sends one)
+        """
+        pace, _ = self._buckets(key)
+        if pace is None:
+            return
+        bucket, _, tolerance = pace
+        conn = self._connection()
+        with conn:
+            conn.execute("INSERT INTO buckets (key, tat) VALUES (?, ?) "
+                         "ON CONFLICT(key) DO UPDATE SET tat = MAX(tat, excluded.tat)",
+                         (bucket, time.time() + seconds + tolerance))
+        with self._lock:
+            self._stats.setdefault(key, {"requests": 0, "waited": 0, "wait_s": 0.0, "penalties": 0})
+            self._stats[key]["penalties"] += 1
+
+    def _record(self, key, wait):
+        with self._lock:
+            stats = self._stats.setdefault(key, {"requests": 0, "waited": 0, "wait_s": 0.0, "penalties": 0})
+            stats["requests"] += 1
+            stats["waited"] += wait > 0
+            stats["wait_s"] += max(wait, 0.0)
+
+    def stats(self):
+        """Requests, waits and penalties per key in this process"""
+        with self._lock:
+            return {key: {**stats, "wait_s": round(stats["wait_s"], 3),
+                          "limits": [f"{count:g}/{period:g}s" for count, period in limits_for(key)]}
+                    for key, stats in self._stats.items()}
+
+
+def get_rate_limiter(db_path=None):
+    """
+    Get the process-wide limiter for a database file
+
+    Args:
+        db_path (str): SQLite file (defaults to RATE_LIMIT_DB or the cache location)
+
+    Returns:
+        RateLimiter: Limiter cached per file
+    """
+    db_path = db_path or os.getenv('RATE_LIMIT_DB') or DEFAULT_DB_PATH
+    with _limiters_lock:
+        if db_path not in _limiters:
+            _limiters[db_path] = RateLimiter(db_path)
+        return _limiters[db_path]
+
+
+def paced_map(key, fn, items, max_workers=4, limiter=None):
+    """
+    Apply ``fn`` to every item concurrently, one quota slot per call
+
+    Slots are reserved in submission order, so calls start evenly spaced at
+    the quota however many workers are idle.
+
+    Args:
+        key (str): Model or service name whose quota the calls use
+        fn: Callable taking one item
+        items (list): Inputs
+        max_workers (int): Concurrent calls
+        limiter (RateLimiter): Limiter to use (defaults to the shared one)
+
+    Returns:
+        list: ``fn(item)`` per item, in order
+    """
+    limiter = limiter or get_rate_limiter()
+
+    def paced(item):
+        limiter.acquire(key)
+        return fn(item)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="paced") as pool:
+        return list(pool.map(paced, items))
+
+
+def _worker(db_path, key, calls, threads, queue):
+    """Benchmark worker process: ``threads`` threads each sending ``calls`` requests (private)"""
+    limiter = RateLimiter(db_path)
+
+    def run(_):
+        stamps = []
+        for _ in range(calls):
+            limiter.acquire(key)
+            stamps.append(time.time())
+        return stamps
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        queue.put([stamp for stamps in pool.map(run, range(threads)) for stamp in stamps])
+
+
+if __name__ == "__main__":
+    import tempfile
+    import multiprocessing
+
+    key = "benchmark"
+    os.environ["RATE_LIMIT_BENCHMARK"] = "20/s"
+    processes, threads, calls = 3, 4, 5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "limits.sqlite3")
+        RateLimiter(db_path)
+        queue = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=_worker, args=(db_path, key, calls, threads, queue))
+                   for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        stamps = sorted(stamp for _ in workers for stamp in queue.get())
+        for worker in workers:
+            worker.join()
+
+    gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+    rate = (len(stamps) - 1) / (stamps[-1] - stamps[0])
+    print(f"{len(stamps)} requests from {processes} processes x {threads} threads against 20/s")
+    print(f"achieved {rate:.2f}/s, smallest gap {min(gaps) * 1000:.1f} ms (quota spacing 50.0 ms)")
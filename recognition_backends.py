@@ -0,0 +1,508 @@
+"""
+Recognition backends and routing
+================================
+
+Every recognizer in the project is wrapped in a ``RecognitionBackend`` with
+one interface, ``recognize_batch(images) -> list of RecognitionResult``:
+
+- ``tesseract``      local Tesseract (predict.py), word confidences from image_to_data
+- ``char_cnn``       offline Odia character CNN from model_results
+- ``google_vision``  Google Vision DOCUMENT_TEXT_DETECTION, batched in one request
+- ``gemini``         Gemini vision model, confidence from the average token log-probability
+
+``RecognitionRouter`` sends each image to the cheapest backend first and
+falls back to heavier ones only for images whose confidence stays below the
+threshold. Cost is the configured price per image plus a price on latency;
+both latency and acceptance rate are tracked as exponentially weighted
+moving averages, so the order adapts to how each backend actually behaves.
+"""
+
+import io
+import os
+import math
+import time
+import base64
+import shutil
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+
+from backend_registry import lazy_module, is_available
+from resilience import CircuitBreaker, backend_timeout, get_breaker
+from rate_limiter import get_rate_limiter
+
+genai = lazy_module("google.generativeai")
+pytesseract = lazy_module("pytesseract")
+requests = lazy_module("requests")
+
+RECOGNITION_PROMPT = """This image contains handwritten text in Odia script (ଓଡ଼ିଆ).
+Extract the Odia text exactly as written.
+Return only the Odia characters, nothing else."""
+
+_backends = {}
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+@dataclass(slots=True)
+class RecognitionResult:
+    """Text recognized in one image, with a confidence in [0, 1]"""
+
+    text: str
+    confidence: Optional[float]
+    backend: str
+    latency_ms: float = 0.0
+    attempts: List[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class BackendStats:
+    """Moving averages the router keeps per backend"""
+
+    latency_ms: Optional[float] = None
+    confidence: Optional[float] = None
+    accept_rate: float = 1.0
+    images: int = 0
+    accepted: int = 0
+    failures: int = 0
+
+    def update(self, latency_ms, confidences, accepted, alpha):
+        """Fold one batch into the averages"""
+        def ewma(old, new):
+            return new if old is None else (1 - alpha) * old + alpha * new
+
+        self.latency_ms = ewma(self.latency_ms, latency_ms)
+        known = [c for c in confidences if c is not None]
+        if known:
+            self.confidence = ewma(self.confidence, float(np.mean(known)))
+        self.accept_rate = ewma(self.accept_rate, accepted / max(len(confidences), 1))
+        self.images += len(confidences)
+        self.accepted += accepted
+
+
+class RecognitionBackend:
+    """
+    Common interface of all recognizers
+
+    Subclasses set ``name``, a default ``cost_per_image`` (USD, overridable
+    with ``<NAME>_COST_PER_IMAGE``) and an ``expected_latency_ms`` prior used
+    until the first call is measured, and implement ``available`` and
+    ``_recognize``.
+    """
+
+    name = None
+    cost_per_image = 0.0
+    expected_latency_ms = 1000.0
+    # Confidence assumed when a backend does not report one; below the router's
+    # threshold, so unscored answers still escalate to the next backend
+    default_confidence = 0.5
+
+    def __init__(self):
+        self.cost_per_image = float(os.getenv(f'{self.name.upper()}_COST_PER_IMAGE', self.cost_per_image))
+        self._available = None
+
+    @property
+    def is_available(self):
+        """Whether the backend can run here (checked once)"""
+        if self._available is None:
+            try:
+                self._available = bool(self.available())
+            except Exception:
+                self._available = False
+        return self._available
+
+    def available(self):
+        raise NotImplementedError
+
+    def _recognize(self, images):
+        raise NotImplementedError
+
+    def recognize_batch(self, images):
+        """
+        Recognize a batch of images
+
+        Args:
+            images (list): PIL Images
+
+        Returns:
+            list: One RecognitionResult per image
+        """
+        if not images:
+            return []
+        start = time.perf_counter()
+        outputs = self._recognize(images)
+        latency_ms = (time.perf_counter() - start) * 1000 / len(images)
+        return [RecognitionResult(text=text, confidence=self.default_confidence if confidence is None else confidence,
+                                  backend=self.name, latency_ms=round(latency_ms, 1))
+                for text, confidence in outputs]
+
+
+class TesseractBackend(RecognitionBackend):
+    name = "tesseract"
+    expected_latency_ms = 400.0
+    default_confidence = 0.0
+
+    def __init__(self, lang=None):
+        super().__init__()
+        self.lang = lang or os.getenv('TESSERACT_LANG', 'eng')
+
+    def available(self):
+        return is_available("pytesseract") and shutil.which(pytesseract.pytesseract.tesseract_cmd)
+
+    def _recognize(self, images):
+        from preprocess import preprocess_pil_image
+
+        outputs = []
+        for image in images:
+            data = pytesseract.image_to_data(preprocess_pil_image(image), lang=self.lang, config='--oem 3 --psm 6',
+                                             output_type=pytesseract.Output.DICT)
+            lines, confidences = {}, []
+            for word, conf, block, line in zip(data['text'], data['conf'], data['block_num'], data['line_num']):
+                if word.strip() and float(conf) >= 0:
+                    lines.setdefault((block, line), []).append(word.strip())
+                    confidences.append(float(conf) / 100)
+            text = "\n".join(" ".join(words) for _, words in sorted(lines.items()))
+            outputs.append((text, float(np.mean(confidences)) if confidences else 0.0))
+        return outputs
+
+
+class CharCNNBackend(RecognitionBackend):
+    name = "char_cnn"
+    expected_latency_ms = 150.0
+
+    def available(self):
+        from char_classifier import DEFAULT_CHAR_MODEL, load_training_config
+
+        # With fewer than two classes every glyph is "recognized" with probability 1
+        labels, _ = load_training_config()
+        if len(labels) < 2:
+            return False
+
+        model_path = os.getenv('CHAR_MODEL_PATH') or DEFAULT_CHAR_MODEL
+        if model_path.endswith('.tflite'):
+            runtime = any(is_available(m) for m in ("tflite_runtime", "ai_edge_litert", "tensorflow"))
+        else:
+            runtime = is_available("tensorflow")
+        return runtime and os.path.exists(model_path)
+
+    def _recognize(self, images):
+        from char_classifier import get_char_classifier
+        from glyph_segmentation import segment_page
+
+        classifier = get_char_classifier()
+        pages = [segment_page(image, size=classifier.img_size) for image in images]
+        # All glyphs of the batch go through the network in one call
+        glyphs = [page[0] for page in pages if len(page[0])]
+        predictions = classifier.predict_batch(np.concatenate(glyphs), top_k=2) if glyphs else []
+
+        outputs, offset = [], 0
+        for _, boxes, positions in pages:
+            page_predictions = predictions[offset:offset + len(boxes)]
+            offset += len(boxes)
+            if not page_predictions:
+                outputs.append(("", 0.0))
+                continue
+            lines = {}
+            for (line, word), prediction in zip(positions, page_predictions):
+                words = lines.setdefault(line, {})
+                words[word] = words.get(word, "") + prediction[0][0]
+            text = "\n".join(" ".join(words[w] for w in sorted(words)) for _, words in sorted(lines.items()))
+            outputs.append((text, self._margin(page_predictions)))
+        return outputs
+
+    @staticmethod
+    def _margin(predictions):
+        """
+        Page confidence: the mean gap between the top two class probabilities (private)
+
+        Softmax peaks near 1.0 even on glyphs the network has never seen, while
+        a small gap to the runner-up marks the ambiguous ones.
+        """
+        margins = [prediction[0][1] - (prediction[1][1] if len(prediction) > 1 else 0.0)
+                   for prediction in predictions]
+        return float(np.mean(margins))
+
+
+class GoogleVisionBackend(RecognitionBackend):
+    name = "google_vision"
+    cost_per_image = 0.0015
+    expected_latency_ms = 1200.0
+
+    # images:annotate accepts at most 16 images per request
+    max_batch = 16
+
+    def __init__(self, api_key=None, endpoint=None):
+        from google_vision import DEFAULT_ENDPOINT
+
+        super().__init__()
+        self.api_key = api_key or os.getenv('GOOGLE_VISION_API_KEY')
+        self.endpoint = endpoint or os.getenv('GOOGLE_VISION_ENDPOINT', DEFAULT_ENDPOINT)
+
+    def available(self):
+        return bool(self.api_key) and is_available("requests")
+
+    @staticmethod
+    def _encode(image):
+        buffered = io.BytesIO()
+        image.save(buffered, format="PNG")
+        return base64.b64encode(buffered.getvalue()).decode()
+
+    @staticmethod
+    def _parse(response):
+        """Text and mean word confidence of one annotate response (private)"""
+        annotation = response.get("fullTextAnnotation")
+        if not annotation:
+            return "", 0.0
+        confidences = [word.get("confidence", 0.0)
+                       for page in annotation.get("pages", [])
+                       for block in page.get("blocks", [])
+                       for paragraph in block.get("paragraphs", [])
+                       for word in paragraph.get("words", [])]
+        return annotation.get("text", "").strip(), float(np.mean(confidences)) if confidences else None
+
+    def _recognize(self, images):
+        outputs = []
+        for start in range(0, len(images), self.max_batch):
+            chunk = images[start:start + self.max_batch]
+            data = {"requests": [{"image": {"content": self._encode(image)},
+                                  "features": [{"type": "DOCUMENT_TEXT_DETECTION"}]} for image in chunk]}
+            get_rate_limiter().acquire(self.name)
+            response = requests.post(self.endpoint, params={"key": self.api_key}, json=data,
+                                     timeout=backend_timeout(self.name))
+            response.raise_for_status()
+            outputs.extend(self._parse(r) for r in response.json().get("responses", []))
+        return outputs
+
+
+class GeminiBackend(RecognitionBackend):
+    name = "gemini"
+    cost_per_image = 0.0004
+    expected_latency_ms = 2500.0
+
+    def __init__(self, api_key=None, model_name=None, model=None):
+        super().__init__()
+        self.api_key = api_key or os.getenv('MODEL_API_KEY')
+        self.model_name = model_name or os.getenv('MODEL_NAME_VISION', 'gemini-2.0-flash')
+        self._model = model
+        self._lock = threading.Lock()
+
+    def available(self):
+        return self._model is not None or bool(self.api_key)
+
+    def _engine(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def _recognize(self, images):
+        outputs = []
+        for image in images:
+            get_rate_limiter().acquire(self.model_name)
+            response = self._engine().generate_content([RECOGNITION_PROMPT, image],
+                                                       request_options={"timeout": backend_timeout(self.name)})
+            avg_logprobs = getattr(response.candidates[0], "avg_logprobs", None) if response.candidates else None
+            # A missing field comes back as 0.0, which would read as certainty
+            confidence = math.exp(avg_logprobs) if avg_logprobs else None
+            outputs.append((response.text.strip() if response.text else "", confidence))
+        return outputs
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (TesseractBackend, CharCNNBackend, GoogleVisionBackend, GeminiBackend)
+}
+
+
+class RecognitionRouter:
+    def __init__(self, backends=None, confidence_threshold=None, latency_cost=None, alpha=0.2):
+        """
+        Route images through backends cheapest first
+
+        Args:
+            backends (list): RecognitionBackend instances (defaults to one of each
+                in BACKENDS, or the names listed in RECOGNITION_BACKENDS)
+            confidence_threshold (float): Confidence a result needs to be accepted
+                (defaults to ROUTER_CONFIDENCE_THRESHOLD or 0.8)
+            latency_cost (float): Price of one second of latency in USD, weighed
+                against per-image cost (defaults to ROUTER_LATENCY_COST or 0.001)
+            alpha (float): EWMA smoothing factor for the per-backend stats
+        """
+        if backends is None:
+            names = os.getenv('RECOGNITION_BACKENDS')
+            names = [n.strip() for n in names.split(',')] if names else list(BACKENDS)
+            backends = [get_backend(name) for name in names]
+
+        self.backends = {backend.name: backend for backend in backends}
+        self.confidence_threshold = float(confidence_threshold if confidence_threshold is not None
+                                          else os.getenv('ROUTER_CONFIDENCE_THRESHOLD', 0.8))
+        self.latency_cost = float(latency_cost if latency_cost is not None
+                                  else os.getenv('ROUTER_LATENCY_COST', 0.001))
+        self.alpha = alpha
+        self._stats = {name: BackendStats() for name in self.backends}
+        self._lock = threading.Lock()
+
+    def expected_cost(self, name):
+        """
+        Expected cost of one accepted result from a backend
+
+        The per-image cost plus the priced latency, divided by the share of
+        images the backend answers confidently: a cheap backend that is
+        rarely good enough ends up behind a dearer one that usually is.
+        """
+        backend, stats = self.backends[name], self._stats[name]
+        latency_ms = stats.latency_ms if stats.latency_ms is not None else backend.expected_latency_ms
+        # The floor keeps acceptance rate deciding the order among free, instant backends
+        cost = max(backend.cost_per_image + self.latency_cost * latency_ms / 1000, 1e-9)
+        return cost / max(stats.accept_rate, 0.05)
+
+    def route(self):
+        """Available backend names whose circuit is not open, cheapest expected cost first"""
+        with self._lock:
+            names = [name for name, backend in self.backends.items()
+                     if backend.is_available and get_breaker(name).state != CircuitBreaker.OPEN]
+            return sorted(names, key=self.expected_cost)
+
+    def recognize_batch(self, images):
+        """
+        Recognize images, escalating only the low-confidence ones
+
+        Args:
+            images (list): PIL Images
+
+        Returns:
+            list: One RecognitionResult per image; when no backend reaches the
+            threshold the most confident answer is returned
+        """
+        best = [None] * len(images)
+        attempts = [[] for _ in images]
+        pending = list(range(len(images)))
+
+        for name in self.route():
+            if not pending:
+                break
+            backend, breaker = self.backends[name], get_breaker(name)
+            if not breaker.allow():
+                continue
+            start = time.perf_counter()
+            try:
+                results = list(backend.recognize_batch([images[i] for i in pending]))
+                # A short (or long) answer cannot be matched to the images; treat it as a failed call
+                if len(results) != len(pending):
+                    raise RuntimeError(f"{name} returned {len(results)} results for {len(pending)} images")
+                breaker.record_success((time.perf_counter() - start) / len(pending))
+            except Exception:
+                breaker.record_failure()
+                with self._lock:
+                    stats = self._stats[name]
+                    stats.failures += 1
+                    stats.update((time.perf_counter() - start) * 1000 / len(pending), [None] * len(pending), 0,
+                                 self.alpha)
+                for i in pending:
+                    attempts[i].append(name)
+                continue
+
+            still_pending = []
+            for i, result in zip(pending, results):
+                attempts[i].append(name)
+                if best[i] is None or (result.confidence or 0) > (best[i].confidence or 0):
+                    best[i] = result
+                if (result.confidence or 0) < self.confidence_threshold:
+                    still_pending.append(i)
+
+            with self._lock:
+                self._stats[name].update(results[0].latency_ms if results else 0.0,
+                                         [result.confidence for result in results],
+                                         len(pending) - len(still_pending), self.alpha)
+            pending = still_pending
+
+        outputs = []
+        for result, tried in zip(best, attempts):
+            result = result or RecognitionResult(text="", confidence=0.0, backend=None)
+            result.attempts = tried
+            outputs.append(result)
+        return outputs
+
+    def recognize(self, image):
+        """Recognize a single image (see ``recognize_batch``)"""
+        return self.recognize_batch([image])[0]
+
+    def stats(self):
+        """
+        Per-backend routing statistics
+
+        Returns:
+            dict: Backend name -> availability, cost, moving averages and counts
+        """
+        with self._lock:
+            return {
+                name: {
+                    "available": self.backends[name].is_available,
+                    "cost_per_image": self.backends[name].cost_per_image,
+                    "expected_cost": round(self.expected_cost(name), 6),
+                    "latency_ms": None if stats.latency_ms is None else round(stats.latency_ms, 1),
+                    "confidence": None if stats.confidence is None else round(stats.confidence, 3),
+                    "accept_rate": round(stats.accept_rate, 3),
+                    "images": stats.images,
+                    "accepted": stats.accepted,
+                    "failures": stats.failures
+                }
+                for name, stats in self._stats.items()
+            }
+
+
+def get_backend(name):
+    """
+    Get the shared instance of a backend, so models and clients load once
+
+    Args:
+        name (str): Key of BACKENDS
+
+    Returns:
+        RecognitionBackend: Backend instance
+    """
+    with _routers_lock:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+        return _backends[name]
+
+
+def get_router(backends=None):
+    """
+    Get the shared router, so routing statistics accumulate across requests
+
+    Args:
+        backends (str): Comma-separated backend names (defaults to RECOGNITION_BACKENDS or all)
+
+    Returns:
+        RecognitionRouter: Router cached per backend list
+    """
+    key = backends or os.getenv('RECOGNITION_BACKENDS') or ",".join(BACKENDS)
+    instances = [get_backend(name.strip()) for name in key.split(',')]
+    with _routers_lock:
+        if key not in _routers:
+            _routers[key] = RecognitionRouter(instances)
+        return _routers[key]
+
+
+if __name__ == "__main__":
+    import glob
+    from PIL import Image
+
+    router = get_router()
+    print("Route: " + (" -> ".join(router.route()) or "no backend available"))
+
+    for path in sorted(glob.glob("images/*.jpeg")):
+        result = router.recognize(Image.open(path).convert("RGB"))
+        confidence = "-" if result.confidence is None else f"{result.confidence:.2f}"
+        print(f"{path:<28}{result.backend or '-':<15}{confidence:>6}  tried {', '.join(result.attempts) or '-'}")
+
+    print(f"\n{'backend':<15}{'avail':>6}{'cost $':>10}{'latency ms':>12}{'accept':>8}{'images':>8}")
+    for name, row in router.stats().items():
+        latency = "-" if row["latency_ms"] is None else row["latency_ms"]
+        print(f"{name:<15}{str(row['available']):>6}{row['cost_per_image']:>10}{latency:>12}"
+              f"{row['accept_rate']:>8}{row['images']:>8}")
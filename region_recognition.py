@@ -0,0 +1,218 @@
+"""
+Region-level recognition
+========================
+
+Instead of sending the whole page to a recognizer, detected text regions
+(lines or words from ``text_detection``) are cropped tightly, grouped into
+batches and recognized concurrently. The per-region texts are stitched back
+together in reading order: regions on the same line are joined with spaces
+and lines with newlines.
+
+A recognizer is any callable ``recognize_batch(crops) -> list of str`` that
+returns one text per crop. Remote recognizers can pack a batch into a single
+request with ``pack_crops``; local ones (Tesseract) can simply map over it.
+"""
+
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from text_detection import detect_text
+
+
+def find_regions(image, unit="line"):
+    """
+    Detect text regions to recognize
+
+    Args:
+        image (PIL.Image): Input image
+        unit (str): 'line' or 'word'
+
+    Returns:
+        list: Dicts with ``bbox`` (x0, y0, x1, y1) and ``line`` index, in reading order
+    """
+    detections = detect_text(image)
+    if unit == "word":
+        return [{"bbox": word["bbox"], "line": word["line"]} for word in detections["words"]]
+    return [{"bbox": line["bbox"], "line": number} for number, line in enumerate(detections["lines"])]
+
+
+def crop_regions(image, regions, pad=0.15):
+    """
+    Cut tight crops around regions, padded by a fraction of the region height
+
+    Args:
+        image (PIL.Image): Source image
+        regions (list): Regions from ``find_regions``
+        pad (float): Padding as a fraction of each region's height
+
+    Returns:
+        list: PIL Images, one per region
+    """
+    width, height = image.size
+    crops = []
+    for region in regions:
+        x0, y0, x1, y1 = region["bbox"]
+        margin = int((y1 - y0) * pad) + 2
+        crops.append(image.crop((max(x0 - margin, 0), max(y0 - margin, 0),
+                                 min(x1 + margin, width), min(y1 + margin, height))))
+    return crops
+
+
+def pack_crops(crops, gap=24, background=255):
+    """
+    Stack crops top to bottom on one white sheet so a batch fits in one request
+
+    Args:
+        crops (list): PIL Images
+        gap (int): Blank pixels between rows
+        background (int): Sheet gray level
+
+    Returns:
+        PIL.Image: Sheet with one crop per row, left aligned
+    """
+    mode = "RGB" if any(crop.mode == "RGB" for crop in crops) else "L"
+    width = max(crop.size[0] for crop in crops) + 2 * gap
+    height = sum(crop.size[1] for crop in crops) + gap * (len(crops) + 1)
+
+    sheet = Image.new(mode, (width, height), (background,) * 3 if mode == "RGB" else background)
+    y = gap
+    for crop in crops:
+        sheet.paste(crop.convert(mode), (gap, y))
+        y += crop.size[1] + gap
+    return sheet
+
+
+def stitch_text(regions, texts):
+    """
+    Join region texts in reading order
+
+    Args:
+        regions (list): Regions with a ``line`` index, in reading order
+        texts (list): Recognized text per region
+
+    Returns:
+        str: Words joined by spaces within a line, lines joined by newlines
+    """
+    lines = {}
+    for region, text in zip(regions, texts):
+        text = (text or "").strip()
+        if text:
+            lines.setdefault(region["line"], []).append(text)
+    return "\n".join(" ".join(parts) for _, parts in sorted(lines.items()))
+
+
+def recognize_regions(image, recognize_batch, unit="line", batch_size=8, max_workers=4, regions=None):
+    """
+    Recognize an image region by region with batched, concurrent requests
+
+    Args:
+        image (PIL.Image): Input image
+        recognize_batch: Callable taking a list of crops and returning one text per crop
+        unit (str): Region granularity, 'line' or 'word'
+        batch_size (int): Crops per recognizer call
+        max_workers (int): Concurrent recognizer calls
+        regions (list): Precomputed regions (detected when omitted)
+
+    Returns:
+        tuple: (stitched text, details dict with region count, batches and timings)
+    """
+    start = time.perf_counter()
+    if regions is None:
+        regions = find_regions(image, unit=unit)
+    detect_ms = (time.perf_counter() - start) * 1000
+
+    if not regions:
+        return "", {"regions": 0, "batches": 0, "detection_ms": round(detect_ms, 1), "recognition_ms": 0.0}
+
+    crops = crop_regions(image, regions)
+    batches = [crops[i:i + batch_size] for i in range(0, len(crops), batch_size)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches)), thread_name_prefix="region-ocr") as pool:
+        results = list(pool.map(recognize_batch, batches))
+    recognize_ms = (time.perf_counter() - start) * 1000
+
+    texts = []
+    for batch, batch_texts in zip(batches, results):
+        # Keep alignment even if a recognizer returns too few or too many rows
+        batch_texts = list(batch_texts)[:len(batch)]
+        texts.extend(batch_texts + [""] * (len(batch) - len(batch_texts)))
+
+    details = {
+        "regions": len(regions),
+        "unit": unit,
+        "batches": len(batches),
+        "detection_ms": round(detect_ms, 1),
+        "recognition_ms": round(recognize_ms, 1),
+        "region_texts": texts
+    }
+    return stitch_text(regions, texts), details
+
+
+def encoded_size(image, format="JPEG", quality=90):
+    """Bytes needed to send ``image`` in a request body"""
+    buffer = io.BytesIO()
+    image = image.convert("RGB") if format == "JPEG" and image.mode not in ("RGB", "L") else image
+    image.save(buffer, format=format, quality=quality)
+    return buffer.tell()
+
+
+def compare_modes(image, recognize_batch, recognize_image=None, unit="line", batch_size=8, max_workers=4):
+    """
+    Compare whole-image and region-level recognition on one image
+
+    Args:
+        image (PIL.Image): Input image
+        recognize_batch: Recognizer callable (see module docstring)
+        recognize_image: Whole-image recognizer (defaults to ``recognize_batch`` on one image)
+        unit (str): Region granularity for the region mode
+        batch_size (int): Crops per request in the region mode
+        max_workers (int): Concurrent requests in the region mode
+
+    Returns:
+        dict: Latency and request payload bytes for both modes, plus their texts
+    """
+    start = time.perf_counter()
+    whole_text = recognize_image(image) if recognize_image else recognize_batch([image])[0]
+    whole_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    regions = find_regions(image, unit=unit)
+    region_text, details = recognize_regions(image, recognize_batch, unit=unit, batch_size=batch_size,
+                                             max_workers=max_workers, regions=regions)
+    region_ms = (time.perf_counter() - start) * 1000
+
+    crops = crop_regions(image, regions)
+    sheets = [pack_crops(crops[i:i + batch_size]) for i in range(0, len(crops), batch_size)]
+
+    return {
+        "whole_image": {"latency_ms": round(whole_ms, 1), "payload_bytes": encoded_size(image),
+                        "requests": 1, "text": whole_text},
+        "regions": {"latency_ms": round(region_ms, 1),
+                    "payload_bytes": sum(encoded_size(sheet) for sheet in sheets),
+                    "requests": len(sheets), "regions": details["regions"], "text": region_text}
+    }
+
+
+if __name__ == "__main__":
+    import glob
+    import shutil
+
+    if shutil.which("tesseract"):
+        from predict import recognize_crops as recognizer, predict_multiple_words as whole_recognizer
+    else:
+        print("tesseract not found; latency columns measure detection and cropping only\n")
+        recognizer = lambda crops: ["" for _ in crops]
+        whole_recognizer = None
+
+    print(f"{'image':<28}{'mode':<8}{'requests':>9}{'regions':>9}{'payload KB':>12}{'latency ms':>12}")
+    for path in sorted(glob.glob("images/*.jpeg")):
+        result = compare_modes(Image.open(path).convert("RGB"), recognizer, whole_recognizer)
+        whole, regions = result["whole_image"], result["regions"]
+        print(f"{path:<28}{'whole':<8}{whole['requests']:>9}{'-':>9}"
+              f"{whole['payload_bytes'] / 1024:>12.1f}{whole['latency_ms']:>12.1f}")
+        print(f"{'':<28}{'regions':<8}{regions['requests']:>9}{regions['regions']:>9}"
+              f"{regions['payload_bytes'] / 1024:>12.1f}{regions['latency_ms']:>12.1f}")
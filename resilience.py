@@ -0,0 +1,338 @@
+"""
+Timeouts, circuit breakers and hedged requests
+==============================================
+
+Remote recognizers (Gemini, Google Vision) are called through three guards:
+
+- a per-backend timeout (``GEMINI_TIMEOUT``, ``GOOGLE_VISION_TIMEOUT``, in
+  seconds), passed to the client library and enforced again around the call;
+- a circuit breaker per backend: after ``BREAKER_FAILURES`` consecutive
+  failures it opens and calls go straight to the fallback (the local
+  Tesseract path) for ``BREAKER_RESET_SECONDS``; then one trial call is let
+  through and its outcome closes or re-opens the breaker;
+- optional hedging (``HEDGE_REQUESTS=1``): if the primary has not answered
+  within its observed p95 latency, a second backend is started and the first
+  successful answer wins.
+
+Calls made with a ``rate_key`` first wait for a quota slot from
+``rate_limiter``; that wait is not counted against the timeout.
+"""
+
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import numpy as np
+
+from rate_limiter import QuotaExceeded, get_rate_limiter
+
+
+DEFAULT_TIMEOUTS = {
+    "gemini": 30.0,
+    "google_vision": 15.0,
+}
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+# Shared pool for timed and hedged calls; a call that outlives its timeout
+# keeps its worker until the client library gives up on its own
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv('REMOTE_CALL_WORKERS', 8)),
+                               thread_name_prefix="remote-call")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is refused because the backend's breaker is open"""
+
+
+def backend_timeout(name):
+    """Timeout in seconds for a backend (``<NAME>_TIMEOUT`` or the default)"""
+    return float(os.getenv(f'{name.upper()}_TIMEOUT', DEFAULT_TIMEOUTS.get(name, 20.0)))
+
+
+def hedging_enabled():
+    """Whether hedged requests are switched on (``HEDGE_REQUESTS``)"""
+    return os.getenv('HEDGE_REQUESTS', '0').lower() in ('1', 'true', 'yes')
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None, window=200):
+        """
+        Track the health of one backend
+
+        Args:
+            name (str): Backend name
+            failure_threshold (int): Consecutive failures that open the breaker
+                (defaults to BREAKER_FAILURES or 5)
+            reset_timeout (float): Seconds the breaker stays open before a trial
+                call (defaults to BREAKER_RESET_SECONDS or 30)
+            window (int): Successful latencies kept for the percentile estimate
+        """
+        self.name = name
+        self.failure_threshold = int(failure_threshold or os.getenv('BREAKER_FAILURES', 5))
+        self.reset_timeout = float(reset_timeout or os.getenv('BREAKER_RESET_SECONDS', 30))
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._latencies = deque(maxlen=window)
+        self._counts = {"calls": 0, "failures": 0, "rejected": 0, "fallbacks": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Whether a call may go through now (claims the single half-open trial)"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at < self.reset_timeout:
+                self._counts["rejected"] += 1
+                return False
+            if self._trial_running:
+                self._counts["rejected"] += 1
+                return False
+            self._state = self.HALF_OPEN
+            self._trial_running = True
+            return True
+
+    def record_success(self, seconds=None):
+        with self._lock:
+            self._counts["calls"] += 1
+            if seconds is not None:
+                self._latencies.append(seconds)
+            self._failures = 0
+            self._trial_running = False
+            self._state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._counts["calls"] += 1
+            self._counts["failures"] += 1
+            self._failures += 1
+            self._trial_running = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def percentile(self, q=95, default=None):
+        """Latency percentile of recent successful calls in seconds (``default`` if none yet)"""
+        with self._lock:
+            latencies = list(self._latencies)
+        return float(np.percentile(latencies, q)) if latencies else default
+
+    def call(self, fn, *args, timeout=None, fallback=None, **kwargs):
+        """
+        Call ``fn`` through the breaker
+
+        Args:
+            fn: Callable to run
+            timeout (float): Seconds to wait for ``fn`` (None waits indefinitely)
+            fallback: Callable taking the same arguments, used when the breaker
+                is open or ``fn`` fails or times out
+
+        Returns:
+            The result of ``fn``, or of ``fallback``
+
+        Raises:
+            CircuitOpenError, TimeoutError or the error raised by ``fn`` when
+            there is no fallback
+        """
+        if not self.allow():
+            return self.reject(fallback, *args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            result = call_with_timeout(fn, timeout, *args, **kwargs)
+        except Exception:
+            self.record_failure()
+            if fallback is None:
+                raise
+            return self._fallback(fallback, *args, **kwargs)
+
+        self.record_success(time.perf_counter() - start)
+        return result
+
+    def reject(self, fallback, *args, **kwargs):
+        """Answer a refused call with the fallback, or raise CircuitOpenError without one"""
+        if fallback is None:
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        return self._fallback(fallback, *args, **kwargs)
+
+    def _fallback(self, fallback, *args, **kwargs):
+        with self._lock:
+            self._counts["fallbacks"] += 1
+        return fallback(*args, **kwargs)
+
+    def stats(self):
+        """State, counters and p50/p95 latency of the backend"""
+        p50, p95 = self.percentile(50), self.percentile(95)
+        with self._lock:
+            counts = dict(self._counts)
+        return {
+            "state": self.state,
+            **counts,
+            "p50_ms": None if p50 is None else round(p50 * 1000, 1),
+            "p95_ms": None if p95 is None else round(p95 * 1000, 1)
+        }
+
+
+def get_breaker(name):
+    """
+    Get the shared circuit breaker of a backend
+
+    Args:
+        name (str): Backend name, e.g. 'gemini' or 'google_vision'
+
+    Returns:
+        CircuitBreaker: One breaker per backend per process
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def breaker_stats():
+    """Stats of every breaker created so far, by backend name"""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.stats() for name, breaker in breakers.items()}
+
+
+def call_with_timeout(fn, timeout, *args, **kwargs):
+    """
+    Run ``fn`` and give up waiting after ``timeout`` seconds
+
+    Raises:
+        TimeoutError: ``fn`` did not return in time
+    """
+    if timeout is None:
+        return fn(*args, **kwargs)
+    future = _executor.submit(fn, *args, **kwargs)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        future.cancel()
+        raise TimeoutError(f"{getattr(fn, '__name__', 'call')} timed out after {timeout:.1f}s")
+
+
+def hedged_call(primary, secondary, delay, timeout=None):
+    """
+    Start ``primary``; if it has not answered after ``delay`` seconds, also start
+    ``secondary`` and return whichever succeeds first
+
+    Args:
+        primary: Zero-argument callable
+        secondary: Zero-argument callable for the hedge
+        delay (float): Seconds to wait before hedging (typically the primary's p95)
+        timeout (float): Overall seconds to wait for an answer
+
+    Returns:
+        tuple: (result, 'primary' or 'secondary')
+
+    Raises:
+        TimeoutError if neither answers in time, or the primary's error if both fail
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    futures = {_executor.submit(primary): "primary"}
+    done, _ = wait(futures, timeout=delay)
+    if not done:
+        futures[_executor.submit(secondary)] = "secondary"
+
+    errors = {}
+    pending = set(futures)
+    while pending:
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return future.result(), futures[future]
+            errors[futures[future]] = future.exception()
+
+    if len(errors) < len(futures):
+        raise TimeoutError(f"No answer within {timeout:.1f}s")
+    raise errors.get("primary") or errors["secondary"]
+
+
+def is_rate_limited(error):
+    """Whether an exception is the server's 429 / ResourceExhausted answer"""
+    return getattr(error, "code", None) == 429 or type(error).__name__ == "ResourceExhausted"
+
+
+def _penalizing(fn, rate_key):
+    """Wrap ``fn`` so a 429 pushes back the shared quota for ``rate_key`` (private)"""
+    def call(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if is_rate_limited(e):
+                retry_after = getattr(e, "retry_after", None) or float(os.getenv('RATE_LIMIT_BACKOFF', 10))
+                get_rate_limiter().penalize(rate_key, float(retry_after))
+            raise
+    return call
+
+
+def guarded_call(name, fn, *args, fallback=None, secondary=None, rate_key=None, **kwargs):
+    """
+    Call a remote backend with its quota, timeout, breaker and (optionally) a hedge
+
+    Args:
+        name (str): Backend name (selects timeout and breaker)
+        fn: Remote call
+        fallback: Local callable with the same arguments, used when the
+            breaker is open, the quota is exhausted or the call fails
+        secondary: Callable with the same arguments to hedge with when
+            HEDGE_REQUESTS is on and the backend has a p95 estimate
+        rate_key (str): Quota the call draws from (usually the model name)
+
+    Returns:
+        The result of ``fn``, the hedge or the fallback
+    """
+    breaker = get_breaker(name)
+    if rate_key:
+        # Wait for the quota outside the timeout, and not at all when the breaker will refuse
+        if breaker.state != CircuitBreaker.OPEN:
+            try:
+                get_rate_limiter().acquire(rate_key)
+            except QuotaExceeded:
+                if fallback is None:
+                    raise
+                return breaker._fallback(fallback, *args, **kwargs)
+        fn = _penalizing(fn, rate_key)
+
+    timeout = backend_timeout(name)
+    delay = breaker.percentile(95)
+    if secondary is None or delay is None or not hedging_enabled():
+        return breaker.call(fn, *args, timeout=timeout, fallback=fallback, **kwargs)
+
+    if not breaker.allow():
+        return breaker.reject(fallback, *args, **kwargs)
+
+    start = time.perf_counter()
+    try:
+        result, winner = hedged_call(lambda: fn(*args, **kwargs), lambda: secondary(*args, **kwargs),
+                                     delay, timeout=timeout)
+    except Exception:
+        breaker.record_failure()
+        if fallback is None:
+            raise
+        return breaker._fallback(fallback, *args, **kwargs)
+
+    # Only the primary's own latency feeds the p95 that sets the hedge delay
+    breaker.record_success(time.perf_counter() - start if winner == "primary" else None)
+    return result
@@ -0,0 +1,327 @@
+"""
+Headless HTTP inference service for the VisionText Agent
+========================================================
+
+A small ASGI app that loads ``VisionTextAgent`` once and exposes it over HTTP:
+
+* ``POST /ocr``        - one image, as multipart (``file`` field) or raw bytes
+* ``POST /ocr/batch``  - several images as multipart (``files`` fields)
+* ``GET  /health``     - agent readiness and queue depth
+* ``GET  /metrics``    - Prometheus text format latency histograms
+
+Responses carry the compact per-stage payload from ``stage_payload``; add
+``?thumbnails=1`` to embed base64 JPEG thumbnails of stage images.
+
+Images are decoded off the event loop and run on a worker pool
+(``OCR_WORKERS``); ``/ocr/batch`` takes many images in one request and
+reports errors per image. When more than ``OCR_MAX_PENDING`` images are
+waiting, new requests are rejected with ``503`` and a ``Retry-After``
+header instead of queueing without bound.
+
+Run with:
+    uvicorn service:app --host 0.0.0.0 --port 8000
+"""
+
+import io
+import os
+import time
+import asyncio
+import threading
+from functools import partial
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from preprocess import load_image
+
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+
+class Histogram:
+    """Thread-safe cumulative histogram rendered in Prometheus text format"""
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, **labels):
+        """Record one observation for the given label set"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        """Render all series as Prometheus exposition lines"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in self._series.items():
+                labels = ",".join(f'{k}="{v}"' for k, v in key)
+                sep = "," if labels else ""
+                for bound, bucket_count in zip(self.buckets, series["buckets"]):
+                    lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {series["count"]}')
+                lines.append(f"{self.name}_sum{{{labels}}} {series['sum']:.6f}")
+                lines.append(f"{self.name}_count{{{labels}}} {series['count']}")
+        return lines
+
+
+class Counter:
+    """Thread-safe labelled counter rendered in Prometheus text format"""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                labels = ",".join(f'{k}="{v}"' for k, v in key)
+                lines.append(f"{self.name}{{{labels}}} {value}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram("visiontext_request_seconds", "End-to-end HTTP request latency")
+PIPELINE_LATENCY = Histogram("visiontext_pipeline_seconds", "Agent pipeline latency per image")
+QUEUE_WAIT = Histogram("visiontext_queue_wait_seconds", "Time an image waited for a worker")
+REQUEST_IMAGES = Histogram("visiontext_request_images", "Images per request", BATCH_SIZE_BUCKETS)
+REQUESTS = Counter("visiontext_requests_total", "HTTP requests by endpoint and status code")
+
+
+class InferencePool:
+    """
+    Runs images through the agent on a worker pool with bounded pending work
+
+    Every submitted image goes straight to the pool (the agent has no
+    multi-image call, so grouping images first would only add latency).
+    Images count as pending from submission until their result is ready;
+    ``max_pending`` bounds that number to provide backpressure.
+    """
+
+    def __init__(self, agent, max_pending=64, workers=4):
+        self.agent = agent
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr-worker")
+        self._pending = 0
+
+    @property
+    def pending(self):
+        """Number of submitted images that have not finished yet"""
+        return self._pending
+
+    async def stop(self):
+        self._executor.shutdown(wait=False)
+
+    def submit_nowait(self, image, thumbnails=False):
+        """
+        Queue one image without waiting
+
+        Args:
+            image (PIL.Image): Decoded image
+            thumbnails (bool): Encode stage image thumbnails
+
+        Returns:
+            asyncio.Future: Resolves to ``(final_text, stage_results, latency_s)``
+
+        Raises:
+            asyncio.QueueFull: When the service is saturated
+        """
+        if self._pending >= self.max_pending:
+            raise asyncio.QueueFull()
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._process, image, thumbnails,
+                                                          time.perf_counter())
+        self._pending += 1
+        future.add_done_callback(self._release)
+        return future
+
+    def _process(self, image, thumbnails, queued_at):
+        """Run the agent on one image in a worker thread (private)"""
+        start = time.perf_counter()
+        QUEUE_WAIT.observe(start - queued_at)
+        final_text, stage_results = self.agent.process_image_with_agent(image, compact=True, thumbnails=thumbnails)
+        latency = time.perf_counter() - start
+        PIPELINE_LATENCY.observe(latency)
+        return final_text, stage_results, latency
+
+    def _release(self, future):
+        self._pending -= 1
+
+
+def _build_agent():
+    """Load the agent once for the lifetime of the service"""
+    from vision_agent import VisionTextAgent
+    return VisionTextAgent()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.agent = _build_agent()
+    app.state.pool = InferencePool(
+        app.state.agent,
+        max_pending=int(os.getenv('OCR_MAX_PENDING', 64)),
+        workers=int(os.getenv('OCR_WORKERS', 4))
+    )
+    yield
+    await app.state.pool.stop()
+
+
+async def _read_images(request, field):
+    """
+    Decode images from a multipart form field or a raw request body (private)
+
+    Returns:
+        list: (name, PIL.Image or the decoding exception), empty payloads skipped
+    """
+    content_type = request.headers.get("content-type", "")
+    max_side = int(os.getenv('MAX_IMAGE_SIDE', 2048))
+    target_x_height = int(os.getenv('TARGET_X_HEIGHT', 32))
+
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        uploads = form.getlist(field)
+        payloads = [(upload.filename, await upload.read()) for upload in uploads]
+    else:
+        payloads = [(request.query_params.get("name", "image"), await request.body())]
+
+    # JPEG decoding and the text height estimate are CPU work; keep them off the event loop
+    loop = asyncio.get_running_loop()
+    payloads = [(name, data) for name, data in payloads if data]
+    images = await asyncio.gather(*(
+        loop.run_in_executor(None, partial(load_image, io.BytesIO(data), max_side=max_side,
+                                           target_x_height=target_x_height))
+        for _, data in payloads), return_exceptions=True)
+    return [(name, image) for (name, _), image in zip(payloads, images)]
+
+
+def _error_payload(name, error, stage):
+    return {"name": name, "error": f"{stage}: {str(error) or type(error).__name__}"}
+
+
+def _result_payload(name, final_text, result, latency, thumbnails=False):
+    return {
+        "name": name,
+        "text": final_text,
+        "latency_s": round(latency, 4),
+        "stages": result.to_dict(thumbnails=thumbnails)["stages"]
+    }
+
+
+async def _recognize(request, field):
+    """
+    Shared handler body for /ocr and /ocr/batch (private)
+
+    Returns:
+        JSONResponse for request-level errors, otherwise one payload per image;
+        an image that failed to decode or process gets an ``error`` entry
+    """
+    try:
+        images = await _read_images(request, field)
+    except Exception as e:
+        return JSONResponse({"error": f"Could not read request: {str(e)}"}, status_code=400)
+
+    if not images:
+        return JSONResponse({"error": "No image provided"}, status_code=400)
+
+    decoded = [(i, image) for i, (_, image) in enumerate(images) if not isinstance(image, Exception)]
+    pool = request.app.state.pool
+    if pool.pending + len(decoded) > pool.max_pending:
+        return JSONResponse({"error": "Service busy, retry later"}, status_code=503,
+                            headers={"Retry-After": "1"})
+
+    REQUEST_IMAGES.observe(len(images))
+    thumbnails = request.query_params.get("thumbnails", "0") in ("1", "true")
+    futures = {}
+    try:
+        for i, image in decoded:
+            futures[i] = pool.submit_nowait(image, thumbnails)
+    except asyncio.QueueFull:
+        for future in futures.values():
+            future.cancel()
+        return JSONResponse({"error": "Service busy, retry later"}, status_code=503,
+                            headers={"Retry-After": "1"})
+
+    outputs = dict(zip(futures, await asyncio.gather(*futures.values(), return_exceptions=True)))
+
+    results = []
+    for i, (name, image) in enumerate(images):
+        if isinstance(image, Exception):
+            results.append(_error_payload(name, image, "Could not decode image"))
+        elif isinstance(outputs[i], Exception):
+            results.append(_error_payload(name, outputs[i], "Recognition failed"))
+        else:
+            results.append(_result_payload(name, *outputs[i], thumbnails=thumbnails))
+    return results
+
+
+async def ocr(request):
+    start = time.perf_counter()
+    result = await _recognize(request, "file")
+    if isinstance(result, JSONResponse):
+        response = result
+    else:
+        error = result[0].get("error", "")
+        status_code = 400 if error.startswith("Could not decode") else 500 if error else 200
+        response = JSONResponse(result[0], status_code=status_code)
+    REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint="/ocr")
+    REQUESTS.inc(endpoint="/ocr", code=response.status_code)
+    return response
+
+
+async def ocr_batch(request):
+    start = time.perf_counter()
+    result = await _recognize(request, "files")
+    response = result if isinstance(result, JSONResponse) else JSONResponse({"results": result})
+    REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint="/ocr/batch")
+    REQUESTS.inc(endpoint="/ocr/batch", code=response.status_code)
+    return response
+
+
+async def health(request):
+    agent = request.app.state.agent
+    return JSONResponse({
+        "agent": agent.agent_name,
+        "version": agent.version,
+        "ready": agent.is_ready,
+        "pending": request.app.state.pool.pending
+    })
+
+
+async def metrics(request):
+    lines = []
+    for metric in (REQUEST_LATENCY, PIPELINE_LATENCY, QUEUE_WAIT, REQUEST_IMAGES, REQUESTS):
+        lines.extend(metric.render())
+    lines.append("# HELP visiontext_pending_images Images submitted and not finished yet")
+    lines.append("# TYPE visiontext_pending_images gauge")
+    lines.append(f"visiontext_pending_images {request.app.state.pool.pending}")
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+
+app = Starlette(
+    routes=[
+        Route("/ocr", ocr, methods=["POST"]),
+        Route("/ocr/batch", ocr_batch, methods=["POST"]),
+        Route("/health", health, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+    ],
+    lifespan=lifespan
+)
@@ -0,0 +1,520 @@
+"""
+Lexicon-backed spell correction
+===============================
+
+A symmetric-delete (SymSpell) index: every lexicon word is stored under all
+strings obtained by deleting up to ``max_edit`` characters from its first
+``prefix_length`` characters. A misspelling shares at least one of those
+deletes with each word within ``max_edit`` edits, so its candidates come
+from a handful of hash lookups instead of a scan of the lexicon. Candidates
+are then checked with a true (Damerau/OSA) edit distance, computed for all
+of them at once. Those within ``max_edit`` are ranked by a noisy-channel
+score: corpus frequency times ``exp(-SPELL_EDIT_PENALTY * cost)``, where the
+cost is the OCR-confusion-weighted distance of ``model/data/confusion.py``
+('rn' read for 'm' or '1' for 'l' costs far less than an arbitrary edit).
+
+The index is built once into a directory of ``.npy`` arrays and memory-mapped
+on load, so every process shares the same pages:
+
+- ``words.npy`` / ``offsets.npy`` / ``counts.npy``: UTF-8 word blob, word
+  boundaries and frequencies
+- ``bucket_ptr.npy`` / ``entry_hash.npy`` / ``entry_word.npy``: a hash table
+  in CSR layout; the entries of bucket ``b`` are
+  ``bucket_ptr[b]:bucket_ptr[b + 1]``, so a delete costs one bucket slice
+
+Lexicons are frequency lists (``word count`` per line) or plain text, whose
+words are counted. ``SPELL_LEXICON`` lists them (``os.pathsep``-separated);
+the index goes to ``SPELL_INDEX`` (default ~/.cache/visiontext/spell_index)
+and is rebuilt when a lexicon changes.
+
+Usage:
+    python spell_corrector.py build odia_words.txt english_words.txt
+    python spell_corrector.py            # benchmark on a synthetic lexicon
+"""
+
+import os
+import sys
+import json
+import hashlib
+import unicodedata
+import threading
+from dataclasses import dataclass
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model')
+DEFAULT_INDEX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "visiontext", "spell_index")
+INDEX_ARRAYS = ("words", "offsets", "lengths", "counts", "bucket_ptr", "entry_hash", "entry_word")
+
+
+# Digits OCR engines put inside words in place of look-alike letters
+DIGIT_CONFUSIONS = str.maketrans({"0": "o", "1": "l", "5": "s", "8": "b", "6": "b", "9": "g"})
+
+_correctors = {}
+_correctors_lock = threading.Lock()
+
+
+@dataclass(slots=True)
+class Suggestion:
+    term: str
+    distance: int
+    count: int
+    score: float = 0.0
+    cost: float = 0.0
+
+
+def _confusion():
+    """The model package's OCR confusion model, imported on first use (private)"""
+    if MODEL_DIR not in sys.path:
+        sys.path.append(MODEL_DIR)
+    from data import confusion
+    return confusion
+
+
+def _is_word_char(char):
+    # Letters, digits and combining marks (Odia/Devanagari vowel signs, virama, nukta)
+    return char.isalnum() or unicodedata.category(char)[0] == "M"
+
+
+def split_token(token):
+    """
+    Split a token into leading punctuation, core and trailing punctuation
+
+    Returns:
+        tuple: (lead, core, trail)
+    """
+    start, end = 0, len(token)
+    while start < end and not _is_word_char(token[start]):
+        start += 1
+    while end > start and not _is_word_char(token[end - 1]):
+        end -= 1
+    return token[:start], token[start:end], token[end:]
+
+
+def is_word(core):
+    """Whether a token core is a word the lexicon can correct (letters and marks only)"""
+    return bool(core) and core[0].isalpha() and all(c.isalpha() or unicodedata.category(c)[0] == "M"
+                                                    for c in core)
+
+
+def confusable(text):
+    """Characters or groups OCR commonly confuses with ``text`` ('rn' -> ['m']), cheapest first"""
+    return _confusion().default_costs().similar(text)
+
+
+def _hash(text):
+    """Stable 64-bit hash of a string, identical across processes (private)"""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def deletes(word, max_edit):
+    """
+    All strings obtained by deleting up to ``max_edit`` characters from ``word``
+
+    Returns:
+        set: The deletes, ``word`` itself included
+    """
+    found = {word}
+    frontier = {word}
+    for _ in range(max_edit):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))} - found
+        found |= frontier
+    return found
+
+
+def edit_distance(a, b, max_distance):
+    """
+    Optimal-string-alignment distance, or ``max_distance + 1`` once it is exceeded
+
+    Args:
+        a (str): First string
+        b (str): Second string
+        max_distance (int): Largest distance of interest
+
+    Returns:
+        int: Insertions, deletions, substitutions and adjacent transpositions
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+def osa_distances(word, terms):
+    """
+    OSA distances from one word to many terms at once
+
+    Bit-parallel (Myers/Hyyro, with transpositions): each term's DP column is
+    a pair of 64-bit masks and the terms advance together one character per
+    numpy step, so the cost is the longest term, not the number of terms.
+
+    Args:
+        word (str): Query word
+        terms (list): Candidate words
+
+    Returns:
+        numpy.ndarray: Distance per term
+    """
+    m = len(word)
+    lengths = np.fromiter((len(t) for t in terms), dtype=np.int64, count=len(terms))
+    if m == 0 or not terms:
+        return lengths
+    if m > 64:
+        return np.array([edit_distance(word, t, m + len(t)) for t in terms], dtype=np.int64)
+
+    width = max(int(lengths.max()), 1)
+    codes = np.array(terms, dtype=f"<U{width}").view(np.uint32).reshape(len(terms), width)
+    # Match mask of every term character against the query positions
+    peq = {}
+    for i, char in enumerate(word):
+        peq[ord(char)] = peq.get(ord(char), 0) | (1 << i)
+    keys = np.array(sorted(peq), dtype=np.uint32)
+    masks = np.array([peq[k] for k in keys.tolist()], dtype=np.uint64)
+    slots = np.minimum(np.searchsorted(keys, codes), len(keys) - 1)
+    eqs = np.where(keys[slots] == codes, masks[slots], np.uint64(0))
+
+    full, top, one = np.uint64((1 << m) - 1), np.uint64(1 << (m - 1)), np.uint64(1)
+    pv = np.full(len(terms), full)
+    mv, d0, previous_eq = (np.zeros(len(terms), dtype=np.uint64) for _ in range(3))
+    score = np.full(len(terms), m, dtype=np.int64)
+    for j in range(width):
+        active = j < lengths
+        eq = eqs[:, j]
+        transposed = ((~d0 & eq) << one) & previous_eq
+        d0_j = ((((eq & pv) + pv) ^ pv) | eq | mv | transposed) & full
+        hp = (mv | ~(d0_j | pv)) & full
+        hn = pv & d0_j
+        score += active * (((hp & top) != 0).astype(np.int64) - ((hn & top) != 0))
+        hp = ((hp << one) | one) & full
+        hn = (hn << one) & full
+        pv = np.where(active, (hn | ~(d0_j | hp)) & full, pv)
+        mv = np.where(active, hp & d0_j, mv)
+        d0 = np.where(active, d0_j, d0)
+        previous_eq = np.where(active, eq, previous_eq)
+    return score
+
+
+def read_lexicon(paths):
+    """
+    Count words of lexicon files
+
+    Lines of the form ``word count`` (tab or space separated) add ``count``;
+    any other line is treated as text and each word in it counts once.
+
+    Args:
+        paths (list): Lexicon files (UTF-8)
+
+    Returns:
+        Counter: word -> frequency (lower-cased)
+    """
+    counts = Counter()
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and parts[1].isdigit() and is_word(parts[0]):
+                    counts[parts[0].lower()] += int(parts[1])
+                    continue
+                for token in parts:
+                    core = split_token(token)[1]
+                    if is_word(core):
+                        counts[core.lower()] += 1
+    return counts
+
+
+def build_index(counts, index_dir, max_edit=2, prefix_length=7, sources=None):
+    """
+    Build the symmetric-delete index and save it as ``.npy`` arrays
+
+    Args:
+        counts (dict): word -> frequency
+        index_dir (str): Output directory
+        max_edit (int): Largest edit distance served by the index
+        prefix_length (int): Characters of each word whose deletes are indexed
+        sources (dict): Lexicon path -> mtime, recorded to detect stale indexes
+
+    Returns:
+        dict: Index metadata
+    """
+    words = sorted(counts, key=lambda w: (-counts[w], w))
+    encoded = [w.encode("utf-8") for w in words]
+    offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(e) for e in encoded])
+
+    hashes, owners = [], []
+    for word_id, word in enumerate(words):
+        for delete in deletes(word[:prefix_length], max_edit):
+            hashes.append(_hash(delete))
+            owners.append(word_id)
+    entry_hash = np.array(hashes, dtype=np.uint64)
+    entry_word = np.array(owners, dtype=np.int32)
+
+    # Power-of-two bucket count so the bucket is a mask of the hash
+    n_buckets = 1 << max(int(np.ceil(np.log2(max(len(set(hashes)), 1)))), 4)
+    buckets = entry_hash & np.uint64(n_buckets - 1)
+    order = np.lexsort((entry_word, entry_hash, buckets))
+    entry_hash, entry_word = entry_hash[order], entry_word[order]
+    bucket_ptr = np.zeros(n_buckets + 1, dtype=np.int64)
+    bucket_ptr[1:] = np.cumsum(np.bincount(buckets[order].astype(np.int64), minlength=n_buckets))
+
+    os.makedirs(index_dir, exist_ok=True)
+    arrays = {
+        "words": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "offsets": offsets,
+        "lengths": np.array([len(w) for w in words], dtype=np.int16),
+        "counts": np.array([counts[w] for w in words], dtype=np.int64),
+        "bucket_ptr": bucket_ptr,
+        "entry_hash": entry_hash,
+        "entry_word": entry_word,
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(index_dir, f"{name}.npy"), array)
+    meta = {"max_edit": max_edit, "prefix_length": prefix_length, "n_buckets": n_buckets,
+            "n_words": len(words), "n_entries": len(entry_hash),
+            "total_count": int(arrays["counts"].sum()), "sources": sources or {}}
+    with open(os.path.join(index_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class SpellCorrector:
+    def __init__(self, index_dir, cache_size=65536, edit_penalty=None, max_suggestions=10):
+        """
+        Memory-map a symmetric-delete index built by ``build_index``
+
+        Args:
+            index_dir (str): Directory with the index arrays and meta.json
+            cache_size (int): Distinct words whose suggestions are memoized
+            edit_penalty (float): Log-frequency traded for one unit of weighted
+                edit cost (defaults to SPELL_EDIT_PENALTY or 8)
+            max_suggestions (int): Suggestions returned per word
+        """
+        with open(os.path.join(index_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.index_dir = index_dir
+        self.max_edit = self.meta["max_edit"]
+        self.prefix_length = self.meta["prefix_length"]
+        self._mask = np.uint64(self.meta["n_buckets"] - 1)
+        self._costs = None
+        self.max_suggestions = max_suggestions
+        self.edit_penalty = float(edit_penalty or os.getenv('SPELL_EDIT_PENALTY', 8))
+        for name in INDEX_ARRAYS:
+            # Plain ndarray views of the maps: same pages, without memmap's per-slice overhead
+            array = np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r")
+            setattr(self, f"_{name}", array.view(np.ndarray))
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def __len__(self):
+        return self.meta["n_words"]
+
+    def _word(self, word_id):
+        return bytes(self._words[self._offsets[word_id]:self._offsets[word_id + 1]]).decode("utf-8")
+
+    def _candidates(self, keys):
+        """Word ids stored under any of the given delete strings (private)"""
+        hashes = np.fromiter((_hash(k) for k in keys), dtype=np.uint64, count=len(keys))
+        buckets = (hashes & self._mask).astype(np.int64)
+        starts, ends = self._bucket_ptr[buckets], self._bucket_ptr[buckets + 1]
+        lengths = ends - starts
+        if not lengths.sum():
+            return np.empty(0, dtype=np.int32)
+        # Flat positions of every entry in the touched buckets, without a Python loop
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        matches = self._entry_hash[positions] == np.repeat(hashes, lengths)
+        return np.unique(self._entry_word[positions[matches]])
+
+    def _lookup(self, word, max_edit=None):
+        """
+        Ranked corrections of one lower-cased word (memoized as ``lookup``)
+
+        Args:
+            word (str): Word to correct
+            max_edit (int): Largest edit distance (at most the index's ``max_edit``)
+
+        Returns:
+            list: Up to ``max_suggestions`` suggestions within ``max_edit``,
+            best first, with ``score`` their share of the noisy-channel weight
+            and ``cost`` the confusion-weighted distance; just the word itself
+            when it is in the lexicon
+        """
+        max_edit = self.max_edit if max_edit is None else min(max_edit, self.max_edit)
+        ids = self._candidates(list(deletes(word[:self.prefix_length], max_edit)))
+        ids = ids[np.abs(self._lengths[ids].astype(np.int64) - len(word)) <= max_edit]
+        if not len(ids):
+            return []
+        terms = [self._word(word_id) for word_id in ids.tolist()]
+        if word in terms:
+            return [Suggestion(word, 0, int(self._counts[ids[terms.index(word)]]), 1.0)]
+
+        distances = osa_distances(word, terms)
+        keep = np.flatnonzero(distances <= max_edit)
+        if not len(keep):
+            return []
+        terms = [terms[i] for i in keep.tolist()]
+        confusion = _confusion()
+        if self._costs is None:
+            # Misspellings also swap neighbours, so transpositions count as one edit here
+            self._costs = confusion.ConfusionCosts(transposition=1.0)
+        costs = confusion.weighted_distances([word] * len(terms), terms, self._costs)
+        counts = self._counts[ids[keep]].astype(np.float64)
+        # log(count) - penalty * cost, normalized with a softmax to stay finite for rare words
+        logits = np.log(np.maximum(counts, 1)) - self.edit_penalty * costs
+        weights = np.exp(logits - logits.max())
+        scores = weights / weights.sum()
+
+        distances = distances[keep]
+        best = np.lexsort((costs, -scores))[:self.max_suggestions]
+        return [Suggestion(terms[i], int(distances[i]), int(counts[i]), round(float(scores[i]), 3),
+                           round(float(costs[i]), 2)) for i in best.tolist()]
+
+    def correct_word(self, token):
+        """
+        Correct one whitespace-delimited token, keeping its punctuation and case
+
+        Tokens without letters (numbers, punctuation) are left alone.
+
+        Args:
+            token (str): Token as recognized
+
+        Returns:
+            tuple: (corrected token, suggestions, best first; empty when the
+            token was not checked or nothing is close enough)
+        """
+        lead, core, trail = split_token(token)
+        if not is_word(core):
+            # 'he1lo' -> 'hello': letters with look-alike digits are checked as letters
+            mapped = core.translate(DIGIT_CONFUSIONS)
+            if mapped == core or not any(c.isalpha() for c in core) or not is_word(mapped):
+                return token, []
+            core = mapped
+        suggestions = self.lookup(core.lower())
+        if not suggestions:
+            return token, []
+        term = suggestions[0].term
+        if core.isupper() and len(core) > 1:
+            term = term.upper()
+        elif core[:1].isupper():
+            term = term[:1].upper() + term[1:]
+        return lead + term + trail, suggestions
+
+    def correct(self, text):
+        """
+        Correct every word of a text
+
+        Returns:
+            tuple: (corrected text, [(token, corrected token, suggestions)])
+        """
+        results = [(token, *self.correct_word(token)) for token in text.split()]
+        return " ".join(corrected for _, corrected, _ in results), results
+
+    def stats(self):
+        info = self.lookup.cache_info()
+        return {"words": len(self), "entries": self.meta["n_entries"], "max_edit": self.max_edit,
+                "cached_words": info.currsize, "cache_hits": info.hits, "cache_misses": info.misses}
+
+
+def _lexicon_paths():
+    return [path for path in os.getenv('SPELL_LEXICON', '').split(os.pathsep) if path]
+
+
+def _index_is_current(index_dir, sources):
+    try:
+        with open(os.path.join(index_dir, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return not sources or meta.get("sources") == sources
+
+
+def get_spell_corrector(index_dir=None):
+    """
+    Get the process-wide corrector, building its index from SPELL_LEXICON if needed
+
+    Args:
+        index_dir (str): Index directory (defaults to SPELL_INDEX or the cache location)
+
+    Returns:
+        SpellCorrector or None: None when there is neither an index nor a lexicon
+    """
+    index_dir = index_dir or os.getenv('SPELL_INDEX') or DEFAULT_INDEX_DIR
+    with _correctors_lock:
+        if index_dir not in _correctors:
+            paths = _lexicon_paths()
+            sources = {os.path.abspath(p): os.path.getmtime(p) for p in paths if os.path.exists(p)}
+            if sources and not _index_is_current(index_dir, sources):
+                build_index(read_lexicon(list(sources)), index_dir,
+                            max_edit=int(os.getenv('SPELL_MAX_EDIT', 2)),
+                            prefix_length=int(os.getenv('SPELL_PREFIX_LENGTH', 7)), sources=sources)
+            _correctors[index_dir] = (SpellCorrector(index_dir)
+                                      if os.path.exists(os.path.join(index_dir, "meta.json")) else None)
+        return _correctors[index_dir]
+
+
+if __name__ == "__main__":
+    import time
+    import random
+    import tempfile
+
+    if len(sys.argv) > 2 and sys.argv[1] == "build":
+        paths = sys.argv[2:]
+        index_dir = os.getenv('SPELL_INDEX') or DEFAULT_INDEX_DIR
+        start = time.perf_counter()
+        meta = build_index(read_lexicon(paths), index_dir,
+                           max_edit=int(os.getenv('SPELL_MAX_EDIT', 2)),
+                           prefix_length=int(os.getenv('SPELL_PREFIX_LENGTH', 7)),
+                           sources={os.path.abspath(p): os.path.getmtime(p) for p in paths})
+        print(f"{meta['n_words']} words, {meta['n_entries']} deletes -> {index_dir} "
+              f"in {time.perf_counter() - start:.1f}s")
+        sys.exit(0)
+
+    # Benchmark on a synthetic lexicon with Zipf frequencies and OCR-like typos
+    random.seed(0)
+    alphabets = ("abcdefghijklmnopqrstuvwxyz", "".join(chr(c) for c in range(0x0B15, 0x0B39)) + "ାିୀୁୂେୈୋୌ୍")
+    vocabulary = {"".join(random.choice(alphabet) for _ in range(random.randint(3, 10)))
+                  for alphabet in alphabets for _ in range(25000)}
+    counts = {word: int(1e6 / rank) + 1 for rank, word in enumerate(sorted(vocabulary), 1)}
+
+    def typo(word):
+        i = random.randrange(len(word))
+        return random.choice((word[:i] + word[i + 1:], word[:i] + random.choice(word) + word[i + 1:],
+                              word[:i] + word[i:i + 2][::-1] + word[i + 2:]))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        meta = build_index(counts, tmp)
+        print(f"Index: {meta['n_words']} words, {meta['n_entries']} deletes, "
+              f"built in {time.perf_counter() - start:.1f}s")
+        corrector = SpellCorrector(tmp)
+        words = random.sample(sorted(vocabulary), 2000)
+        queries = [typo(w) if random.random() < 0.5 else w for w in words]
+
+        start = time.perf_counter()
+        results = [corrector._lookup(q) for q in queries]
+        elapsed = time.perf_counter() - start
+        recovered = sum(bool(r) and r[0].term == w for r, w in zip(results, words))
+        print(f"{len(queries) / elapsed:.0f} words/s uncached, top-1 matches the intended word "
+              f"for {recovered / len(words):.1%}")
+
+        for q in queries:
+            corrector.lookup(q)
+        start = time.perf_counter()
+        for q in queries:
+            corrector.lookup(q)
+        print(f"{len(queries) / (time.perf_counter() - start):.0f} words/s for repeated words (memoized)")
@@ -0,0 +1,286 @@
+"""
+Compact, serializable stage results
+===================================
+
+``process_image_with_agent`` builds rich nested dicts holding full PIL images
+and duplicates every stage under legacy keys. This module provides a slim
+alternative: a small ``__slots__`` dataclass tree where images are kept as
+content-addressed references with an optional thumbnail, each stage is
+stored exactly once and per-item detail lists (characters, words, ...) are
+capped at ``DETAIL_ITEMS`` entries. It converts to plain dicts, JSON and (if installed)
+msgpack for storage and transport.
+"""
+
+import io
+import json
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+THUMBNAIL_SIZE = (256, 256)
+DETAIL_ITEMS = 20
+
+
+def _plain(value):
+    """Convert numpy scalars and other leftovers into JSON-friendly values"""
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def _summarize(details, max_items):
+    """
+    Cap the lists in a (plain) details dict at ``max_items`` entries
+
+    Every capped list is recorded as ``{key: total_length}`` under the
+    ``truncated`` key of the dict that held it.
+    """
+    summary, truncated = {}, {}
+    for key, value in details.items():
+        if isinstance(value, dict):
+            value = _summarize(value, max_items)
+        elif isinstance(value, list) and len(value) > max_items:
+            truncated[key] = len(value)
+            value = value[:max_items]
+        summary[key] = value
+    if truncated:
+        summary["truncated"] = truncated
+    return summary
+
+
+class ImageStore:
+    """Thread-safe LRU store that keeps full images addressable by key"""
+
+    def __init__(self, max_items=32):
+        self.max_items = max_items
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key, image):
+        with self._lock:
+            self._images[key] = image
+            self._images.move_to_end(key)
+            while len(self._images) > self.max_items:
+                self._images.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+            return image
+
+
+@dataclass(slots=True)
+class ImageRef:
+    """Reference to an image: content key, size and an optional JPEG thumbnail"""
+
+    key: str
+    width: int
+    height: int
+    thumbnail: Optional[bytes] = None
+
+    @classmethod
+    def from_image(cls, image, thumbnail=True, store=None):
+        """
+        Build a reference for a PIL image
+
+        Args:
+            image (PIL.Image): Image to reference
+            thumbnail (bool): Embed a small JPEG thumbnail
+            store (ImageStore): Optional store that keeps the full image
+
+        Returns:
+            ImageRef: Reference to the image
+        """
+        digest = hashlib.sha1(f"{image.mode}{image.size}".encode())
+        digest.update(image.tobytes())
+        key = digest.hexdigest()[:16]
+        if store is not None:
+            store.put(key, image)
+
+        data = None
+        if thumbnail:
+            small = image.copy()
+            small.thumbnail(THUMBNAIL_SIZE)
+            if small.mode not in ("RGB", "L"):
+                small = small.convert("RGB")
+
+            buffer = io.BytesIO()
+            small.save(buffer, format="JPEG", quality=80)
+            data = buffer.getvalue()
+
+        return cls(key=key, width=image.size[0], height=image.size[1], thumbnail=data)
+
+    def to_image(self, store=None):
+        """Return the full image from ``store`` if present, else the thumbnail"""
+        if store is not None:
+            image = store.get(self.key)
+            if image is not None:
+                return image
+        if self.thumbnail is None:
+            return None
+        from PIL import Image
+        return Image.open(io.BytesIO(self.thumbnail))
+
+
+@dataclass(slots=True)
+class StageResult:
+    """One pipeline stage: description, status, details and optional outputs"""
+
+    number: int
+    name: str
+    input: str
+    output: str
+    status: str
+    details: dict = field(default_factory=dict)
+    result_text: Optional[str] = None
+    result_image: Optional[ImageRef] = None
+
+
+@dataclass(slots=True)
+class AgentResult:
+    """Compact result of one ``process_image_with_agent`` run"""
+
+    final_text: str
+    stages: list = field(default_factory=list)
+
+    @classmethod
+    def from_stage_results(cls, final_text, stage_results, thumbnails=True, store=None, detail_items=DETAIL_ITEMS):
+        """
+        Build a compact result from the agent's full ``stage_results`` dict
+
+        Only the ``stage_N`` entries are kept; ``result_data`` is dropped
+        because the same values are already merged into ``details``.
+
+        Args:
+            final_text (str): Final recognized text
+            stage_results (dict): Stage results from ``process_image_with_agent``
+            thumbnails (bool): Embed JPEG thumbnails of stage images
+            store (ImageStore): Optional store that keeps full stage images
+            detail_items (int): Longest list kept in ``details`` (None keeps all)
+
+        Returns:
+            AgentResult: Compact result
+        """
+        stages = []
+        for number in range(1, 7):
+            stage = stage_results.get(f"stage_{number}")
+            if not stage:
+                continue
+
+            image = stage.get("result_image")
+            details = _plain(stage.get("details", {}))
+            if detail_items is not None:
+                details = _summarize(details, detail_items)
+            stages.append(StageResult(
+                number=number,
+                name=stage.get("name", ""),
+                input=stage.get("input", ""),
+                output=stage.get("output", ""),
+                status=stage.get("status", ""),
+                details=details,
+                result_text=stage.get("result_text"),
+                result_image=ImageRef.from_image(image, thumbnail=thumbnails, store=store) if image is not None else None
+            ))
+
+        return cls(final_text=final_text, stages=stages)
+
+    def stage(self, number):
+        """Get a stage by its number (1-6), or None"""
+        for stage in self.stages:
+            if stage.number == number:
+                return stage
+        return None
+
+    def to_dict(self, binary=False, thumbnails=True):
+        """
+        Convert to plain containers
+
+        Args:
+            binary (bool): Keep thumbnails as bytes (msgpack) instead of base64 text (JSON)
+            thumbnails (bool): Include thumbnail data (references are always kept)
+
+        Returns:
+            dict: ``{"final_text": ..., "stages": [...]}``
+        """
+        stages = []
+        for stage in self.stages:
+            image = None
+            if stage.result_image is not None:
+                ref = stage.result_image
+                thumbnail = ref.thumbnail if thumbnails else None
+                if thumbnail is not None and not binary:
+                    thumbnail = base64.b64encode(thumbnail).decode("ascii")
+                image = {"key": ref.key, "width": ref.width, "height": ref.height, "thumbnail": thumbnail}
+
+            stages.append({
+                "number": stage.number,
+                "name": stage.name,
+                "input": stage.input,
+                "output": stage.output,
+                "status": stage.status,
+                "details": stage.details,
+                "result_text": stage.result_text,
+                "result_image": image
+            })
+        return {"final_text": self.final_text, "stages": stages}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild from ``to_dict`` output (base64 or raw thumbnails)"""
+        stages = []
+        for stage in data.get("stages", []):
+            image = stage.get("result_image")
+            ref = None
+            if image:
+                thumbnail = image.get("thumbnail")
+                if isinstance(thumbnail, str):
+                    thumbnail = base64.b64decode(thumbnail)
+                ref = ImageRef(key=image["key"], width=image["width"], height=image["height"], thumbnail=thumbnail)
+            stages.append(StageResult(
+                number=stage["number"],
+                name=stage["name"],
+                input=stage["input"],
+                output=stage["output"],
+                status=stage["status"],
+                details=stage.get("details", {}),
+                result_text=stage.get("result_text"),
+                result_image=ref
+            ))
+        return cls(final_text=data.get("final_text", ""), stages=stages)
+
+    def to_json(self):
+        """Serialize to a compact JSON string"""
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    def to_msgpack(self):
+        """Serialize to msgpack bytes (requires the ``msgpack`` package)"""
+        if msgpack is None:
+            raise ImportError("msgpack is not installed; use to_json() or pip install msgpack")
+        return msgpack.packb(self.to_dict(binary=True), use_bin_type=True)
+
+    @classmethod
+    def from_msgpack(cls, data):
+        if msgpack is None:
+            raise ImportError("msgpack is not installed; use from_json() or pip install msgpack")
+        return cls.from_dict(msgpack.unpackb(data, raw=False))
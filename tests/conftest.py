@@ -0,0 +1,9 @@
+import os
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Top-level modules import each other by name; the model package imports data.* from model/
+for path in (root, os.path.join(root, "model")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+import numpy as np
+
+from data.confusion import ConfusionCosts, default_costs, weighted_distance, weighted_distances
+
+
+def reference_distance(a, b, costs):
+    """Cell-by-cell DP with the same operations as the vectorised batch"""
+    def indel(char):
+        return costs.indel.get(char, costs.default)
+
+    def substitute(x, y):
+        return 0.0 if x == y else costs.substitution.get((x, y), costs.default)
+
+    d = np.zeros((len(a) + 1, len(b) + 1))
+    d[1:, 0] = np.cumsum([indel(x) for x in a])
+    d[0, 1:] = np.cumsum([indel(y) for y in b])
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            options = [d[i - 1, j] + indel(a[i - 1]), d[i, j - 1] + indel(b[j - 1]),
+                       d[i - 1, j - 1] + substitute(a[i - 1], b[j - 1])]
+            if i > 1 and (a[i - 2:i], b[j - 1]) in costs.groups:
+                options.append(d[i - 2, j - 1] + costs.groups[(a[i - 2:i], b[j - 1])])
+            if j > 1 and (a[i - 1], b[j - 2:j]) in costs.groups:
+                options.append(d[i - 1, j - 2] + costs.groups[(a[i - 1], b[j - 2:j])])
+            if (costs.transposition is not None and i > 1 and j > 1 and a[i - 2] == b[j - 1]
+                    and a[i - 1] == b[j - 2] and a[i - 2] != a[i - 1]):
+                options.append(d[i - 2, j - 2] + costs.transposition)
+            d[i, j] = min(options)
+    return d[-1, -1]
+
+
+def noisy_pairs(count, alphabet, seed=0):
+    rng = random.Random(seed)
+    pairs = []
+    for _ in range(count):
+        truth = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+        chars = list(truth)
+        for _ in range(rng.randint(0, 4)):
+            k = rng.randrange(len(chars) + 1)
+            chars[k:k + 1] = rng.choice(([], [rng.choice(alphabet)], list("rn"), list("cl")))
+        pairs.append(("".join(chars), truth))
+    return pairs
+
+
+class TestConfusion(unittest.TestCase):
+    """
+    Tests for the confusion-weighted edit distance
+    """
+    def test_uniform_costs_are_levenshtein(self):
+        uniform = ConfusionCosts(confusions=(), noise_costs={})
+        pairs = noisy_pairs(300, "abcmnrdl.,01")
+        expected = [reference_distance(a, b, uniform) for a, b in pairs]
+        np.testing.assert_allclose(weighted_distances(*zip(*pairs), uniform), expected)
+        self.assertEqual(weighted_distance("kitten", "sitting", uniform), 3.0)
+
+    def test_matches_reference_dp(self):
+        pairs = noisy_pairs(300, "abcmnrdlo01IS5.,", seed=1)
+        for costs in (default_costs(), ConfusionCosts(transposition=1.0)):
+            expected = [reference_distance(a, b, costs) for a, b in pairs]
+            np.testing.assert_allclose(weighted_distances(*zip(*pairs), costs, batch_size=37), expected)
+
+    def test_confusions_are_cheap(self):
+        self.assertAlmostEqual(weighted_distance("rnodern", "modern"), 0.3)
+        self.assertAlmostEqual(weighted_distance("c1ear", "clear"), 0.3)
+        self.assertAlmostEqual(weighted_distance("5ign.", "Sign"), 0.8)
+        self.assertAlmostEqual(weighted_distance("bold", "hold"), 1.0)
+        self.assertAlmostEqual(weighted_distance("m", "rn"), 0.3)
+
+    def test_edge_cases(self):
+        self.assertEqual(weighted_distance("", ""), 0.0)
+        self.assertEqual(weighted_distance("", "ab"), 2.0)
+        self.assertEqual(weighted_distance(".,", ""), 1.0)
+        self.assertEqual(weighted_distances([], []).tolist(), [])
+        with self.assertRaises(ValueError):
+            weighted_distances(["a"], [])
+
+    def test_transpositions(self):
+        self.assertEqual(weighted_distance("hlelo", "hello"), 2.0)
+        self.assertEqual(weighted_distance("hlelo", "hello", ConfusionCosts(transposition=1.0)), 1.0)
+
+    def test_similar(self):
+        costs = default_costs()
+        self.assertEqual(costs.similar("rn"), ["m"])
+        self.assertEqual(costs.similar("m"), ["rn", "nn"])
+        self.assertIn("0", costs.similar("o"))
+        with self.assertRaises(ValueError):
+            ConfusionCosts(confusions=(("abc", "d", 0.5),))
+
+
+if __name__ == '__main__':
+    unittest.main()
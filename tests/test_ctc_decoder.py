@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+import os
+import itertools
+import tempfile
+import unittest
+
+import numpy as np
+
+from ctc_decoder import ArpaLM, CTCBeamDecoder, LexiconTrie
+
+
+def posteriors(frames, chars, sharp=0.9):
+    """(T, C) posteriors where each frame favours one symbol ('_' is the blank)"""
+    columns = list(chars) + ["_"]
+    rest = (1.0 - sharp) / (len(columns) - 1)
+    matrix = np.full((len(frames), len(columns)), rest)
+    for t, symbol in enumerate(frames):
+        matrix[t, columns.index(symbol)] = sharp
+    return matrix
+
+
+def brute_force(matrix, chars):
+    """Exact log probability of every labelling, summing all CTC alignments"""
+    blank = matrix.shape[1] - 1
+    totals = {}
+    for path in itertools.product(range(matrix.shape[1]), repeat=len(matrix)):
+        label = tuple(k for k, _ in itertools.groupby(path) if k != blank)
+        prob = np.prod(matrix[np.arange(len(matrix)), path])
+        totals[label] = totals.get(label, 0.0) + prob
+    best = max(totals, key=totals.get)
+    return "".join(chars[k] for k in best), float(np.log(totals[best]))
+
+
+ARPA = """\\data\\
+ngram 1=5
+ngram 2=4
+
+\\1-grams:
+-0.7 </s>
+-99 <s> -0.3
+-0.7 a -0.3
+-0.7 c -0.3
+-0.7 t -0.3
+
+\\2-grams:
+-0.05 <s> c
+-0.05 c a
+-0.05 a t
+-0.05 t </s>
+
+\\end\\
+"""
+
+
+class TestCTCDecoder(unittest.TestCase):
+    """
+    Tests for the CTC prefix beam search
+    """
+    def test_collapses_repeats_and_blanks(self):
+        chars = "ehlo"
+        decoder = CTCBeamDecoder(chars)
+        text, _ = decoder.decode(posteriors("hhe_ll_lloo_", chars))
+        self.assertEqual(text, "hello")
+        self.assertEqual(decoder.decode(posteriors("____", chars))[0], "")
+
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        chars = "ab"
+        decoder = CTCBeamDecoder(chars, beam_width=64, prune=1e-12)
+        for _ in range(20):
+            matrix = rng.dirichlet(np.ones(3) * 0.7, size=5)
+            text, score = decoder.decode(matrix)
+            expected_text, expected_score = brute_force(matrix, chars)
+            self.assertEqual(text, expected_text)
+            self.assertAlmostEqual(score, expected_score, places=6)
+
+    def test_log_posteriors(self):
+        chars = "ehlo"
+        matrix = posteriors("hhe_ll_lloo_", chars)
+        plain = CTCBeamDecoder(chars).decode(matrix)
+        logged = CTCBeamDecoder(chars, log_probs=True).decode(np.log(matrix))
+        self.assertEqual(plain[0], logged[0])
+        self.assertAlmostEqual(plain[1], logged[1])
+
+    def test_lexicon_constrains_words(self):
+        chars = "acot "
+        matrix = posteriors("c_o_t", chars, sharp=0.6)
+        # 'a' is a close second where the network read 'o'
+        matrix[2, chars.index("a")] = 0.35
+        self.assertEqual(CTCBeamDecoder(chars).decode(matrix)[0], "cot")
+
+        lexicon = LexiconTrie(["cat", "act"], chars)
+        self.assertEqual(CTCBeamDecoder(chars, lexicon=lexicon).decode(matrix)[0], "cat")
+
+    def test_language_model_rescores(self):
+        chars = "act"
+        # The network prefers "cta", with "a" and "t" close seconds
+        matrix = posteriors("c_t_a", chars, sharp=0.5)
+        matrix[2, chars.index("a")] = 0.4
+        matrix[4, chars.index("t")] = 0.4
+        self.assertEqual(CTCBeamDecoder(chars).decode(matrix)[0], "cta")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "lm.arpa")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(ARPA)
+            lm = ArpaLM(path, chars)
+
+        self.assertEqual(lm.order, 2)
+        self.assertEqual(lm.next_log_probs((lm.bos,))[lm.bos], -np.inf)
+        self.assertAlmostEqual(lm.next_log_probs((chars.index("c"),))[chars.index("a")], -0.05 * np.log(10))
+
+        self.assertEqual(CTCBeamDecoder(chars, lm=lm, alpha=1.0, beta=0.0).decode(matrix)[0], "cat")
+
+    def test_decode_batches(self):
+        chars = "ehlo"
+        lines = [posteriors(frames, chars) for frames in ("he_llo", "oh_", "l_l", "____")]
+        decoder = CTCBeamDecoder(chars)
+        sequential = decoder.decode_batch(lines)
+        self.assertEqual([text for text, _ in sequential], ["helo", "oh", "ll", ""])
+        self.assertEqual(decoder.decode_batch(lines, processes=2), sequential)
+        self.assertEqual(list(decoder.decode_batches([lines[:2], lines[2:]], processes=2)), sequential)
+
+
+if __name__ == '__main__':
+    unittest.main()
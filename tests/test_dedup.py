@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import io
+import random
+import threading
+import unittest
+from unittest import mock
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import vision_agent
+from dedup import BKTree, DedupCache, hamming
+
+
+def scan(seed):
+    """A page of random dark strokes, as a PIL image"""
+    rng = np.random.default_rng(seed)
+    page = np.full((300, 400), 240, dtype=np.uint8)
+    for _ in range(40):
+        x, y = rng.integers(10, 390), rng.integers(10, 290)
+        cv2.line(page, (int(x), int(y)), (int(x + rng.integers(-40, 40)), int(y + rng.integers(-20, 20))), 20, 3)
+    return Image.fromarray(page)
+
+
+def rephotographed(image):
+    """Slightly rescaled, brighter and JPEG-compressed copy"""
+    image = image.resize((image.size[0] * 9 // 10, image.size[1] * 9 // 10)).point(lambda v: min(v + 10, 255))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=70)
+    return Image.open(buffer)
+
+
+class TestDedup(unittest.TestCase):
+    """
+    Tests for the near-duplicate cache and its use by the agent
+    """
+    def test_bk_tree_matches_linear_scan(self):
+        rng = random.Random(0)
+        keys = [rng.getrandbits(64) for _ in range(500)]
+        tree = BKTree()
+        for i, key in enumerate(keys):
+            tree.add(key, i)
+        query = keys[7] ^ 0b1011
+        found = {payload for _, _, payload in tree.search(query, 12)}
+        self.assertEqual(found, {i for i, key in enumerate(keys) if hamming(query, key) <= 12})
+        self.assertIn(7, found)
+
+    def test_near_duplicate_hit(self):
+        cache = DedupCache(max_items=16)
+        page = scan(1)
+        cache.add(cache.hashes(page), "page one", "gemini:image")
+
+        result, distance = cache.lookup(cache.hashes(rephotographed(page)), "gemini:image")
+        self.assertEqual(result, "page one")
+        self.assertLessEqual(distance, cache.threshold)
+        self.assertEqual(cache.lookup(cache.hashes(scan(2)), "gemini:image"), (None, None))
+
+    def test_namespaces_are_separate(self):
+        cache = DedupCache(max_items=16)
+        page = scan(1)
+        cache.add(cache.hashes(page), "remote text", "gemini:image")
+        self.assertEqual(cache.lookup(cache.hashes(page), "char_cnn:image"), (None, None))
+
+    def test_eviction_keeps_newest(self):
+        cache = DedupCache(max_items=4)
+        pages = [scan(seed) for seed in range(6)]
+        for i, page in enumerate(pages):
+            cache.add(cache.hashes(page), i)
+        self.assertLessEqual(cache.stats()["entries"], 4)
+        self.assertEqual(cache.lookup(cache.hashes(pages[-1]))[0], 5)
+        self.assertEqual(cache.lookup(cache.hashes(pages[0])), (None, None))
+
+
+class TestAgentDedup(unittest.TestCase):
+    """
+    The agent reports which engine answered and does not cache fallback answers
+    """
+    def setUp(self):
+        self.agent = vision_agent.VisionTextAgent.__new__(vision_agent.VisionTextAgent)
+        self.agent.recognizer = "gemini"
+        self.agent.recognition_mode = "image"
+        self.agent._engine_models = ["test-model"]
+        self.agent._thread_state = threading.local()
+        self.agent._hedge_recognizer = lambda: None
+        self.cache = DedupCache(max_items=16)
+        self.patches = [mock.patch.object(vision_agent, "get_dedup_cache", return_value=self.cache),
+                        mock.patch.object(vision_agent, "dedup_enabled", return_value=True)]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def test_fallback_is_reported_and_not_cached(self):
+        def open_breaker(name, fn, *args, fallback=None, **kwargs):
+            return fallback(*args)
+
+        with mock.patch.object(vision_agent, "guarded_call", open_breaker), \
+                mock.patch.object(vision_agent, "predict_multiple_words", return_value="tesseract text"):
+            text, details = self.agent._recognize_deduplicated(scan(1))
+
+        self.assertEqual(text, "tesseract text")
+        self.assertEqual(details["backend"], "tesseract")
+        self.assertTrue(details["fallback"])
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_remote_answer_is_cached(self):
+        def remote(name, fn, *args, fallback=None, **kwargs):
+            return fn(*args)
+
+        self.agent._generate_recognition = lambda image: "gemini text"
+        with mock.patch.object(vision_agent, "guarded_call", remote):
+            text, details = self.agent._recognize_deduplicated(scan(1))
+            again, hit = self.agent._recognize_deduplicated(rephotographed(scan(1)))
+
+        self.assertEqual(details["backend"], "gemini")
+        self.assertFalse(details["fallback"])
+        self.assertEqual(again, "gemini text")
+        self.assertTrue(hit["dedup"]["hit"])
+        self.assertEqual(self.cache.stats()["remote_calls_avoided"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
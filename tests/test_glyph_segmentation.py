@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import cv2
+import numpy as np
+
+from glyph_segmentation import normalize_glyphs, segment_glyphs, segment_line, segment_page
+
+
+def glyph(gray, x, y, width, height=30):
+    """A block "glyph" with a hole, so it is not just a rectangle"""
+    cv2.rectangle(gray, (x, y), (x + width - 1, y + height - 1), 30, -1)
+    cv2.rectangle(gray, (x + width // 3, y + height // 3), (x + 2 * width // 3, y + 2 * height // 3), 245, -1)
+
+
+def line_image(widths=(10, 14, 18, 12), gap=6):
+    """One line of glyphs of the given widths, left to right"""
+    gray = np.full((50, 40 + sum(widths) + gap * len(widths)), 245, dtype=np.uint8)
+    x = 20
+    for width in widths:
+        glyph(gray, x, 10, width)
+        x += width + gap
+    return gray
+
+
+def page(lines=((3, 2), (1, 4))):
+    """
+    Page with one row of words per line; each number is the glyph count of a
+    word. Glyph k of a word is 10 + 2k px wide, glyphs 6 px apart, words 40 px apart.
+    """
+    gray = np.full((300, 500), 245, dtype=np.uint8)
+    for row, words in enumerate(lines):
+        y, x = 50 + row * 100, 30
+        for count in words:
+            for k in range(count):
+                glyph(gray, x, y, 10 + 2 * k)
+                x += 10 + 2 * k + 6
+            x += 40 - 6
+    return gray
+
+
+class TestGlyphSegmentation(unittest.TestCase):
+    """
+    Tests for line and glyph segmentation
+    """
+    def test_line_glyphs_left_to_right(self):
+        widths = (10, 14, 18, 12)
+        boxes = segment_line(line_image(widths))
+        self.assertEqual(len(boxes), 4)
+        self.assertEqual(boxes[:, 0].tolist(), sorted(boxes[:, 0].tolist()))
+        self.assertEqual((boxes[:, 2] - boxes[:, 0]).tolist(), list(widths))
+        self.assertTrue((boxes[:, 1] == 10).all() and (boxes[:, 3] == 40).all())
+
+    def test_marks_stay_with_their_glyph(self):
+        """
+        A mark above the base glyph shares its columns, so it extends the box instead of adding one.
+        """
+        gray = line_image((12, 12))
+        cv2.rectangle(gray, (22, 2), (29, 6), 30, -1)
+        boxes = segment_line(gray)
+        self.assertEqual(len(boxes), 2)
+        self.assertEqual(boxes[0, 1], 2)
+        self.assertEqual(boxes[1, 1], 10)
+
+    def test_touching_glyphs_are_split(self):
+        gray = np.full((50, 120), 245, dtype=np.uint8)
+        glyph(gray, 20, 10, 26)
+        glyph(gray, 50, 10, 26)
+        cv2.rectangle(gray, (46, 38), (49, 39), 30, -1)   # thin bridge along the baseline
+        boxes = segment_line(gray)
+        self.assertEqual(len(boxes), 2)
+        self.assertTrue(44 <= boxes[0, 2] <= 52)
+        self.assertEqual(boxes[1, 0], boxes[0, 2])
+
+    def test_page_counts_and_order(self):
+        lines = ((3, 2), (1, 4))
+        glyphs, boxes, positions = segment_page(page(lines))
+        self.assertEqual(len(boxes), 10)
+        self.assertEqual(glyphs.shape, (10, 32, 32, 1))
+        self.assertEqual(positions, sorted(positions))
+        self.assertEqual([line for line, _ in positions], [0] * 5 + [1] * 5)
+        # Glyphs per word, in reading order
+        counts = [sum(1 for p in positions if p[1] == word) for word in sorted({p[1] for p in positions})]
+        self.assertEqual(counts, [3, 2, 1, 4])
+        for word in {p[1] for p in positions}:
+            xs = [boxes[i, 0] for i, p in enumerate(positions) if p[1] == word]
+            self.assertEqual(xs, sorted(xs))
+        self.assertEqual((boxes[5:, 2] - boxes[5:, 0]).tolist(), [10, 10, 12, 14, 16])
+
+    def test_blank_page(self):
+        blank = np.full((200, 300), 245, dtype=np.uint8)
+        glyphs, boxes, positions = segment_page(blank)
+        self.assertEqual(glyphs.shape, (0, 32, 32, 1))
+        self.assertEqual(boxes.shape, (0, 4))
+        self.assertEqual(positions, [])
+        self.assertEqual(segment_line(blank).shape, (0, 4))
+        self.assertEqual(segment_glyphs(blank)[0].shape, (0, 32, 32, 1))
+
+    def test_single_glyph(self):
+        gray = np.full((120, 120), 245, dtype=np.uint8)
+        glyph(gray, 50, 40, 16)
+        glyphs, boxes, positions = segment_page(gray)
+        self.assertEqual(boxes.tolist(), [[50, 40, 66, 70]])
+        self.assertEqual(positions, [(0, 0)])
+        self.assertEqual(glyphs.shape, (1, 32, 32, 1))
+
+    def test_normalize_matches_cv2_resize(self):
+        gray = page()
+        boxes = segment_page(gray)[1]
+        glyphs = normalize_glyphs(gray, boxes, size=(32, 24))
+        for tensor, (x0, y0, x1, y1) in zip(glyphs, boxes):
+            expected = cv2.resize(gray[y0:y1, x0:x1], (24, 32), interpolation=cv2.INTER_LINEAR) / 255.0
+            np.testing.assert_allclose(tensor[..., 0], expected, atol=0.02)
+
+
+if __name__ == '__main__':
+    unittest.main()
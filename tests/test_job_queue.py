@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import tempfile
+import unittest
+
+from job_queue import JobQueue, COMPLETED, FAILED
+
+
+class FakeAgent:
+    """Echoes the image back as the recognized text; ``fail`` images raise"""
+
+    def process_image_with_agent(self, image, progress_callback=None, compact=False):
+        if progress_callback:
+            progress_callback("Stage 1/1", 50)
+        if image == "fail":
+            raise RuntimeError("broken image")
+        return f"text of {image}", {"stage_1": image}
+
+
+def wait(queue, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while not queue.is_done(job_id):
+        if time.time() > deadline:
+            raise AssertionError(f"job {job_id} did not finish")
+        time.sleep(0.01)
+
+
+class TestJobQueue(unittest.TestCase):
+    """
+    Tests for the in-process job queue
+    """
+    def setUp(self):
+        self.queue = JobQueue(FakeAgent(), max_workers=2)
+
+    def tearDown(self):
+        self.queue.shutdown()
+
+    def test_results_per_image(self):
+        job_id = self.queue.submit(["a", "fail", "b"], names=["a.jpg", "fail.jpg", "b.jpg"])
+        wait(self.queue, job_id)
+
+        status = self.queue.status(job_id)
+        self.assertEqual(status["status"], COMPLETED)
+        self.assertEqual([item["status"] for item in status["items"]], [COMPLETED, FAILED, COMPLETED])
+        self.assertEqual(self.queue.result(job_id, 0), ("text of a", {"stage_1": "a"}))
+        self.assertEqual(self.queue.result(job_id, 1), ("Error: broken image", {}))
+
+    def test_finished_jobs_are_evicted_oldest_first(self):
+        self.queue.max_finished = 2
+        job_ids = []
+        for name in "abcd":
+            job_ids.append(self.queue.submit([name]))
+            wait(self.queue, job_ids[-1])
+
+        # Eviction runs on submit: the last submit saw three finished jobs
+        self.assertIsNone(self.queue.status(job_ids[0]))
+        self.assertEqual(len(self.queue._results), 3)
+        self.assertEqual(self.queue.result(job_ids[-1])[0], "text of d")
+
+    def test_ttl_expires_finished_jobs(self):
+        self.queue.result_ttl = 0
+        first = self.queue.submit(["a"])
+        wait(self.queue, first)
+        self.queue.submit(["b"])
+
+        self.assertIsNone(self.queue.status(first))
+        self.assertNotIn(first, self.queue._results)
+
+    def test_evicted_jobs_are_read_from_the_store(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            queue = JobQueue(FakeAgent(), max_workers=1, db_path=os.path.join(tmp, "jobs.db"), result_ttl=0)
+            try:
+                first = queue.submit(["a"])
+                wait(queue, first)
+                queue.submit(["b"])
+
+                self.assertNotIn(first, queue._jobs)
+                self.assertEqual(queue.status(first)["status"], COMPLETED)
+                self.assertEqual(queue.result(first), ("text of a", {}))
+            finally:
+                queue.shutdown()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+import tempfile
+import unittest
+
+import numpy as np
+
+from ngram import NGramLM
+
+
+CHARS = " abdehlorw"
+LINES = ["hello world", "hello old world", "a bold herd", "world hello"]
+
+
+def contexts(lm, texts):
+    """Every context of up to order - 1 ids that occurs in the texts, plus <s>-led ones"""
+    index = {c: i for i, c in enumerate(lm.chars)}
+    found = {()}
+    for text in texts:
+        ids = [lm.bos] + [index[c] for c in text if c in index] + [lm.eos]
+        for end in range(1, len(ids)):
+            for size in range(1, lm.order):
+                if end - size >= 0:
+                    found.add(tuple(ids[end - size:end]))
+    return found
+
+
+class TestNGramLM(unittest.TestCase):
+    """
+    Tests for the in-process Kneser-Ney character n-gram model
+    """
+    def assertDistributions(self, lm, texts):
+        for context in contexts(lm, texts) | {(0, 1, 2, 3), (lm.bos, 9, 9)}:
+            probs = np.exp(lm.next_log_probs(context))
+            self.assertAlmostEqual(float(probs.sum()), 1.0, places=5, msg=f"context {context}")
+            self.assertEqual(probs[lm.bos], 0.0)
+
+    def test_short_and_empty_last_chunk(self):
+        """
+        A chunk shorter than the order (or an empty line) has no windows of that order.
+        """
+        for texts in (["hello world", "ab"], ["hello world", ""], LINES + ["a"]):
+            lm = NGramLM.train(texts, CHARS, order=5, chunk_size=1)
+            self.assertEqual(lm.meta["lines"], len(texts))
+            self.assertDistributions(lm, texts)
+
+    def test_distributions_sum_to_one(self):
+        for order in (1, 2, 3, 5):
+            self.assertDistributions(NGramLM.train(LINES, CHARS, order=order), LINES)
+
+    def test_chunking_does_not_change_the_model(self):
+        whole = NGramLM.train(LINES, CHARS, order=4)
+        chunked = NGramLM.train(iter(LINES), CHARS, order=4, chunk_size=3)
+        self.assertEqual(whole.meta, chunked.meta)
+        for context in contexts(whole, LINES):
+            np.testing.assert_allclose(whole.next_log_probs(context), chunked.next_log_probs(context))
+
+    def test_save_and_load(self):
+        lm = NGramLM.train([line.encode() for line in LINES], CHARS, order=3)
+        with tempfile.TemporaryDirectory() as path:
+            lm.save(path)
+            loaded = NGramLM.load(path, CHARS)
+            self.assertIsInstance(loaded.levels[0]["prob"], np.memmap)
+            for context in contexts(lm, LINES):
+                np.testing.assert_array_equal(lm.next_log_probs(context), loaded.next_log_probs(context))
+            with self.assertRaises(ValueError):
+                NGramLM.load(path, CHARS + "x")
+
+    def test_scores_prefer_seen_text(self):
+        lm = NGramLM.train(LINES * 5, CHARS, order=3)
+        self.assertGreater(lm.score("hello world"), lm.score("dlrow olleh"))
+        # Characters outside the charset are dropped, whitespace runs collapse
+        self.assertAlmostEqual(lm.score("hello  world!"), lm.score("hello world"))
+
+    def test_order_too_large(self):
+        with self.assertRaises(ValueError):
+            NGramLM.train(LINES, CHARS, order=40)
+
+
+if __name__ == '__main__':
+    unittest.main()
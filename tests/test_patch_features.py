@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import cv2
+import numpy as np
+
+from patch_features import analyze_patches, patch_grid
+
+
+class TestPatchFeatures(unittest.TestCase):
+    """
+    Tests for the per-patch statistics
+    """
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.gray = np.full((480, 640), 235, dtype=np.uint8)
+        for y in range(40, 440, 60):
+            cv2.putText(self.gray, "handwritten text line", (20, y), cv2.FONT_HERSHEY_SIMPLEX, 1.2, 20, 3)
+        self.gray = cv2.add(self.gray, rng.integers(0, 8, self.gray.shape, dtype=np.uint8))
+
+    def test_matches_direct_patch_statistics(self):
+        """
+        At full resolution the integral-image sums equal a direct reduction.
+        """
+        result = analyze_patches(self.gray, max_pixels=None)
+        grid = patch_grid(self.gray.astype(np.float64) / 255.0, 16)
+        self.assertEqual(result["variance"].shape, (30, 40))
+        np.testing.assert_allclose(result["variance"], grid.var(axis=(2, 3)), atol=1e-9)
+
+        _, binary = cv2.threshold(self.gray, 0, 1, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        np.testing.assert_allclose(result["ink_ratio"], patch_grid(binary, 16).mean(axis=(2, 3)))
+
+    def test_downsampled_keeps_grid(self):
+        full = analyze_patches(self.gray, max_pixels=None)
+        fast = analyze_patches(self.gray, max_pixels=self.gray.size // 4)
+        self.assertEqual(fast["text_mask"].shape, full["text_mask"].shape)
+        self.assertGreater((fast["text_mask"] == full["text_mask"]).mean(), 0.95)
+        self.assertTrue(fast["text_mask"][1].any())
+        self.assertFalse(fast["text_mask"][-1].any())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import io
+import unittest
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from preprocess import downscale_to_text_height, estimate_text_height, load_image
+
+
+# Only x-height letters: no ascenders, descenders or dots
+WORDS = "some mover came near a wave"
+
+
+def render(size, font_size, lines=6):
+    """
+    White page of black text lines in the bundled scalable font
+
+    Returns:
+        tuple: (PIL.Image in mode L, x-height of the font in pixels)
+    """
+    font = ImageFont.load_default(size=font_size)
+    page = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(page)
+    for row in range(lines):
+        draw.text((font_size, font_size + row * 2 * font_size), WORDS, fill=0, font=font)
+    _, top, _, bottom = font.getbbox("x")
+    return page, bottom - top
+
+
+def jpeg(image, quality=92):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    buffer.seek(0)
+    return buffer
+
+
+class TestPreprocess(unittest.TestCase):
+    """
+    Tests for the text height estimate and text-height-driven resizing
+    """
+    def test_estimate_text_height(self):
+        for font_size in (24, 40, 64):
+            page, x_height = render((1000, 16 * font_size), font_size)
+            estimate = estimate_text_height(np.asarray(page))
+            self.assertAlmostEqual(estimate / x_height, 1.0, delta=0.15, msg=f"font size {font_size}")
+
+    def test_estimate_is_scaled_back_from_the_analysis_copy(self):
+        page, x_height = render((3000, 1400), 100)
+        estimate = estimate_text_height(np.asarray(page), analysis_side=1024)
+        self.assertAlmostEqual(estimate / x_height, 1.0, delta=0.15)
+
+    def test_blank_page(self):
+        self.assertIsNone(estimate_text_height(np.full((300, 400), 255, dtype=np.uint8)))
+
+    def test_load_image_uses_the_smallest_draft_scale(self):
+        """
+        Text four times the target height decodes at a quarter of the resolution.
+        """
+        page, x_height = render((4000, 3000), 120, lines=10)
+        loaded = load_image(jpeg(page), max_side=4000, target_x_height=round(x_height / 4))
+        self.assertEqual(loaded.info["original_size"], (4000, 3000))
+        self.assertEqual(loaded.size, (1000, 750))
+        self.assertAlmostEqual(loaded.info["original_text_height"] / x_height, 1.0, delta=0.15)
+
+        # The estimate is reused at the decoded size; text already at the target is not resized again
+        decoded_height = loaded.info["original_text_height"] / 4
+        resized, details = downscale_to_text_height(loaded, target_x_height=int(np.ceil(decoded_height)),
+                                                    max_side=4000)
+        self.assertEqual(resized.size, (1000, 750))
+        self.assertEqual(details["estimated_text_height"], round(decoded_height, 1))
+
+    def test_load_image_without_target(self):
+        page, _ = render((3000, 1000), 40)
+        loaded = load_image(jpeg(page), max_side=1024)
+        # Draft mode only scales by powers of two and never below max_side
+        self.assertEqual(loaded.size, (1500, 500))
+        png = io.BytesIO()
+        page.save(png, format="PNG")
+        self.assertEqual(load_image(png, max_side=1024).size, (3000, 1000))
+
+    def test_downscale_to_target(self):
+        page, _ = render((2400, 1600), 96)
+        resized, details = downscale_to_text_height(page, target_x_height=24, max_side=4000)
+        self.assertAlmostEqual(details["scale"], 24 / details["estimated_text_height"], delta=0.01)
+        self.assertAlmostEqual(estimate_text_height(np.asarray(resized)) / 24, 1.0, delta=0.2)
+
+    def test_image_at_target_is_not_rescaled(self):
+        for font_size in (40, 24):
+            page, x_height = render((1200, 800), font_size)
+            resized, details = downscale_to_text_height(page, target_x_height=x_height + 2)
+            self.assertEqual(resized.size, page.size)
+            self.assertEqual(details["scale"], 1.0)
+            self.assertTrue(np.array_equal(np.asarray(resized), np.asarray(page)))
+
+    def test_min_side_is_kept(self):
+        page, _ = render((2000, 600), 80, lines=2)
+        resized, _ = downscale_to_text_height(page, target_x_height=8, min_side=512)
+        self.assertEqual(resized.size[1], 512)
+
+
+if __name__ == '__main__':
+    unittest.main()
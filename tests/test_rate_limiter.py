@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import tempfile
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limiter import RateLimiter, QuotaExceeded, parse_limits
+
+
+class TestRateLimiter(unittest.TestCase):
+    """
+    Tests for the SQLite-backed GCRA token buckets
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "limits.sqlite3")
+        self.env = mock.patch.dict(os.environ, {"RATE_LIMIT_PACED": "10/s", "RATE_LIMIT_BUDGET": "10/s,3/min",
+                                                "RATE_LIMIT_FAST": "100/s"})
+        self.env.start()
+        self.limiter = RateLimiter(self.db_path, burst=1, max_wait=5)
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def test_parse_limits(self):
+        self.assertEqual(parse_limits("1500/day, 15/min"), [(15.0, 60.0), (1500.0, 86400.0)])
+        self.assertEqual(parse_limits(""), [])
+        with self.assertRaises(ValueError):
+            parse_limits("5/fortnight")
+
+    def test_slots_are_evenly_spaced(self):
+        waits = [self.limiter.reserve("paced") for _ in range(4)]
+        for i, wait in enumerate(waits):
+            self.assertAlmostEqual(wait, 0.1 * i, delta=0.02)
+
+    def test_unlimited_key(self):
+        self.assertEqual([self.limiter.reserve("unlisted") for _ in range(3)], [0.0, 0.0, 0.0])
+
+    def test_budget_window(self):
+        """
+        Three per minute may go at the 10/s pace; the fourth waits until the first leaves the minute.
+        """
+        waits = [self.limiter.reserve("budget") for _ in range(3)]
+        self.assertLess(max(waits), 0.5)
+        with self.assertRaises(QuotaExceeded) as raised:
+            self.limiter.reserve("budget")
+        self.assertAlmostEqual(raised.exception.wait, 60.0, delta=0.5)
+        # A refused slot is not reserved
+        with self.assertRaises(QuotaExceeded) as again:
+            self.limiter.reserve("budget")
+        self.assertAlmostEqual(again.exception.wait, raised.exception.wait, delta=0.1)
+        self.assertAlmostEqual(self.limiter.reserve("budget", max_wait=120), 60.0, delta=0.5)
+
+    def test_at_most_count_in_any_period(self):
+        """
+        No window of a budget's length ever holds more than its count.
+        """
+        start = time.time()
+        with mock.patch.dict(os.environ, {"RATE_LIMIT_QUOTA": "100/s,5/s,12/min"}), \
+                mock.patch("rate_limiter.time.time", return_value=start):
+            slots = [start + self.limiter.reserve("quota", max_wait=3600) for _ in range(40)]
+        self.assertEqual(slots, sorted(slots))
+        for window, count in ((1.0, 5), (60.0, 12)):
+            for i, slot in enumerate(slots):
+                inside = sum(slot <= other < slot + window for other in slots)
+                self.assertLessEqual(inside, count, msg=f"{inside} sends within {window:g}s of slot {i}")
+        # The budget is spent at the pace, then the next send waits out the window
+        self.assertAlmostEqual(slots[4] - slots[0], 0.04, delta=0.02)
+        self.assertAlmostEqual(slots[5] - slots[0], 1.0, delta=0.02)
+        self.assertAlmostEqual(slots[12] - slots[0], 60.0, delta=0.05)
+
+    def test_penalize(self):
+        self.limiter.penalize("paced", 3.0)
+        self.assertAlmostEqual(self.limiter.reserve("paced"), 3.0, delta=0.05)
+        self.assertEqual(self.limiter.stats()["paced"]["penalties"], 1)
+
+    def test_shared_between_instances(self):
+        other = RateLimiter(self.db_path, burst=1)
+        self.limiter.reserve("paced")
+        self.assertAlmostEqual(other.reserve("paced"), 0.1, delta=0.02)
+
+    def test_threads_get_distinct_slots(self):
+        """
+        Every concurrent reservation moves the bucket by one interval, so no two share a slot.
+        """
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda _: self.limiter.reserve("fast"), range(8)))
+        tat, = self.limiter._connection().execute("SELECT tat FROM buckets").fetchone()
+        self.assertAlmostEqual(tat - start, 8 * 0.01, delta=0.03)
+
+
+if __name__ == '__main__':
+    unittest.main()
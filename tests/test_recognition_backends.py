@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import resilience
+from recognition_backends import (CharCNNBackend, GeminiBackend, RecognitionBackend, RecognitionRouter,
+                                  BACKENDS)
+
+
+class FakeBackend(RecognitionBackend):
+    """Answers every image with a fixed text and confidence"""
+
+    def __init__(self, name, confidence, cost=0.0, latency_ms=10.0):
+        self.name = name
+        self.cost_per_image = cost
+        self.expected_latency_ms = latency_ms
+        super().__init__()
+        self.confidence = confidence
+        self.calls = []
+
+    def available(self):
+        return True
+
+    def _recognize(self, images):
+        self.calls.append(list(images))
+        return [(f"{self.name}:{image}", self.confidence) for image in images]
+
+
+class TestRecognitionBackends(unittest.TestCase):
+    """
+    Tests for the backends and the confidence router
+    """
+    def test_router_escalates_low_confidence(self):
+        cheap = FakeBackend("test_cheap", 0.3)
+        dear = FakeBackend("test_dear", 0.95, cost=0.01)
+        router = RecognitionRouter([dear, cheap], confidence_threshold=0.8, latency_cost=0.0)
+
+        self.assertEqual(router.route(), ["test_cheap", "test_dear"])
+        result = router.recognize("page")
+        self.assertEqual(result.backend, "test_dear")
+        self.assertEqual(result.attempts, ["test_cheap", "test_dear"])
+
+    def test_unscored_answers_escalate(self):
+        """
+        A backend that reports no confidence (Gemini without logprobs) must not pass the threshold.
+        """
+        unscored = FakeBackend("test_unscored", None)
+        fallback = FakeBackend("test_scored", 0.9, cost=0.01)
+        router = RecognitionRouter([unscored, fallback], confidence_threshold=0.8, latency_cost=0.0)
+
+        result = router.recognize("page")
+        self.assertEqual(result.backend, "test_scored")
+        self.assertLess(GeminiBackend.default_confidence, router.confidence_threshold)
+
+    def test_short_answer_is_a_backend_failure(self):
+        """
+        A backend that drops images fails the whole call, so every image goes on to the next backend.
+        """
+        short = FakeBackend("test_short", 0.99)
+        short._recognize = lambda images: [("short", 0.99)] * (len(images) - 1)
+        fallback = FakeBackend("test_complete", 0.9, cost=0.01)
+        router = RecognitionRouter([short, fallback], confidence_threshold=0.8, latency_cost=0.0)
+
+        with mock.patch.object(resilience, "_breakers", {}):
+            results = router.recognize_batch(["a", "b", "c"])
+            self.assertEqual(resilience.get_breaker("test_short").stats()["failures"], 1)
+        self.assertEqual([result.text for result in results], ["test_complete:a", "test_complete:b", "test_complete:c"])
+        self.assertTrue(all(result.attempts == ["test_short", "test_complete"] for result in results))
+        self.assertEqual(router.stats()["test_short"]["failures"], 1)
+
+    def test_char_cnn_needs_two_classes(self):
+        with mock.patch("char_classifier.load_training_config", return_value=(np.array(["ka"]), (32, 32))):
+            self.assertFalse(CharCNNBackend().available())
+
+    def test_char_cnn_margin(self):
+        confident = [[("ka", 0.9), ("kha", 0.05)]]
+        ambiguous = [[("ka", 0.5), ("kha", 0.45)]]
+        self.assertAlmostEqual(CharCNNBackend._margin(confident), 0.85)
+        self.assertAlmostEqual(CharCNNBackend._margin(ambiguous), 0.05)
+
+    def test_registry(self):
+        self.assertEqual(set(BACKENDS), {"tesseract", "char_cnn", "google_vision", "gemini"})
+
+
+if __name__ == '__main__':
+    unittest.main()
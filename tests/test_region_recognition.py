@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from region_recognition import crop_regions, find_regions, pack_crops, recognize_regions, stitch_text
+
+
+def page(lines=((3, 2), (2, 2, 1))):
+    """
+    White page with one row of block words per line; each number is the
+    glyph count of a word (12x30 px glyphs, 6 px apart, words 40 px apart).
+    Every word has its own ink level, so no two crops are alike.
+    """
+    gray = np.full((300, 500), 245, dtype=np.uint8)
+    ink = 10
+    for row, words in enumerate(lines):
+        y, x = 50 + row * 100, 30
+        for count in words:
+            ink += 10
+            for _ in range(count):
+                cv2.rectangle(gray, (x, y), (x + 11, y + 29), ink, -1)
+                x += 18
+            x += 40 - 6
+    return Image.fromarray(gray)
+
+
+class TestRegionRecognition(unittest.TestCase):
+    """
+    Tests for crop packing and stitching region texts in reading order
+    """
+    def test_pack_crops_size_and_layout(self):
+        crops = [Image.new("L", (30, 10), 0), Image.new("L", (50, 20), 100), Image.new("L", (40, 15), 200)]
+        sheet = pack_crops(crops, gap=24)
+        self.assertEqual(sheet.mode, "L")
+        self.assertEqual(sheet.size, (50 + 2 * 24, 10 + 20 + 15 + 4 * 24))
+        # Each crop sits at the left margin, one row per crop, on a white sheet
+        self.assertEqual(sheet.getpixel((24, 24)), 0)
+        self.assertEqual(sheet.getpixel((24 + 49, 24 + 10 + 24)), 100)
+        self.assertEqual(sheet.getpixel((24, 24 + 10 + 24 + 20 + 24 + 14)), 200)
+        self.assertEqual(sheet.getpixel((24 + 30, 24)), 255)
+        self.assertEqual(sheet.getpixel((0, 0)), 255)
+
+    def test_pack_crops_mixed_modes(self):
+        sheet = pack_crops([Image.new("L", (10, 10), 0), Image.new("RGB", (20, 5), (255, 0, 0))], gap=4)
+        self.assertEqual((sheet.mode, sheet.size), ("RGB", (28, 27)))
+        self.assertEqual(sheet.getpixel((4, 4)), (0, 0, 0))
+        self.assertEqual(sheet.getpixel((4, 18)), (255, 0, 0))
+        self.assertEqual(sheet.getpixel((0, 0)), (255, 255, 255))
+
+    def test_stitch_text_reading_order(self):
+        regions = [{"line": 0}, {"line": 0}, {"line": 2}, {"line": 1}, {"line": 1}, {"line": 3}]
+        texts = ["the", " quick ", "dog", "brown", None, ""]
+        self.assertEqual(stitch_text(regions, texts), "the quick\nbrown\ndog")
+        self.assertEqual(stitch_text([], []), "")
+
+    def test_crop_regions_are_padded_and_clamped(self):
+        image = Image.new("L", (100, 60), 255)
+        crops = crop_regions(image, [{"bbox": [10, 20, 50, 40], "line": 0}, {"bbox": [0, 0, 100, 60], "line": 1}])
+        # 15% of the 20 px height plus 2 px on every side
+        self.assertEqual(crops[0].size, (40 + 2 * 5, 20 + 2 * 5))
+        self.assertEqual(crops[1].size, (100, 60))
+
+    def test_recognize_words_in_reading_order(self):
+        """
+        Words come back batched and concurrently, but are stitched line by line, left to right.
+        """
+        image = page()
+        regions = find_regions(image, unit="word")
+        self.assertEqual([region["line"] for region in regions], [0, 0, 1, 1, 1])
+        names = {tuple(region["bbox"]): f"w{i}" for i, region in enumerate(regions)}
+        crops = {crop.tobytes(): names[tuple(region["bbox"])]
+                 for crop, region in zip(crop_regions(image, regions), regions)}
+
+        calls = []
+
+        def recognize_batch(batch):
+            calls.append(len(batch))
+            return [crops[crop.tobytes()] for crop in batch]
+
+        text, details = recognize_regions(image, recognize_batch, unit="word", batch_size=2, max_workers=3)
+        self.assertEqual(text, "w0 w1\nw2 w3 w4")
+        self.assertEqual(sorted(calls), [1, 2, 2])
+        self.assertEqual((details["regions"], details["batches"]), (5, 3))
+
+    def test_short_batch_results_keep_alignment(self):
+        image = page()
+        text, details = recognize_regions(image, lambda batch: ["x"] * (len(batch) - 1), unit="line", batch_size=8)
+        self.assertEqual(details["region_texts"], ["x", ""])
+        self.assertEqual(text, "x")
+
+    def test_blank_page(self):
+        text, details = recognize_regions(Image.new("L", (200, 100), 255), lambda batch: ["x"] * len(batch))
+        self.assertEqual((text, details["regions"]), ("", 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
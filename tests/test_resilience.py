@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from PIL import Image
+
+import google_vision
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, get_breaker, guarded_call, hedged_call
+
+
+TIMEOUT = 0.3
+
+
+class StubVision:
+    """Behaviour of the stub images:annotate server, changed per test"""
+
+    def __init__(self):
+        self.mode = "ok"
+        self.delay = 0.0
+        self.slow_next = 0
+        self.hits = 0
+        self.lock = threading.Lock()
+
+
+def make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            with stub.lock:
+                stub.hits += 1
+                slow = stub.mode == "slow" or stub.slow_next > 0
+                stub.slow_next = max(stub.slow_next - 1, 0)
+                mode, delay = stub.mode, stub.delay
+
+            if slow:
+                time.sleep(delay)
+            if mode == "error":
+                self._reply(500, {"error": {"code": 500, "message": "injected failure"}})
+                return
+            self._reply(200, {"responses": [{"textAnnotations": [{"description": "TEST"}]}]})
+
+        def _reply(self, status, body):
+            payload = json.dumps(body).encode()
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client already gave up (timeout cases)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+class TestResilience(unittest.TestCase):
+    """
+    Fault-injection tests of the remote guards against a local Google Vision stub
+    """
+    def setUp(self):
+        self.stub = StubVision()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(self.stub))
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/images:annotate"
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.patches = [
+            mock.patch.dict(os.environ, {"GOOGLE_VISION_ENDPOINT": self.url, "GOOGLE_VISION_TIMEOUT": str(TIMEOUT),
+                                         "BREAKER_FAILURES": "3", "BREAKER_RESET_SECONDS": "0.3",
+                                         "RATE_LIMIT_DB": os.path.join(self.tmp.name, "limits.sqlite3"),
+                                         "RATE_LIMIT_GOOGLE_VISION": "", "HEDGE_REQUESTS": "0"}),
+            # Fresh breakers per test; the local Tesseract path is not what is under test
+            mock.patch.object(resilience, "_breakers", {}),
+            mock.patch.object(google_vision, "_local_fallback", lambda *args: "LOCAL"),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.image = Image.new('RGB', (200, 100), color='white')
+        self.breaker = get_breaker("google_vision")
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def predict(self):
+        return google_vision.predict_with_google_vision(self.image, "stub-key")
+
+    def test_healthy_endpoint(self):
+        self.assertEqual(self.predict(), "TEST")
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertIsNotNone(self.breaker.percentile(95))
+
+    def test_timeout_falls_back(self):
+        self.stub.mode, self.stub.delay = "slow", TIMEOUT * 4
+        text, elapsed = timed(self.predict)
+        self.assertEqual(text, "LOCAL")
+        self.assertLess(elapsed, TIMEOUT * 2)
+        self.assertEqual(self.breaker.stats()["failures"], 1)
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_errors_open_the_breaker(self):
+        self.stub.mode = "error"
+        for _ in range(self.breaker.failure_threshold):
+            self.assertEqual(self.predict(), "LOCAL")
+        self.assertEqual(self.breaker.state, "open")
+
+        hits = self.stub.hits
+        text, elapsed = timed(self.predict)
+        self.assertEqual(text, "LOCAL")
+        self.assertEqual(self.stub.hits, hits, "an open breaker skips the endpoint")
+        self.assertLess(elapsed, 0.2)
+        self.assertEqual(self.breaker.stats()["rejected"], 1)
+
+    def test_recovery_after_reset_timeout(self):
+        self.stub.mode = "error"
+        for _ in range(self.breaker.failure_threshold):
+            self.predict()
+        time.sleep(self.breaker.reset_timeout + 0.05)
+        self.assertEqual(self.breaker.state, "half_open")
+
+        # A failed trial re-opens the breaker at once
+        self.assertEqual(self.predict(), "LOCAL")
+        self.assertEqual(self.breaker.state, "open")
+
+        self.stub.mode = "ok"
+        time.sleep(self.breaker.reset_timeout + 0.05)
+        self.assertEqual(self.predict(), "TEST")
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_half_open_admits_one_trial(self):
+        breaker = CircuitBreaker("trial", failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertTrue(breaker.allow())
+
+    def test_open_breaker_without_fallback(self):
+        self.stub.mode = "error"
+        for _ in range(self.breaker.failure_threshold):
+            with self.assertRaises(google_vision.VisionServiceError):
+                guarded_call("google_vision", google_vision._annotate_text, self.image, "stub-key")
+        with self.assertRaises(CircuitOpenError):
+            guarded_call("google_vision", google_vision._annotate_text, self.image, "stub-key")
+
+    def test_exhausted_quota_falls_back(self):
+        with mock.patch.dict(os.environ, {"RATE_LIMIT_GOOGLE_VISION": "1/min", "RATE_LIMIT_MAX_WAIT": "0",
+                                          "RATE_LIMIT_DB": os.path.join(self.tmp.name, "quota.sqlite3")}):
+            self.assertEqual(self.predict(), "TEST")
+            self.assertEqual(self.predict(), "LOCAL")
+        self.assertEqual(self.stub.hits, 1)
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_hedge_beats_a_slow_primary(self):
+        """
+        The first request is slow; the hedge sent after the delay answers first.
+        """
+        self.stub.slow_next, self.stub.delay = 1, 0.5
+
+        def call():
+            return requests.post(self.url, json={}, timeout=5).json()
+
+        (result, winner), elapsed = timed(hedged_call, call, call, 0.05)
+        self.assertEqual(winner, "secondary")
+        self.assertEqual(result["responses"][0]["textAnnotations"][0]["description"], "TEST")
+        self.assertLess(elapsed, 0.4)
+
+        # A primary that answers within the delay is never hedged
+        hits = self.stub.hits
+        self.assertEqual(hedged_call(call, call, 1.0)[1], "primary")
+        self.assertEqual(self.stub.hits, hits + 1)
+
+    def test_hedged_call_errors(self):
+        def fail(message):
+            def call():
+                time.sleep(0.02)
+                raise ValueError(message)
+            return call
+
+        with self.assertRaisesRegex(ValueError, "primary"):
+            hedged_call(fail("primary"), fail("secondary"), 0.01)
+        self.assertEqual(hedged_call(fail("primary"), lambda: "hedge", 0.01), ("hedge", "secondary"))
+        with self.assertRaises(TimeoutError):
+            hedged_call(lambda: time.sleep(0.5), lambda: time.sleep(0.5), 0.01, timeout=0.1)
+
+    def test_guarded_call_hedges(self):
+        self.stub.delay = 0.5
+        # A few fast calls give the breaker the p95 that sets the hedge delay
+        for _ in range(3):
+            self.assertEqual(self.predict(), "TEST")
+        self.stub.slow_next = 1
+        hits = self.stub.hits
+
+        with mock.patch.dict(os.environ, {"HEDGE_REQUESTS": "1"}):
+            text, elapsed = timed(guarded_call, "google_vision", google_vision._annotate_text, self.image,
+                                  "stub-key", fallback=lambda *args: "LOCAL", secondary=google_vision._annotate_text)
+        self.assertEqual(text, "TEST")
+        self.assertLess(elapsed, 0.4)
+        self.assertEqual(self.stub.hits, hits + 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import random
+import unicodedata
+import unittest
+
+from script_profile import (contains_script, is_latin_text, merge_profiles, primary_script, text_profile,
+                            SCRIPT_RANGES)
+
+
+def reference_profile(text):
+    """The per-character loops the profile replaces, with str predicates"""
+    def script(char):
+        for first, last, name in SCRIPT_RANGES:
+            if first <= ord(char) <= last:
+                return name
+        return "Common"
+
+    scripts = {}
+    for char in text:
+        scripts[script(char)] = scripts.get(script(char), 0) + 1
+    marks = [unicodedata.category(c).startswith("M") for c in text]
+    return {
+        "length": len(text),
+        "scripts": scripts,
+        "classes": {
+            "letters": sum(c.isalpha() for c in text),
+            "numbers": sum(c.isdigit() for c in text),
+            "spaces": sum(c.isspace() for c in text),
+            "uppercase": sum(c.isupper() for c in text),
+            "lowercase": sum(c.islower() for c in text),
+            "marks": sum(marks),
+            "punctuation": sum(not (c.isalpha() or c.isdigit() or c.isspace() or m) for c, m in zip(text, marks))
+        }
+    }
+
+
+MIXED = "ଓଡ଼ିଆ ଭାଷା ଲିପି Odia Script 2024, ପୃଷ୍ଠା ୧୨ — हिन्दी पाठ.\tÉté ½ 😀"
+
+
+class TestScriptProfile(unittest.TestCase):
+    """
+    Tests for the vectorised script and character-class counts
+    """
+    def test_matches_str_predicates(self):
+        self.assertEqual(text_profile(MIXED), reference_profile(MIXED))
+
+    def test_random_mixed_text(self):
+        rng = random.Random(0)
+        alphabet = [chr(p) for p in range(0x0B00, 0x0B80)] + list("abcXYZ0189 ,.!\n") + ["ऄ", "é", "½", "٣"]
+        for _ in range(50):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 200)))
+            self.assertEqual(text_profile(text), reference_profile(text))
+
+    def test_odia_block(self):
+        profile = text_profile("ଓଡ଼ିଆ ୧୨")
+        odia = sum(0x0B00 <= ord(c) <= 0x0B7F for c in "ଓଡ଼ିଆ ୧୨")
+        self.assertEqual(profile["scripts"], {"Odia": odia, "Common": 1})
+        # Odia digits are digits; vowel signs and the nukta are marks
+        self.assertEqual(profile["classes"]["numbers"], 2)
+        self.assertEqual(profile["classes"]["marks"], sum(unicodedata.category(c).startswith("M") for c in "ଓଡ଼ିଆ"))
+        self.assertTrue(contains_script(profile, "Odia"))
+        self.assertFalse(contains_script(profile, "Devanagari"))
+        self.assertEqual(primary_script(profile), ("Odia", 1.0))
+
+    def test_empty_input(self):
+        profile = text_profile("")
+        self.assertEqual(profile, reference_profile(""))
+        self.assertEqual(profile["scripts"], {})
+        self.assertEqual(primary_script(profile), (None, 0.0))
+        self.assertFalse(is_latin_text(profile))
+        self.assertEqual(merge_profiles([]), profile)
+
+    def test_merge_and_latin(self):
+        chunks = ["Hello world 42", "ଓଡ଼ିଆ", "", "more text"]
+        self.assertEqual(merge_profiles(map(text_profile, chunks)), text_profile("".join(chunks)))
+        self.assertTrue(is_latin_text(text_profile("Hello world 42")))
+        self.assertFalse(is_latin_text(text_profile("ଓଡ଼ିଆ ଭାଷା ok")))
+        self.assertFalse(is_latin_text(text_profile("2024 !!")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+from PIL import Image
+from starlette.testclient import TestClient
+
+import service
+from stage_payload import AgentResult
+
+
+def png(color="white", size=(120, 60)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class StubAgent:
+    """Answers with the image size; a red image fails, and ``gate`` can hold the workers"""
+
+    agent_name = "StubAgent"
+    version = "0"
+    is_ready = True
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = threading.Event()
+
+    def process_image_with_agent(self, image, compact=False, thumbnails=True):
+        self.started.set()
+        self.gate.wait(5)
+        if image.convert("RGB").getpixel((0, 0)) == (255, 0, 0):
+            raise RuntimeError("stub failure")
+        text = f"{image.size[0]}x{image.size[1]}"
+        stages = {"stage_1": {"name": "Stub", "output": text, "details": {"size": text}, "status": "✅ Completed"}}
+        return text, AgentResult.from_stage_results(text, stages, thumbnails=thumbnails)
+
+
+class TestService(unittest.TestCase):
+    """
+    Endpoint tests of the inference service with a stub agent
+    """
+    def setUp(self):
+        self.agent = StubAgent()
+        self.patches = [mock.patch.object(service, "_build_agent", return_value=self.agent),
+                        mock.patch.dict(os.environ, {"OCR_MAX_PENDING": "2", "OCR_WORKERS": "2"})]
+        for patch in self.patches:
+            patch.start()
+        self.client = TestClient(service.app)
+        self.client.__enter__()
+
+    def tearDown(self):
+        self.agent.gate.set()
+        self.client.__exit__(None, None, None)
+        for patch in reversed(self.patches):
+            patch.stop()
+
+    def test_ocr_multipart_and_raw(self):
+        response = self.client.post("/ocr", files={"file": ("page.png", png(), "image/png")})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["name"], body["text"]), ("page.png", "120x60"))
+        self.assertEqual(body["stages"][0]["name"], "Stub")
+
+        raw = self.client.post("/ocr?name=raw.png", content=png())
+        self.assertEqual(raw.status_code, 200)
+        self.assertEqual(raw.json()["name"], "raw.png")
+
+    def test_ocr_errors(self):
+        self.assertEqual(self.client.post("/ocr", content=b"").status_code, 400)
+        bad = self.client.post("/ocr", files={"file": ("bad.png", b"not an image", "image/png")})
+        self.assertEqual(bad.status_code, 400)
+        self.assertTrue(bad.json()["error"].startswith("Could not decode image"))
+        failed = self.client.post("/ocr", files={"file": ("red.png", png("red"), "image/png")})
+        self.assertEqual(failed.status_code, 500)
+        self.assertIn("stub failure", failed.json()["error"])
+
+    def test_batch_reports_errors_per_image(self):
+        files = [("files", ("a.png", png(), "image/png")),
+                 ("files", ("bad.png", b"not an image", "image/png")),
+                 ("files", ("a.png", png(size=(80, 40)), "image/png"))]
+        response = self.client.post("/ocr/batch", files=files)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([r["name"] for r in results], ["a.png", "bad.png", "a.png"])
+        self.assertEqual(results[0]["text"], "120x60")
+        self.assertIn("error", results[1])
+        self.assertEqual(results[2]["text"], "80x40")
+
+    def test_backpressure(self):
+        """
+        Requests that would push pending images over OCR_MAX_PENDING get 503 with Retry-After.
+        """
+        files = [("files", (f"{i}.png", png(), "image/png")) for i in range(3)]
+        busy = self.client.post("/ocr/batch", files=files)
+        self.assertEqual(busy.status_code, 503)
+        self.assertEqual(busy.headers["retry-after"], "1")
+
+        # Two images held in the workers fill the service; the next one is refused
+        self.agent.gate.clear()
+        held = threading.Thread(target=self.client.post, args=("/ocr/batch",),
+                                kwargs={"files": files[:2]})
+        held.start()
+        self.assertTrue(self.agent.started.wait(5))
+        self.assertEqual(self.client.get("/health").json()["pending"], 2)
+        self.assertEqual(self.client.post("/ocr", files={"file": ("c.png", png(), "image/png")}).status_code, 503)
+        self.agent.gate.set()
+        held.join(5)
+        self.assertEqual(self.client.get("/health").json()["pending"], 0)
+
+    def test_queue_full_while_submitting(self):
+        """
+        If the pool refuses an image mid-request, the images already submitted are cancelled.
+        """
+        pool = self.client.app.state.pool
+        submit = pool.submit_nowait
+        submitted = []
+
+        def submit_once(image, thumbnails=False):
+            if submitted:
+                raise asyncio.QueueFull()
+            submitted.append(submit(image, thumbnails))
+            return submitted[-1]
+
+        files = [("files", (f"{i}.png", png(), "image/png")) for i in range(2)]
+        with mock.patch.object(pool, "submit_nowait", submit_once):
+            response = self.client.post("/ocr/batch", files=files)
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(submitted[0].cancelled())
+
+    def test_metrics(self):
+        def ok_requests():
+            for line in self.client.get("/metrics").text.splitlines():
+                if line.startswith('visiontext_requests_total{code="200",endpoint="/ocr"}'):
+                    return int(line.split()[-1])
+            return 0
+
+        before = ok_requests()
+        self.client.post("/ocr", files={"file": ("page.png", png(), "image/png")})
+        self.assertEqual(ok_requests(), before + 1)
+        text = self.client.get("/metrics").text
+        self.assertIn('visiontext_request_seconds_count{endpoint="/ocr"}', text)
+        self.assertIn("visiontext_pipeline_seconds_count", text)
+        self.assertIn("visiontext_pending_images 0", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import vision_agent
+
+from spell_corrector import (SpellCorrector, build_index, deletes, edit_distance, osa_distances, read_lexicon,
+                             split_token)
+
+
+class TestSpellCorrector(unittest.TestCase):
+    """
+    Tests for the symmetric-delete spell corrector
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        counts = {"hello": 50, "help": 30, "world": 40, "word": 20, "model": 25, "modal": 5,
+                  "clean": 10, "ଓଡ଼ିଆ": 15, "ଭାଷା": 12}
+        build_index(counts, self.tmp.name, max_edit=2, prefix_length=7)
+        self.corrector = SpellCorrector(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_osa_distances_match_dp(self):
+        rng = random.Random(0)
+        alphabet = "abcde" + "ଓଡିଆ"
+        for _ in range(50):
+            word = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 9)))
+            terms = ["".join(rng.choice(alphabet) for _ in range(rng.randint(1, 9))) for _ in range(20)]
+            expected = [edit_distance(word, term, 20) for term in terms]
+            self.assertEqual(osa_distances(word, terms).tolist(), expected)
+
+    def test_transposition_is_one_edit(self):
+        self.assertEqual(edit_distance("hlelo", "hello", 2), 1)
+        self.assertEqual(osa_distances("hlelo", ["hello"]).tolist(), [1])
+
+    def test_deletes(self):
+        self.assertEqual(deletes("abc", 1), {"abc", "bc", "ac", "ab"})
+        self.assertEqual(len(deletes("abcd", 2)), 1 + 4 + 6)
+
+    def test_corrections(self):
+        self.assertEqual(self.corrector.correct_word("helo")[0], "hello")
+        self.assertEqual(self.corrector.correct_word("Wrold,")[0], "World,")
+        self.assertEqual(self.corrector.correct_word("HELLO")[0], "HELLO")
+        self.assertEqual(self.corrector.correct_word("ଓଡିଆ")[0], "ଓଡ଼ିଆ")
+
+    def test_known_and_unknown_words(self):
+        suggestions = self.corrector.lookup("world")
+        self.assertEqual([(s.term, s.distance) for s in suggestions], [("world", 0)])
+        self.assertEqual(self.corrector.correct_word("zzzzzzz"), ("zzzzzzz", []))
+        self.assertEqual(self.corrector.correct_word("2024"), ("2024", []))
+
+    def test_ocr_confusions(self):
+        """
+        Look-alike digits are read as letters, and 'rn' for 'm' is a cheap confusion.
+        """
+        self.assertEqual(self.corrector.correct_word("he1lo")[0], "hello")
+        best = self.corrector.lookup("rnodel")[0]
+        self.assertEqual(best.term, "model")
+        self.assertLess(best.cost, best.distance)
+
+    def test_correct_text(self):
+        text, results = self.corrector.correct("helo wrold (rnodel)")
+        self.assertEqual(text, "hello world (model)")
+        self.assertEqual(len(results), 3)
+
+    def test_split_token(self):
+        self.assertEqual(split_token('"hello!"'), ('"', "hello", '!"'))
+        self.assertEqual(split_token("..."), ("...", "", ""))
+
+    def test_read_lexicon(self):
+        path = os.path.join(self.tmp.name, "lexicon.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("hello 7\nThe cat, the hat.\n")
+        counts = read_lexicon([path])
+        self.assertEqual(counts["hello"], 7)
+        self.assertEqual(counts["the"], 2)
+        self.assertEqual(counts["cat"], 1)
+
+
+class TestPostProcessing(unittest.TestCase):
+    """
+    The agent's stage 5 reports only what the corrector measured
+    """
+    def setUp(self):
+        self.agent = vision_agent.VisionTextAgent.__new__(vision_agent.VisionTextAgent)
+        self.agent._thread_state = threading.local()
+
+    def test_without_lexicon(self):
+        with mock.patch.object(vision_agent, "get_spell_corrector", return_value=None):
+            self.assertEqual(self.agent._post_process_text("helo world"), "helo world")
+        details = self.agent.post_processing_details
+        self.assertIsNone(details["final_confidence"])
+        self.assertIn("SPELL_LEXICON", details["lexicon"])
+
+    def test_with_lexicon(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            build_index({"hello": 5, "world": 5}, tmp, max_edit=2, prefix_length=7)
+            with mock.patch.object(vision_agent, "get_spell_corrector", return_value=SpellCorrector(tmp)):
+                self.assertEqual(self.agent._post_process_text("helo world"), "hello world")
+                self.assertEqual(self.agent._post_process_text("No text detected"), "No text detected")
+                self.assertEqual(self.agent.post_processing_details["lexicon"]["words"], 2)
+                self.assertIsNone(self.agent.post_processing_details["final_confidence"])
+                self.agent._post_process_text("helo world")
+        details = self.agent.post_processing_details
+        self.assertEqual(details["spelling_corrections"], 1)
+        self.assertGreater(details["final_confidence"], 0.0)
+        self.assertLessEqual(details["final_confidence"], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from PIL import Image
+
+from stage_payload import AgentResult, ImageRef, ImageStore, DETAIL_ITEMS
+
+
+class TestStagePayload(unittest.TestCase):
+    """
+    Tests for the compact stage results
+    """
+    def setUp(self):
+        self.image = Image.new("RGB", (640, 480), "white")
+        self.image.putpixel((10, 10), (0, 0, 0))
+
+    def test_thumbnail_only_on_request(self):
+        """
+        The key comes from the pixels, so it does not depend on the thumbnail.
+        """
+        plain = ImageRef.from_image(self.image, thumbnail=False)
+        with_thumbnail = ImageRef.from_image(self.image, thumbnail=True)
+        self.assertIsNone(plain.thumbnail)
+        self.assertTrue(with_thumbnail.thumbnail.startswith(b"\xff\xd8"))
+        self.assertEqual(plain.key, with_thumbnail.key)
+
+    def test_key_follows_content(self):
+        other = self.image.copy()
+        other.putpixel((20, 20), (0, 0, 0))
+        self.assertNotEqual(ImageRef.from_image(self.image, thumbnail=False).key,
+                            ImageRef.from_image(other, thumbnail=False).key)
+
+    def test_store_keeps_full_image(self):
+        store = ImageStore()
+        ref = ImageRef.from_image(self.image, thumbnail=False, store=store)
+        self.assertIs(ref.to_image(store), self.image)
+
+    def test_details_are_summarized(self):
+        characters = [{"character": "a", "confidence": 0.9}] * (DETAIL_ITEMS + 5)
+        stage_results = {"stage_3": {"name": "Detection", "status": "ok", "result_image": self.image,
+                                     "details": {"characters": characters, "words": [{"word": "a"}],
+                                                 "recognition": {"regions": list(range(50))}}}}
+        result = AgentResult.from_stage_results("a", stage_results, thumbnails=False)
+        details = result.stage(3).details
+        self.assertEqual(len(details["characters"]), DETAIL_ITEMS)
+        self.assertEqual(details["truncated"], {"characters": DETAIL_ITEMS + 5})
+        self.assertEqual(details["words"], [{"word": "a"}])
+        self.assertEqual(details["recognition"]["truncated"], {"regions": 50})
+        self.assertIsNone(result.stage(3).result_image.thumbnail)
+
+    def test_json_round_trip(self):
+        stage_results = {"stage_1": {"name": "Preprocessing", "status": "ok", "result_image": self.image,
+                                     "details": {"size": [640, 480]}}}
+        result = AgentResult.from_stage_results("text", stage_results)
+        restored = AgentResult.from_json(result.to_json())
+        self.assertEqual(restored.to_dict(), result.to_dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
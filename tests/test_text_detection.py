@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+import cv2
+import numpy as np
+
+from text_detection import GridIndex, detect_text, find_components, binarize, group_lines, split_words
+
+
+def page(lines=((3, 2, 4), (5, 3), (2, 2, 2, 2))):
+    """
+    White page with one row of block "glyphs" per line; each number is the
+    glyph count of a word. Glyphs are 12x30 px, 6 px apart, words 40 px apart.
+    """
+    gray = np.full((400, 600), 245, dtype=np.uint8)
+    for row, words in enumerate(lines):
+        y, x = 60 + row * 100, 30
+        for count in words:
+            for _ in range(count):
+                cv2.rectangle(gray, (x, y), (x + 11, y + 29), 30, -1)
+                x += 18
+            x += 40 - 6
+    return gray
+
+
+class TestTextDetection(unittest.TestCase):
+    """
+    Tests for connected-component text localisation
+    """
+    def test_lines_and_words(self):
+        result = detect_text(page())
+        self.assertEqual(len(result["lines"]), 3)
+        self.assertEqual([line["words"] for line in result["lines"]], [3, 2, 4])
+        self.assertEqual(len(result["words"]), 9)
+        self.assertEqual(len(result["components"]), 9 + 8 + 8)
+        self.assertAlmostEqual(result["median_height"], 30.0)
+
+    def test_reading_order(self):
+        result = detect_text(page())
+        order = [result["components"][k]["bbox"] for line in result["lines"] for k in line["components"]]
+        self.assertEqual(order, [c["bbox"] for c in result["components"]])
+
+        tops = [line["bbox"][1] for line in result["lines"]]
+        self.assertEqual(tops, sorted(tops))
+        first_line = [result["components"][k]["bbox"][0] for k in result["lines"][0]["components"]]
+        self.assertEqual(first_line, sorted(first_line))
+
+    def test_frames_rules_and_specks_are_dropped(self):
+        gray = page()
+        cv2.rectangle(gray, (2, 2), (597, 397), 30, 2)   # page frame
+        cv2.line(gray, (30, 350), (570, 350), 30, 2)     # ruled line
+        gray[380:382, 300:302] = 30                      # speck
+        result = detect_text(gray)
+        self.assertEqual(len(result["components"]), 25)
+        self.assertEqual(len(result["lines"]), 3)
+
+    def test_light_text_on_dark_background(self):
+        result = detect_text(255 - page())
+        self.assertEqual([line["words"] for line in result["lines"]], [3, 2, 4])
+
+    def test_empty_page(self):
+        result = detect_text(np.full((200, 300), 245, dtype=np.uint8))
+        self.assertEqual(result, {"components": [], "words": [], "lines": [], "median_height": 0.0})
+
+    def test_grid_index_query(self):
+        boxes = np.array([[0, 0, 10, 10], [100, 100, 10, 10], [15, 5, 10, 10]])
+        index = GridIndex(boxes, cell_size=20)
+        self.assertTrue({0, 2} <= index.query(0, 0, 19, 19))
+        self.assertNotIn(1, index.query(0, 0, 19, 19))
+
+    def test_split_words(self):
+        boxes, _ = find_components(binarize(page(((2, 3),))))
+        lines = group_lines(boxes)
+        self.assertEqual(len(lines), 1)
+        self.assertEqual([len(word) for word in split_words(boxes, lines[0])], [2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
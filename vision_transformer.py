@@ -1,73 +1,311 @@
-import torch
-import torch.nn as nn
-from transformers import ViTImageProcessor, ViTForImageClassification
+import os
+import time
+import threading
 from PIL import Image
 import numpy as np
+from backend_registry import lazy_module
+
+# torch and transformers take seconds to import; load them on first use
+torch = lazy_module("torch")
+nn = lazy_module("torch.nn")
+transformers = lazy_module("transformers")
+
+DEFAULT_VIT_MODEL = 'google/vit-base-patch16-224'
+PRECISIONS = ('fp32', 'int8', 'onnx')
+
+_extractors = {}
+_extractors_lock = threading.Lock()
+
+
+def model_source(model_name_or_path=None):
+    """Model id or directory the extractor loads (VIT_MODEL_DIR, then google/vit-base-patch16-224)"""
+    return model_name_or_path or os.getenv('VIT_MODEL_DIR') or DEFAULT_VIT_MODEL
+
+
+def _pooled_vit(model):
+    """Wrap the ViT so it returns exactly (pooled features, last attention); used for ONNX export"""
+
+    class PooledViT(nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, pixel_values):
+            outputs = self.model(pixel_values=pixel_values, output_hidden_states=True, output_attentions=True)
+            return outputs.hidden_states[-1].mean(dim=1), outputs.attentions[-1]
+
+    return PooledViT(model)
+
 
 class VisionTransformerFeatureExtractor:
-    def __init__(self):
-        """Initialize Vision Transformer for feature extraction"""
-        self.processor = ViTImageProcessor.from_pretrained('google/vit-base-patch16-224')
-        self.model = ViTForImageClassification.from_pretrained('google/vit-base-patch16-224')
-        self.model.eval()
-    
+    def __init__(self, model_name_or_path=None, num_threads=None, precision=None, onnx_path=None):
+        """
+        Initialize Vision Transformer for feature extraction
+
+        Args:
+            model_name_or_path: Hugging Face model id or local model directory
+                (defaults to VIT_MODEL_DIR, then google/vit-base-patch16-224)
+            num_threads: Torch intra-op threads (defaults to VIT_NUM_THREADS, 0 keeps torch's default)
+            precision: 'fp32', 'int8' (dynamic-quantized Linear layers) or
+                'onnx' (ONNX Runtime on CPU); defaults to VIT_PRECISION or 'fp32'
+            onnx_path: Where the exported ONNX model is cached (precision 'onnx' only)
+        """
+        source = model_source(model_name_or_path)
+        precision = precision or os.getenv('VIT_PRECISION', 'fp32')
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+        # A local directory never touches the network, so offline machines work
+        local_only = os.path.isdir(source)
+
+        num_threads = num_threads if num_threads is not None else int(os.getenv('VIT_NUM_THREADS', 0))
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        self.source = source
+        self.precision = precision
+        self.processor = transformers.ViTImageProcessor.from_pretrained(source, local_files_only=local_only)
+
+        if precision == 'onnx':
+            # The torch model is only needed to export once; ONNX Runtime holds its own weights
+            self.model = None
+            self._session = self._load_onnx_session(onnx_path or self._default_onnx_path(), local_only)
+        else:
+            self.model = self._load_model(local_only)
+
+        if precision == 'int8':
+            # Weights of every Linear layer stored as int8, activations quantized on the fly
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {nn.Linear}, dtype=torch.qint8)
+
+        # One forward pass at a time; torch already parallelizes inside the pass
+        self._lock = threading.Lock()
+
+    def analyze(self, images, batch_size=16):
+        """
+        Run one forward pass per batch returning features and attention maps
+
+        Args:
+            images: PIL Image or list of PIL Images
+            batch_size: Images per forward pass
+
+        Returns:
+            tuple: (features [N, hidden] numpy array of mean-pooled last hidden
+            states, attentions [N, heads, tokens, tokens] numpy array of the
+            last layer's attention weights)
+        """
+        if not isinstance(images, (list, tuple)):
+            images = [images]
+        images = [image if image.mode == 'RGB' else image.convert('RGB') for image in images]
+
+        features, attentions = [], []
+        for start in range(0, len(images), batch_size):
+            inputs = self.processor(images=images[start:start + batch_size], return_tensors="pt")
+
+            if self.precision == 'onnx':
+                pooled, attention = self._session.run(None, {"pixel_values": inputs["pixel_values"].numpy()})
+                features.append(pooled)
+                attentions.append(attention)
+                continue
+
+            with self._lock, torch.inference_mode():
+                outputs = self.model(**inputs, output_hidden_states=True, output_attentions=True)
+
+            # Global average pooling over the patch tokens of the last layer
+            features.append(outputs.hidden_states[-1].mean(dim=1).float().numpy())
+            attentions.append(outputs.attentions[-1].float().numpy())
+
+        return np.concatenate(features), np.concatenate(attentions)
+
+    def _default_onnx_path(self):
+        """Cache location for the exported ONNX model (private)"""
+        name = self.source.strip('/').replace('/', '--')
+        return os.path.join(os.path.expanduser('~'), '.cache', 'visiontext', f'{name}.onnx')
+
+    def _load_model(self, local_only):
+        """Load the fp32 torch model in eval mode (private)"""
+        try:
+            # Eager attention is required for the model to return attention maps
+            model = transformers.ViTForImageClassification.from_pretrained(
+                self.source, local_files_only=local_only, attn_implementation="eager")
+        except TypeError:
+            model = transformers.ViTForImageClassification.from_pretrained(self.source, local_files_only=local_only)
+        return model.eval()
+
+    def _load_onnx_session(self, onnx_path, local_only):
+        """Export the model to ONNX once, then open an ONNX Runtime CPU session (private)"""
+        import onnxruntime as ort
+
+        if not os.path.isfile(onnx_path):
+            os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+            size = self.processor.size
+            height, width = (size['height'], size['width']) if 'height' in size else (224, 224)
+            dummy = torch.zeros(1, 3, height, width)
+            torch.onnx.export(_pooled_vit(self._load_model(local_only)), (dummy,), onnx_path,
+                              input_names=['pixel_values'], output_names=['features', 'attentions'],
+                              dynamic_axes={'pixel_values': {0: 'batch'}, 'features': {0: 'batch'},
+                                            'attentions': {0: 'batch'}},
+                              opset_version=17)
+
+        options = ort.SessionOptions()
+        threads = torch.get_num_threads()
+        options.intra_op_num_threads = threads
+        return ort.InferenceSession(onnx_path, sess_options=options, providers=['CPUExecutionProvider'])
+
     def extract_features(self, image):
         """
         Extract features from image using Vision Transformer
-        
+
         Args:
             image: PIL Image object
-            
+
         Returns:
             numpy.ndarray: Feature vector from ViT
         """
         try:
-            # Preprocess image
-            inputs = self.processor(images=image, return_tensors="pt")
-            
-            # Extract features (before classification layer)
-            with torch.no_grad():
-                outputs = self.model(**inputs, output_hidden_states=True)
-                # Get last hidden state (features)
-                features = outputs.hidden_states[-1]
-                # Global average pooling
-                features = features.mean(dim=1).squeeze().numpy()
-            
-            return features
-            
+            features, _ = self.analyze(image)
+            return features.squeeze()
+
         except Exception as e:
             print(f"Feature extraction error: {e}")
             return None
-    
+
     def analyze_spatial_relationships(self, image):
         """
         Analyze spatial relationships in the image
         """
         try:
-            inputs = self.processor(images=image, return_tensors="pt")
-            
-            with torch.no_grad():
-                outputs = self.model(**inputs, output_attentions=True)
-                # Get attention weights for spatial analysis
-                attention_weights = outputs.attentions[-1]
-                
-            return attention_weights.numpy()
-            
+            _, attention_weights = self.analyze(image)
+            return attention_weights
+
         except Exception as e:
             print(f"Spatial analysis error: {e}")
             return None
 
+
+def get_feature_extractor(model_name_or_path=None, num_threads=None, precision=None):
+    """
+    Get the shared feature extractor, loading the model on first use
+
+    Args:
+        model_name_or_path: Hugging Face model id or local model directory
+        num_threads: Torch intra-op threads
+        precision: 'fp32', 'int8' or 'onnx' (defaults to VIT_PRECISION or 'fp32')
+
+    Returns:
+        VisionTransformerFeatureExtractor: Extractor cached per model source and precision
+    """
+    source = model_source(model_name_or_path)
+    precision = precision or os.getenv('VIT_PRECISION', 'fp32')
+    with _extractors_lock:
+        if (source, precision) not in _extractors:
+            _extractors[(source, precision)] = VisionTransformerFeatureExtractor(
+                source, num_threads=num_threads, precision=precision)
+        return _extractors[(source, precision)]
+
+
+def compare_with_fp32(images, precision='int8', model_name_or_path=None):
+    """
+    Check how closely a reduced-precision extractor tracks the fp32 baseline
+
+    Args:
+        images: List of PIL Images to compare on
+        precision: 'int8' or 'onnx'
+        model_name_or_path: Hugging Face model id or local model directory
+
+    Returns:
+        dict: Feature cosine similarity (mean/min) and attention mean absolute error
+    """
+    baseline = get_feature_extractor(model_name_or_path, precision='fp32')
+    candidate = get_feature_extractor(model_name_or_path, precision=precision)
+
+    base_features, base_attention = baseline.analyze(images)
+    features, attention = candidate.analyze(images)
+
+    cosine = np.sum(base_features * features, axis=1) / (
+        np.linalg.norm(base_features, axis=1) * np.linalg.norm(features, axis=1) + 1e-12)
+
+    return {
+        "precision": precision,
+        "feature_cosine_mean": float(cosine.mean()),
+        "feature_cosine_min": float(cosine.min()),
+        "attention_mae": float(np.abs(base_attention - attention).mean())
+    }
+
+
+def benchmark_throughput(images, precisions=('fp32', 'int8'), batch_sizes=(1, 2, 4, 8, 16, 32),
+                         repeats=3, model_name_or_path=None):
+    """
+    Measure CPU throughput of each precision across batch sizes
+
+    Args:
+        images: List of PIL Images; cycled to fill the largest batch
+        precisions: Precisions to benchmark
+        batch_sizes: Batch sizes to benchmark
+        repeats: Timed runs per configuration (best run is reported)
+        model_name_or_path: Hugging Face model id or local model directory
+
+    Returns:
+        list: One dict per (precision, batch size) with latency and images/sec
+    """
+    results = []
+    pool = [images[i % len(images)] for i in range(max(batch_sizes))]
+
+    for precision in precisions:
+        extractor = get_feature_extractor(model_name_or_path, precision=precision)
+        extractor.analyze(pool[:1])  # warm-up
+
+        for batch_size in batch_sizes:
+            batch = pool[:batch_size]
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                extractor.analyze(batch, batch_size=batch_size)
+                timings.append(time.perf_counter() - start)
+
+            best = min(timings)
+            results.append({
+                "precision": precision,
+                "batch_size": batch_size,
+                "batch_latency_ms": round(best * 1000, 2),
+                "images_per_sec": round(batch_size / best, 2)
+            })
+
+    return results
+
+
 # Usage in your pipeline
 def integrate_vision_transformer(image):
     """
     Integrate Vision Transformer into your existing pipeline
+
+    Accepts a single PIL Image or a list of them; the model is loaded once and
+    a single forward pass yields both features and attention maps.
     """
-    vit_extractor = VisionTransformerFeatureExtractor()
-    
-    # Extract features
-    features = vit_extractor.extract_features(image)
-    
-    # Analyze spatial relationships
-    attention_maps = vit_extractor.analyze_spatial_relationships(image)
-    
-    return features, attention_maps
\ No newline at end of file
+    vit_extractor = get_feature_extractor()
+
+    try:
+        features, attention_maps = vit_extractor.analyze(image)
+    except Exception as e:
+        print(f"Vision Transformer error: {e}")
+        return None, None
+
+    if not isinstance(image, (list, tuple)):
+        # Keep the single-image shapes: pooled feature vector, batched attention
+        features = features.squeeze()
+
+    return features, attention_maps
+
+
+if __name__ == "__main__":
+    import glob
+
+    sample_images = [Image.open(path).convert('RGB') for path in sorted(glob.glob(os.path.join('images', '*.jpeg')))]
+    precisions = ('fp32', 'int8', 'onnx') if os.getenv('VIT_BENCH_ONNX') else ('fp32', 'int8')
+
+    print("Feature similarity against fp32:")
+    for precision in precisions[1:]:
+        print(compare_with_fp32(sample_images, precision=precision))
+
+    print("\nCPU throughput:")
+    print(f"{'precision':<10}{'batch':>6}{'batch ms':>12}{'img/s':>10}")
+    for row in benchmark_throughput(sample_images, precisions=precisions):
+        print(f"{row['precision']:<10}{row['batch_size']:>6}{row['batch_latency_ms']:>12}{row['images_per_sec']:>10}")